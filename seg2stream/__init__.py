@@ -1,10 +1,23 @@
 from .seg2generator import (
+    SegmentationCore as SegSent2GeneratorCore,
     SegmentationPipeline as SegSent2GeneratorPipeline,
     SegmentationConfig as SegSent2GeneratorConfig,
 )
 from .seg2stream import (
+    SegmentationCore as SegSent2StreamCore,
     SegmentationPipeline as SegSent2StreamPipeline,
     SegmentationConfig as SegSent2StreamConfig,
 )
-from .segmenters import get_sentence_segmenter, get_phrase_segmenter
-from .seg_manager import SegmentationManager
+from .segmenters import (
+    get_sentence_segmenter,
+    get_phrase_segmenter,
+    get_rhythm_segmenter,
+)
+from .registry import SegmenterHandle, SegmenterRegistry, registry
+from .seg_manager import SegmentationManager, SessionLimitError, Remainder
+from .segment_buffer import Segment, SegmentBuffer, SegmentHistory
+from .batching import BatchedSegmenter
+from .offload import OffloadedSegmenter
+from .memoize import MemoizedSegmenter
+from .metrics import MetricsAggregator, merge_snapshots, to_json, to_prometheus
+from .clock import VirtualClock, replay_virtual
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any, List, Tuple
+
+
+class BatchedSegmenter:
+    """Collect the segmentation requests of all sessions sharing an event loop
+    and issue them as one `segment_batch(texts)` call.
+
+    A request waits at most `max_delay` seconds for others to join its batch,
+    and a batch is issued at once when it holds `max_batch_size` requests.
+    """
+
+    def __init__(self, segmenter: Any, max_delay: float = 0.005, max_batch_size=64):
+        self.segmenter = segmenter
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        self.pending: List[Tuple[str, asyncio.Future]] = []  # 等待批量调用的请求
+        self.timer: asyncio.TimerHandle | None = None
+        self.num_calls = 0  # 批量调用次数
+        self.num_requests = 0  # 分割请求数
+
+    def __call__(self, text: str) -> List[str]:
+        return self.segmenter(text)
+
+    def segment_batch(self, texts: List[str]) -> List[List[str]]:
+        return self.segmenter.segment_batch(texts)
+
+    async def segment_async(self, text: str) -> List[str]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, future))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending = [(t, f) for t, f in self.pending if not f.done()]
+        self.pending = []
+        if len(pending) == 0:
+            return
+
+        self.num_calls += 1
+        self.num_requests += len(pending)
+        texts = [text for text, _ in pending]
+        if hasattr(self.segmenter, "segment_batch_async"):  # 在事件循环之外调用
+            task = asyncio.ensure_future(self.segmenter.segment_batch_async(texts))
+            task.add_done_callback(lambda task: self.resolve(pending, task))
+            return
+        try:
+            results = self.segment_batch(texts)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    def resolve(self, pending: List[Tuple[str, asyncio.Future]], task: asyncio.Task):
+        for i, (_, future) in enumerate(pending):
+            if future.done():  # 请求方已取消
+                continue
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result()[i])
+
+    def close(self):
+        if hasattr(self.segmenter, "close"):
+            self.segmenter.close()
+
+
+def batch_segmenters(
+    segmenters: List[Any], max_delay: float = 0.005, max_batch_size: int = 64
+) -> List[Any]:
+    """Wrap the segmenters that provide `segment_batch`, keep the others."""
+    return [
+        (
+            BatchedSegmenter(s, max_delay, max_batch_size)
+            if hasattr(s, "segment_batch")
+            else s
+        )
+        for s in segmenters
+    ]
@@ -0,0 +1,2 @@
+from .traces import Trace, get_traces
+from .runner import run_benchmark, compare
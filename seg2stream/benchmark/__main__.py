@@ -0,0 +1,33 @@
+import json
+import argparse
+
+from .runner import run_benchmark, compare
+from .traces import get_traces
+
+
+parser = argparse.ArgumentParser(
+    prog="python -m seg2stream.benchmark",
+    description="Replay fixed token traces through the segmentation pipelines.",
+)
+parser.add_argument("-o", "--output", help="write the results to this JSON file")
+parser.add_argument("--traces", nargs="+", choices=list(get_traces()))
+parser.add_argument("--targets", nargs="+", choices=["stream", "generator", "manager"])
+parser.add_argument(
+    "--time-scale", type=float, default=1.0, help="multiplier of the token gaps"
+)
+parser.add_argument("--sessions", type=int, default=8, help="manager sessions")
+parser.add_argument("--segmenter", choices=["jionlp", "boundary"], default="jionlp")
+parser.add_argument("--baseline", help="JSON results of an earlier run to compare")
+args = parser.parse_args()
+
+results = run_benchmark(
+    args.traces, args.targets, args.time_scale, args.sessions, args.segmenter
+)
+if args.output:
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+else:
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+if args.baseline:
+    with open(args.baseline) as f:
+        print("\n".join(compare(json.load(f), results)))
@@ -0,0 +1,353 @@
+import os
+import time
+import math
+import bisect
+import asyncio
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from typing import Any, Callable, Dict, List, Literal, Tuple
+
+from .. import (
+    get_sentence_segmenter,
+    SegSent2StreamPipeline,
+    SegSent2StreamConfig,
+    SegSent2GeneratorPipeline,
+    SegSent2GeneratorConfig,
+    SegmentationManager,
+)
+from ..segment_buffer import Segment
+from .traces import Trace, get_traces
+
+
+stream_config = SegSent2StreamConfig(
+    segmentation_suffix="####",
+    ################
+    first_max_accu_time=0.1,
+    max_accu_time=1.0,
+    first_max_buffer_size=20,
+    max_buffer_size=50,
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=20,
+    min_seg_size=50,
+    max_seg_size=70,
+    loose_steps=4,
+    loose_size=10,
+    fade_in_out_time=0.2,
+    seconds_per_word=0.3,
+)
+generator_config = SegSent2GeneratorConfig(
+    segmentation_suffix="####",
+    ################
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=20,
+    min_seg_size=100,
+)
+min_throughput_chars = 5000  # 吞吐量测试至少处理的字符数
+
+
+class CountingStream(object):
+    def __init__(self, counter: "CountingSegmenter", stream: Any):
+        self.counter = counter
+        self.stream = stream
+
+    def feed(self, chars: str):
+        self.stream.feed(chars)
+
+    def boundaries(self, suffix: str = ""):
+        self.counter.num_calls += 1
+        return self.stream.boundaries(suffix)
+
+    def commit(self, offset: int):
+        self.stream.commit(offset)
+
+
+class CountingSegmenter(object):
+    """Count the segmentation calls, keeping the incremental path if the
+    wrapped segmenter has one."""
+
+    def __init__(self, segmenter: Any):
+        self.segmenter = segmenter
+        self.num_calls = 0
+        if hasattr(segmenter, "create_stream"):
+            self.create_stream = lambda: CountingStream(self, segmenter.create_stream())
+
+    def __call__(self, text: str) -> List[str]:
+        self.num_calls += 1
+        return self.segmenter(text)
+
+
+async def replay(trace: Trace, fill: Callable, time_scale: float) -> List[float]:
+    """Feed the tokens with the gaps of the trace, return their arrival times."""
+    loop = asyncio.get_running_loop()
+    arrivals = []
+    due = loop.time()
+    for token, gap in zip(trace.tokens, trace.gaps):
+        due += gap * time_scale
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        fill(token)
+        arrivals.append(time.perf_counter())
+    fill(None)
+    return arrivals
+
+
+def create_pipeline(target: str, segmenters: List[Any]):
+    if target == "stream":
+        return SegSent2StreamPipeline(config=stream_config, segmenters=segmenters)
+    return SegSent2GeneratorPipeline(config=generator_config, segmenters=segmenters)
+
+
+async def collect(pipeline) -> List[Tuple[float, str]]:
+    """Output times of the non-empty segments. A generator is emitted once its
+    last character has been yielded."""
+    emits = []
+    async for output in pipeline.output_stream():
+        if isinstance(output, str):
+            if len(output) > 0:
+                emits.append((time.perf_counter(), output))
+        else:
+            text = "".join([char async for char in output])
+            if len(text.strip()) > 0:
+                emits.append((time.perf_counter(), text))
+    return emits
+
+
+def get_spans(pipeline, emits: List[Tuple[float, str]]) -> List[Tuple[float, Segment]]:
+    if isinstance(pipeline, SegSent2StreamPipeline):
+        return emits
+    # 非空生成器与分割结果一一对应
+    segmenteds = [s for s in pipeline.get_segmenteds() if len(s.strip()) > 0]
+    return [(t, seg) for (t, _), seg in zip(emits, segmenteds)]
+
+
+def summarize(
+    trace: Trace, arrivals: List[float], emits: List[Tuple[float, Segment]]
+) -> Dict[str, Any]:
+    offsets = trace.offsets()
+    latencies = []
+    for emit_time, segment in emits:
+        # 片段最后一个字符所在 token 的到达时间
+        idx = min(bisect.bisect_left(offsets, segment.end), len(arrivals) - 1)
+        latencies.append(emit_time - arrivals[idx])
+    return {
+        "segments": len(emits),
+        "time_to_first_segment": emits[0][0] - arrivals[0] if emits else None,
+        "emit_latency": percentiles(latencies),
+    }
+
+
+def percentiles(values: List[float]) -> Dict[str, float | None]:
+    if len(values) == 0:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    if len(values) == 1:
+        return {"p50": values[0], "p90": values[0], "p99": values[0], "max": values[0]}
+    qs = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": qs[49], "p90": qs[89], "p99": qs[98], "max": max(values)}
+
+
+async def run_session(target, trace, time_scale, segmenters):
+    pipeline = create_pipeline(target, segmenters)
+    arrivals, _, emits = await asyncio.gather(
+        replay(trace, pipeline.fill, time_scale), pipeline.segment(), collect(pipeline)
+    )
+    return arrivals, get_spans(pipeline, emits)
+
+
+async def bench_pipeline(
+    target: str, trace: Trace, time_scale: float, segmenter: Any
+) -> Dict[str, Any]:
+    counter = CountingSegmenter(segmenter)
+    arrivals, emits = await run_session(target, trace, time_scale, [counter])
+    result = summarize(trace, arrivals, emits)
+    result["segmenter_calls"] = counter.num_calls
+
+    # 吞吐量：所有 token 一次性到达
+    repeats = math.ceil(min_throughput_chars / len(trace.text))
+    s = time.perf_counter()
+    for _ in range(repeats):
+        await run_session(target, trace, 0.0, [counter.segmenter])
+    result["chars_per_second"] = repeats * len(trace.text) / (time.perf_counter() - s)
+
+    tracemalloc.start()
+    await run_session(target, trace, 0.0, [counter.segmenter])
+    result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+def get_peak_rss(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def bench_manager(
+    trace: Trace, time_scale: float, segmenter: Any, num_sessions: int
+) -> Dict[str, Any]:
+    seg_manager = SegmentationManager(seg_config=stream_config, segmenters=[segmenter])
+    seg_manager.start()
+    outputs = seg_manager.get_async_output()
+    seg_manager.add_text("warmup", "预热。")
+    seg_manager.add_text("warmup", None)
+    async for id, output in outputs:
+        if id == "warmup" and output is None:
+            break
+
+    async def run_sessions(prefix, scale):
+        emits: Dict[Any, List[Tuple[float, Segment]]] = {}
+
+        async def receive():
+            num_finished = 0
+            async for id, output in outputs:
+                if output is None:
+                    num_finished += 1
+                    if num_finished == num_sessions:
+                        return
+                elif len(output) > 0:
+                    emits.setdefault(id, []).append((time.perf_counter(), output))
+
+        senders = [
+            replay(
+                trace, lambda text, i=i: seg_manager.add_text((prefix, i), text), scale
+            )
+            for i in range(num_sessions)
+        ]
+        results = await asyncio.gather(receive(), *senders)
+        return results[1:], emits
+
+    all_arrivals, emits = await run_sessions("latency", time_scale)
+    latencies, first_times = [], []
+    for i, arrivals in enumerate(all_arrivals):
+        summary = summarize(trace, arrivals, emits.get(("latency", i), []))
+        latencies += [summary["emit_latency"]] if summary["segments"] else []
+        if summary["time_to_first_segment"] is not None:
+            first_times.append(summary["time_to_first_segment"])
+
+    # 所有会话的 token 一次性到达
+    repeats = math.ceil(min_throughput_chars / len(trace.text) / num_sessions)
+    s = time.perf_counter()
+    for r in range(repeats):
+        await run_sessions(("throughput", r), 0.0)
+    spent_time = time.perf_counter() - s
+
+    result = {
+        "sessions": num_sessions,
+        "segments": sum(len(e) for e in emits.values()),
+        "time_to_first_segment": (
+            statistics.median(first_times) if first_times else None
+        ),
+        "emit_latency": {  # 各会话分位数的中位数
+            key: statistics.median(l[key] for l in latencies) if latencies else None
+            for key in ["p50", "p90", "p99", "max"]
+        },
+        "segmenter_calls": None,  # 在分割进程中调用，无法统计
+        "chars_per_second": repeats * num_sessions * len(trace.text) / spent_time,
+        "peak_memory": max(
+            [get_peak_rss(p.pid) or 0 for p in seg_manager.seg_processes]
+        ),
+    }
+    seg_manager.close()
+    async for _ in outputs:
+        pass
+    return result
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    traces: List[str] | None = None,
+    targets: List[str] | None = None,
+    time_scale: float = 1.0,
+    num_sessions: int = 8,
+    segmenter: Literal["jionlp", "boundary"] = "jionlp",
+) -> Dict[str, Any]:
+    """Replay the fixed traces through the pipelines and the manager.
+
+    `time_scale` multiplies the gaps between tokens (0 feeds them at once)."""
+    all_traces = get_traces()
+    sentence_segmenter = get_sentence_segmenter(segmenter)
+    traces = traces or list(all_traces)
+    targets = targets or ["stream", "generator", "manager"]
+
+    results = []
+    for target in targets:
+        for name in traces:
+            trace = all_traces[name]
+            if target == "manager":
+                result = asyncio.run(
+                    bench_manager(trace, time_scale, sentence_segmenter, num_sessions)
+                )
+            else:
+                result = asyncio.run(
+                    bench_pipeline(target, trace, time_scale, sentence_segmenter)
+                )
+            results.append(
+                {
+                    "target": target,
+                    "trace": name,
+                    "chars": len(trace.text),
+                    "tokens": len(trace.tokens),
+                    **result,
+                }
+            )
+    return {
+        "meta": {
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time_scale": time_scale,
+            "segmenter": segmenter,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+compared_metrics = [
+    ("chars_per_second", lambda r: r["chars_per_second"]),
+    ("time_to_first_segment", lambda r: r["time_to_first_segment"]),
+    ("emit_latency.p90", lambda r: r["emit_latency"]["p90"]),
+    ("segmenter_calls", lambda r: r["segmenter_calls"]),
+    ("peak_memory", lambda r: r["peak_memory"]),
+]
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """One line per target, trace and metric: baseline -> current (ratio)."""
+    old = {(r["target"], r["trace"]): r for r in baseline["results"]}
+    lines = []
+    for r in current["results"]:
+        key = (r["target"], r["trace"])
+        if key not in old:
+            continue
+        for name, get in compared_metrics:
+            a, b = get(old[key]), get(r)
+            if a is None or b is None:
+                continue
+            ratio = f"{b / a:.2f}x" if a else "-"
+            lines.append(
+                f"{key[0]:<10}{key[1]:<10}{name:<24}{a:>14.4f} -> {b:<14.4f}{ratio}"
+            )
+    return lines
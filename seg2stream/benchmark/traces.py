@@ -0,0 +1,105 @@
+import re
+import zlib
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+
+zh_text = """凌晨三点，林夏被手机铃声惊醒。屏幕上显示“未知号码”，她犹豫着接起，电话那头只有沙沙的雨声。
+“喂？”她试探着问。“记得带伞。”一个熟悉的声音轻轻响起，是已故母亲的口吻。
+林夏猛地坐起，窗外暴雨如注。她冲到玄关，发现一把陌生的黑伞静静立着——伞柄上刻着她的小名，字迹早已褪色。
+第二天，新闻播报昨夜基站故障，全市通信中断四小时。林夏握紧伞柄，雨滴从檐角坠落，像谁的眼泪。"""
+
+en_text = """The storm rolled in just after midnight. Mara checked the weather app twice, \
+then set her phone face down on the desk. "It will pass," she told herself, though the \
+windows rattled in reply. At 3:15 a.m. the power failed, and the city went quiet. \
+She lit a candle, opened the old notebook, and began to write again. By dawn, the rain \
+had stopped; the streets shone like glass, and for the first time in weeks, she felt ready."""
+
+long_text = """人工智能的发展经历了几个重要阶段。最早的研究集中在符号推理上，研究者们希望用逻辑规则描述人类的思维过程。\
+然而，现实世界的知识往往模糊而复杂，规则系统很快遇到了瓶颈。随后，统计学习方法兴起，模型开始从数据中自动归纳规律。
+进入深度学习时代后，神经网络在图像识别、语音识别和机器翻译等任务上取得了突破性进展。大规模预训练语言模型的出现，\
+更是让机器能够生成流畅、连贯的长篇文本。与此同时，人们也开始关注模型的可解释性、公平性以及能耗问题。
+在语音合成领域，流式生成成为新的需求：用户希望在模型输出第一句话时就能听到声音，而不是等待整段文本生成完毕。\
+这就要求系统能够实时地把源源不断的文本切分成合适的片段，既不能太短导致语调破碎，也不能太长导致等待过久。
+未来，随着硬件性能的提升和算法的改进，我们有理由相信，人机交互会变得更加自然。也许有一天，和机器对话会像和朋友聊天一样轻松。"""
+
+short_texts = {
+    "short_zh": "好的，我马上帮你处理。",
+    "short_en": "Sure, here you go.",
+}
+
+
+@dataclass
+class Trace:
+    """A fixed token stream: `tokens[i]` arrives `gaps[i]` seconds after the
+    previous one."""
+
+    name: str
+    tokens: List[str]
+    gaps: List[float]
+
+    @property
+    def text(self) -> str:
+        return "".join(self.tokens)
+
+    def offsets(self) -> List[int]:
+        """End offset of every token in the text."""
+        offsets, end = [], 0
+        for token in self.tokens:
+            end += len(token)
+            offsets.append(end)
+        return offsets
+
+    def events(self, start: float = 0.0) -> List[Tuple[float, str]]:
+        """`(timestamp, token)` pairs, as taken by `replay_virtual`."""
+        events, now = [], start
+        for token, gap in zip(self.tokens, self.gaps):
+            now += gap
+            events.append((now, token))
+        return events
+
+
+en_token_ptn = re.compile(r" ?[A-Za-z]+|\s+|\d+|[^\sA-Za-z\d]+")
+
+
+def tokenize(text: str, rng: random.Random) -> List[str]:
+    """Split text the way an LLM tokenizer roughly does: one to three Chinese
+    characters per token, and English words (with their leading space) cut
+    into pieces of at most 6 characters."""
+    tokens = []
+    for piece in en_token_ptn.findall(text):
+        if piece.isascii():
+            while len(piece) > 6:
+                tokens.append(piece[:4])
+                piece = piece[4:]
+            tokens.append(piece)
+        else:
+            while len(piece) > 0:
+                size = rng.choice([1, 1, 2, 2, 3])
+                tokens.append(piece[:size])
+                piece = piece[size:]
+    return tokens
+
+
+def make_trace(name: str, text: str, mean_gap=0.025, stall_rate=0.02) -> Trace:
+    # 以名字作为种子，每次生成完全相同的 token 和间隔
+    rng = random.Random(zlib.crc32(name.encode("utf-8")))
+    tokens = tokenize(text, rng)
+    gaps = [0.0]
+    for _ in tokens[1:]:
+        if rng.random() < stall_rate:  # 偶尔出现较长的停顿
+            gaps.append(rng.uniform(0.1, 0.3))
+        else:
+            gaps.append(max(0.002, rng.gauss(mean_gap, mean_gap / 3)))
+    return Trace(name, tokens, gaps)
+
+
+def get_traces() -> Dict[str, Trace]:
+    traces = [
+        make_trace("zh", zh_text),
+        make_trace("en", en_text, mean_gap=0.02),
+        make_trace("long_zh", long_text * 2),
+    ]
+    traces += [make_trace(name, text) for name, text in short_texts.items()]
+    return {trace.name: trace for trace in traces}
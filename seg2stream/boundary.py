@@ -0,0 +1,97 @@
+import re
+from typing import Dict, List, Literal
+
+from .memoize import MemoizedSegmenter
+
+
+class LanguagePack(object):
+    """Punctuation classes of a language, compiled once into segment patterns.
+
+    A segment ends with a run of terminal (or, for phrases, also phrase)
+    punctuation together with the closing quotes and brackets right after it,
+    so `。”` and `?)` stay with the sentence they end. With `period`, `.` only
+    ends a sentence when it is not followed by a letter, digit or another `.`,
+    which keeps `3.14`, `U.S.A` and the first dots of `...` together. A
+    segment can only end right after one of the `boundary_chars` of its level.
+    """
+
+    def __init__(self, terminals: str, phrases: str, closers: str, period=False):
+        self.terminals = terminals  # 句末标点
+        self.phrases = phrases  # 短语标点
+        self.closers = closers  # 后引号和右括号
+        self.period = period  # 是否按英文句点处理 "."
+        self.patterns = {
+            "sentence": self.compile(terminals + "\n"),
+            "phrase": self.compile(terminals + phrases + "\n"),
+        }
+        ends = closers + ("." if period else "")
+        self.boundary_chars = {
+            "sentence": frozenset(terminals + "\n" + ends),
+            "phrase": frozenset(terminals + phrases + "\n" + ends),
+        }
+
+    def compile(self, puncs: str) -> re.Pattern:
+        # 匹配一整个片段：非结束字符 + 结束标点 + 后引号/右括号，由 findall 一次切分
+        puncs = re.escape(puncs)
+        closers = f"[{re.escape(self.closers)}]*" if self.closers else ""
+        if self.period:
+            body = rf"[^{puncs}.]*(?:\.(?=[0-9A-Za-z.])[^{puncs}.]*)*"
+            ends = rf"(?:[{puncs}]|\.(?![0-9A-Za-z.]))+"
+        else:
+            body = rf"[^{puncs}]*"
+            ends = rf"[{puncs}]+"
+        return re.compile(rf"{body}(?:{ends}{closers}|\Z)")
+
+
+zh_pack = LanguagePack(
+    terminals="。！？!?…",
+    phrases="，、；：,;:",
+    closers="”’」』）)】》〉］]",
+)
+en_pack = LanguagePack(
+    terminals="!?…",
+    phrases=",;:",
+    closers="\"')]}",
+    period=True,
+)
+ja_pack = LanguagePack(
+    terminals="。．！？!?…",
+    phrases="、，；：,;:",
+    closers="」』）)】〕〉》”’］]",
+)
+mixed_pack = LanguagePack(
+    terminals="。．！？!?…",
+    phrases="，、；：,;:",
+    closers="”’」』）)】〕〉》］]\"'}",
+    period=True,
+)
+language_packs: Dict[str, LanguagePack] = {
+    "zh": zh_pack,
+    "en": en_pack,
+    "ja": ja_pack,
+    "mixed": mixed_pack,
+}
+
+
+class BoundarySegmenter(object):
+    """Rule-based segmentation with a precompiled language pack, in a single
+    `findall` pass over the text."""
+
+    def __init__(
+        self,
+        language: Literal["zh", "en", "ja", "mixed"] = "mixed",
+        level: Literal["sentence", "phrase"] = "sentence",
+    ):
+        self.pattern = language_packs[language].patterns[level]
+        self.boundary_chars = language_packs[language].boundary_chars[level]
+        self.memoized = MemoizedSegmenter(self, lookback=0)
+
+    def __call__(self, text: str) -> List[str]:
+        segmenteds = self.pattern.findall(text)
+        if segmenteds[-1] == "":  # 文本以结束标点结尾时，末尾匹配到空串
+            segmenteds.pop()
+        return segmenteds
+
+    def create_stream(self):
+        # 边界只取决于其后的一个字符，从已确认的边界开始重新扫描即可
+        return self.memoized.create_stream()
@@ -0,0 +1,261 @@
+import os
+import pickle
+import select
+import struct
+import asyncio
+import threading
+from multiprocessing import Pipe
+from multiprocessing.connection import Connection
+from typing import Any, List, Tuple
+
+from .segment_buffer import Segment
+
+
+# 帧：4 字节长度 + 若干消息，每条消息依次编码 id 和内容
+frame_header = struct.Struct("<I")
+length_struct = struct.Struct("<I")
+int_struct = struct.Struct("<q")
+span_struct = struct.Struct("<qq")
+
+
+def encode_value(value: Any, parts: List[bytes]):
+    if value is None:
+        parts.append(b"N")
+    elif type(value) is str:
+        data = value.encode("utf-8")
+        parts += [b"S", length_struct.pack(len(data)), data]
+    elif type(value) is Segment:
+        data = value.encode("utf-8")
+        parts += [
+            b"G",
+            span_struct.pack(value.start, value.end),
+            length_struct.pack(len(data)),
+            data,
+        ]
+    elif type(value) is int:
+        parts += [b"I", int_struct.pack(value)]
+    else:
+        data = pickle.dumps(value)
+        parts += [b"P", length_struct.pack(len(data)), data]
+
+
+def decode_value(view: memoryview, pos: int) -> Tuple[Any, int]:
+    tag = view[pos]
+    pos += 1
+    if tag == 78:  # N
+        return None, pos
+    if tag == 73:  # I
+        return int_struct.unpack_from(view, pos)[0], pos + int_struct.size
+    if tag == 71:  # G
+        start, end = span_struct.unpack_from(view, pos)
+        pos += span_struct.size
+    (size,) = length_struct.unpack_from(view, pos)
+    pos += length_struct.size
+    data = view[pos : pos + size]
+    pos += size
+    if tag == 83:  # S
+        return str(data, "utf-8"), pos
+    if tag == 71:
+        return Segment(str(data, "utf-8"), start, end), pos
+    return pickle.loads(data), pos
+
+
+def encode_messages(messages: List[Tuple[Any, Any]]) -> bytes:
+    parts = [b""]
+    for id, value in messages:
+        encode_value(id, parts)
+        encode_value(value, parts)
+    payload = b"".join(parts)
+    return frame_header.pack(len(payload)) + payload
+
+
+def decode_messages(payload: memoryview) -> List[Tuple[Any, Any]]:
+    messages, pos = [], 0
+    while pos < len(payload):
+        id, pos = decode_value(payload, pos)
+        value, pos = decode_value(payload, pos)
+        messages.append((id, value))
+    return messages
+
+
+class ChannelWriter:
+    """Write side of a one-way message channel between processes.
+
+    Messages sent in the same event loop tick are packed into one frame. When
+    the pipe is full, the rest is written once the pipe becomes writable, or
+    waited for when there is no running event loop.
+    """
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self.fd = conn.fileno()
+        os.set_blocking(self.fd, False)
+        self.pending: List[Tuple[Any, Any]] = []  # 待打包的消息
+        self.out_buffer = bytearray()  # 待写入的字节
+        self.loop: asyncio.AbstractEventLoop | None = None  # 等待可写的事件循环
+        self.is_scheduled = False
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"conn": self.conn}
+
+    def __setstate__(self, state):
+        self.__init__(state["conn"])
+
+    def send(self, id: Any, value: Any):
+        with self.lock:
+            self.pending.append((id, value))
+            if self.is_scheduled:
+                return
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is None:
+                self._flush()
+            else:
+                self.is_scheduled = True
+                loop.call_soon(self.flush)
+
+    def flush(self, block: bool = False):
+        """Write the pending messages. With `block`, wait until they are all in
+        the pipe, e.g. before the event loop that would finish writing them
+        closes."""
+        with self.lock:
+            self._flush()
+            while block and len(self.out_buffer) > 0:
+                select.select([], [self.fd], [])
+                self._write()
+
+    def _flush(self):
+        self.is_scheduled = False
+        if len(self.pending) > 0:
+            self.out_buffer += encode_messages(self.pending)
+            self.pending = []
+        self._write()
+        if len(self.out_buffer) == 0 or self.loop is not None:
+            return
+        try:
+            self.loop = asyncio.get_running_loop()
+            self.loop.add_writer(self.fd, self.flush)
+        except RuntimeError:  # 没有事件循环时阻塞直到写完
+            while len(self.out_buffer) > 0:
+                select.select([], [self.fd], [])
+                self._write()
+
+    def _write(self):
+        while len(self.out_buffer) > 0:
+            try:
+                size = os.write(self.fd, self.out_buffer)
+            except BlockingIOError:
+                return
+            del self.out_buffer[:size]
+        if self.loop is not None:
+            self.loop.remove_writer(self.fd)
+            self.loop = None
+
+
+class ChannelReader:
+    """Read side of a one-way message channel between processes."""
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self.fd = conn.fileno()
+        os.set_blocking(self.fd, False)
+        self.in_buffer = bytearray()
+
+    def __getstate__(self):
+        return {"conn": self.conn}
+
+    def __setstate__(self, state):
+        self.__init__(state["conn"])
+
+    def read_nowait(self) -> List[Tuple[Any, Any]]:
+        """Return every complete message that has arrived, possibly none."""
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            if not data:
+                raise EOFError
+            self.in_buffer += data
+
+        # 找到所有完整的帧
+        frames, pos = [], 0
+        while len(self.in_buffer) - pos >= frame_header.size:
+            (size,) = frame_header.unpack_from(self.in_buffer, pos)
+            if len(self.in_buffer) - pos - frame_header.size < size:
+                break
+            frames.append((pos + frame_header.size, size))
+            pos += frame_header.size + size
+        if pos == 0:
+            return []
+        view = memoryview(bytes(self.in_buffer[:pos]))
+        del self.in_buffer[:pos]
+
+        messages = []
+        for start, size in frames:
+            messages += decode_messages(view[start : start + size])
+        return messages
+
+    def read(self, timeout: float | None = None) -> List[Tuple[Any, Any]]:
+        messages = self.read_nowait()
+        while len(messages) == 0:
+            if not select.select([self.fd], [], [], timeout)[0]:
+                break
+            messages = self.read_nowait()
+        return messages
+
+    async def read_async(self) -> List[Tuple[Any, Any]]:
+        messages = self.read_nowait()
+        if len(messages) > 0:
+            return messages
+        loop = asyncio.get_running_loop()
+        while len(messages) == 0:
+            future = loop.create_future()
+            loop.add_reader(self.fd, lambda: future.done() or future.set_result(None))
+            try:
+                await future
+            finally:
+                loop.remove_reader(self.fd)
+            messages = self.read_nowait()
+        return messages
+
+
+def create_channel() -> Tuple[ChannelReader, ChannelWriter]:
+    reader, writer = Pipe(duplex=False)
+    return ChannelReader(reader), ChannelWriter(writer)
+
+
+def read_any(
+    readers: List[ChannelReader], timeout: float | None = None
+) -> List[Tuple[Any, Any]]:
+    """Wait until any of `readers` has messages and return all arrived ones."""
+    messages = [m for reader in readers for m in reader.read_nowait()]
+    while len(messages) == 0:
+        ready = select.select([reader.fd for reader in readers], [], [], timeout)[0]
+        if not ready:
+            break
+        messages = [m for reader in readers for m in reader.read_nowait()]
+    return messages
+
+
+async def read_any_async(readers: List[ChannelReader]) -> List[Tuple[Any, Any]]:
+    if len(readers) == 1:
+        return await readers[0].read_async()
+    messages = [m for reader in readers for m in reader.read_nowait()]
+    if len(messages) > 0:
+        return messages
+    loop = asyncio.get_running_loop()
+    while len(messages) == 0:
+        future = loop.create_future()
+        for reader in readers:
+            loop.add_reader(reader.fd, lambda: future.done() or future.set_result(None))
+        try:
+            await future
+        finally:
+            for reader in readers:
+                loop.remove_reader(reader.fd)
+        messages = [m for reader in readers for m in reader.read_nowait()]
+    return messages
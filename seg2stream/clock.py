@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Iterable, List, Tuple
+
+from .segment_buffer import Segment
+
+
+class VirtualClock(object):
+    """A clock that only moves when it is told to. Pass it as the `clock` of a
+    pipeline to make the timing decisions reproducible."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def set(self, now: float):
+        if now < self.now:
+            raise ValueError(f"Clock cannot go back from {self.now} to {now}.")
+        self.now = now
+
+    def advance(self, seconds: float):
+        self.set(self.now + seconds)
+
+
+async def wait_idle(pipeline: Any, task: asyncio.Future):
+    """Wait until the pipeline has processed all the text it received."""
+    while not (pipeline.is_receiving and pipeline.in_queue.empty()):
+        if task.done():  # 分割出错时抛出异常
+            task.result()
+            return
+        idle = asyncio.ensure_future(pipeline.idle.wait())
+        await asyncio.wait([idle, task], return_when=asyncio.FIRST_COMPLETED)
+        idle.cancel()
+
+
+async def replay_virtual(
+    pipeline: Any, events: Iterable[Tuple[float, str]]
+) -> List[Tuple[float, Segment]]:
+    """Feed `(timestamp, token)` events to a pipeline built with a
+    `VirtualClock`, without waiting between them.
+
+    Each token is fully processed at its own timestamp before the clock moves
+    on, so the same events always give the same segments. The timeouts that
+    expire between two tokens are ticked at the time they expire, as the
+    timers of the pipeline would. Returns every segment with the virtual time
+    at which it was decided.
+    """
+    clock = pipeline.clock
+    if not isinstance(clock, VirtualClock):
+        raise ValueError("The pipeline must be created with a VirtualClock.")
+
+    emits: List[Tuple[float, Segment]] = []
+    num_collected = 0
+
+    def collect():
+        # 只能收集仍按 retention 保留的片段
+        nonlocal num_collected
+        history = pipeline.history
+        start = max(0, num_collected - history.num_dropped)
+        emits.extend((clock(), s) for s in history.segments[start:])
+        num_collected = len(history)
+
+    async def tick_until(timestamp: float):
+        while True:
+            deadline = pipeline.next_deadline()
+            if deadline is None or deadline > timestamp:
+                return
+            clock.set(max(clock(), deadline))
+            pipeline.on_timer()
+            await wait_idle(pipeline, task)
+            collect()
+
+    task = asyncio.ensure_future(pipeline.segment())
+    try:
+        await wait_idle(pipeline, task)
+        for timestamp, token in events:
+            await tick_until(timestamp)
+            clock.set(timestamp)
+            pipeline.fill(token)
+            await wait_idle(pipeline, task)
+            collect()
+        pipeline.fill(None)
+        await task
+    finally:
+        task.cancel()
+    collect()
+    return emits
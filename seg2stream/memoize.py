@@ -0,0 +1,112 @@
+import bisect
+from typing import Any, Callable, Dict, List
+
+from .segmenters import to_boundaries
+
+
+class MemoizedStream(object):
+    """Incremental segmentation with a black-box segmenter.
+
+    A boundary is confirmed once another boundary follows it inside the
+    received text, and is not recomputed afterwards. Each call only segments
+    the text after the last confirmed boundary, preceded by `lookback`
+    confirmed sentences as context.
+    """
+
+    def __init__(self, segmenter: "MemoizedSegmenter"):
+        self.segmenter = segmenter
+        self.lookback = segmenter.lookback
+        self.stats = segmenter.stats
+        self.offset = 0  # 已提交的位置
+        self.end = 0  # 已输入的位置
+        self.text = ""  # 从 text_start 开始保留的文本
+        self.text_start = 0
+        self.anchors = [0]  # 已确认的句子起始位置，首个等于 text_start
+        self.last_call = None  # (end, suffix, bounds)
+        # 分割器声明的可能产生边界的字符，没有声明时任何字符都可能
+        self.boundary_chars = getattr(segmenter.segmenter, "boundary_chars", None)
+
+    def feed(self, chars: str):
+        self.text += chars
+        self.end += len(chars)
+
+    def boundaries(self, suffix: str = "") -> List[int]:
+        """Start offsets of the sentences after the committed offset, as if the
+        uncommitted text were followed by `suffix`."""
+        self.stats["calls"] += 1
+        self.stats["requested_chars"] += self.end - self.offset + len(suffix)
+        if self.last_call is not None and self.last_call[:2] == (self.end, suffix):
+            self.stats["hits"] += 1
+            return self.last_call[2][:]
+
+        # 从最后一个确认位置往前 lookback 个句子开始分割
+        stable = self.anchors[-1]
+        start = self.anchors[max(0, len(self.anchors) - 1 - self.lookback)]
+        text = self.text[start - self.text_start :]
+        segmenteds = self.segmenter.segmenter(text + suffix)
+        bounds = to_boundaries(text + suffix, segmenteds[:-1], start)
+        bounds = [b for b in bounds if b > stable]
+        self.stats["hits" if stable > self.offset else "misses"] += 1
+        self.stats["segmented_chars"] += len(text) + len(suffix)
+
+        # 之后还有边界的位置不会再改变
+        inside = [b for b in bounds if b < self.end]
+        if len(inside) > 1:
+            self.anchors += inside[:-1]
+            self.trim()
+
+        idx = bisect.bisect_right(self.anchors, self.offset)
+        result = self.anchors[idx:] + [b for b in bounds if b > self.anchors[-1]]
+        self.last_call = (self.end, suffix, result)
+        return result[:]
+
+    def commit(self, offset: int):
+        """Drop the text before `offset`, keeping `lookback` confirmed sentences
+        as context when `offset` is a confirmed boundary."""
+        if offset <= self.offset:
+            return
+        self.offset = offset
+        self.last_call = None
+        idx = bisect.bisect_left(self.anchors, offset)
+        if idx < len(self.anchors) and self.anchors[idx] == offset:
+            self.trim()
+        else:  # 从句子中间提交时，从该位置重新分割
+            self.anchors = [offset]
+            self.text = self.text[offset - self.text_start :]
+            self.text_start = offset
+
+    def trim(self):
+        # 只保留提交位置之前 lookback 个句子作为上下文
+        idx = bisect.bisect_right(self.anchors, self.offset) - 1
+        idx = max(0, idx - self.lookback)
+        if idx > 0:
+            self.anchors = self.anchors[idx:]
+            self.text = self.text[self.anchors[0] - self.text_start :]
+            self.text_start = self.anchors[0]
+
+
+class MemoizedSegmenter(object):
+    """Make any segmenter `f(text) -> List[str]` incremental for the pipelines
+    by remembering the boundaries that can no longer change.
+
+    `stats` counts the calls served from confirmed boundaries (`hits`), those
+    that had to segment all uncommitted text (`misses`), and the characters
+    requested by the pipelines versus those actually segmented.
+    """
+
+    def __init__(self, segmenter: Callable[[str], List[str]], lookback: int = 1):
+        self.segmenter = segmenter
+        self.lookback = lookback
+        self.stats: Dict[str, int] = {
+            "calls": 0,
+            "hits": 0,
+            "misses": 0,
+            "requested_chars": 0,
+            "segmented_chars": 0,
+        }
+
+    def __call__(self, text: str) -> List[str]:
+        return self.segmenter(text)
+
+    def create_stream(self) -> MemoizedStream:
+        return MemoizedStream(self)
@@ -0,0 +1,113 @@
+import json
+import bisect
+from typing import Any, Dict, Iterable, List
+
+
+# 按指标名的后缀选择直方图的桶
+default_buckets: Dict[str, List[float]] = {
+    "_seconds": [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    "_chars": [5, 10, 20, 30, 50, 70, 100, 150, 200, 500],
+    "_depth": [0, 1, 2, 5, 10, 20, 50, 100, 1000],
+}
+
+
+class Histogram(object):
+    """Cumulative-bucket histogram, as in Prometheus."""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "buckets": self.buckets,
+            "counts": self.counts[:],
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+class MetricsAggregator(object):
+    """In-process metrics sink for the pipelines and the manager.
+
+    Any object with the same `inc`, `observe` and `set` methods can be passed
+    to the pipelines instead, e.g. an adapter to an existing metrics client.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            buckets = next(
+                (b for suffix, b in default_buckets.items() if name.endswith(suffix)),
+                default_buckets["_seconds"],
+            )
+            histogram = self.histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {k: h.snapshot() for k, h in self.histograms.items()},
+        }
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up the snapshots of several aggregators, e.g. one per worker."""
+    merged: Dict[str, Any] = {"counters": {}, "gauges": {}, "histograms": {}}
+    for snapshot in snapshots:
+        for kind in ["counters", "gauges"]:
+            for name, value in snapshot[kind].items():
+                merged[kind][name] = merged[kind].get(name, 0) + value
+        for name, h in snapshot["histograms"].items():
+            m = merged["histograms"].get(name)
+            if m is None:
+                merged["histograms"][name] = {**h, "counts": h["counts"][:]}
+                continue
+            m["counts"] = [a + b for a, b in zip(m["counts"], h["counts"])]
+            m["sum"] += h["sum"]
+            m["count"] += h["count"]
+    return merged
+
+
+def to_json(snapshot: Dict[str, Any]) -> str:
+    return json.dumps(snapshot, ensure_ascii=False)
+
+
+def to_prometheus(snapshot: Dict[str, Any], prefix: str = "seg2stream") -> str:
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        lines += [
+            f"# TYPE {prefix}_{name}_total counter",
+            f"{prefix}_{name}_total {value}",
+        ]
+    for name, value in sorted(snapshot["gauges"].items()):
+        lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+    for name, h in sorted(snapshot["histograms"].items()):
+        lines.append(f"# TYPE {prefix}_{name} histogram")
+        cumulative = 0
+        for bound, count in zip(h["buckets"] + ["+Inf"], h["counts"]):
+            cumulative += count
+            lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{prefix}_{name}_sum {h['sum']}")
+        lines.append(f"{prefix}_{name}_count {h['count']}")
+    return "\n".join(lines) + "\n"
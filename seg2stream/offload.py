@@ -0,0 +1,79 @@
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, List, Literal
+
+
+_pool_segmenter: Any = None  # 进程池中每个进程各自持有的分割器
+
+
+def _install_segmenter(segmenter: Any):
+    global _pool_segmenter
+    _pool_segmenter = segmenter
+
+
+def _call_segmenter(segmenter: Any, method: str, arg: Any):
+    if segmenter is None:
+        segmenter = _pool_segmenter
+    return getattr(segmenter, method)(arg)
+
+
+class OffloadedSegmenter:
+    """Run a blocking segmenter in a thread or process pool, so that slow calls
+    do not stall the other sessions on the event loop.
+
+    With a process pool the segmenter is pickled once into every pool process.
+    """
+
+    def __init__(
+        self,
+        segmenter: Any,
+        executor: Literal["thread", "process"] = "thread",
+        max_workers: int = 1,
+    ):
+        self.segmenter = segmenter
+        self.executor: Executor
+        if executor == "process":
+            self.executor = ProcessPoolExecutor(
+                max_workers, initializer=_install_segmenter, initargs=(segmenter,)
+            )
+            self.call = functools.partial(_call_segmenter, None)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers)
+            self.call = functools.partial(_call_segmenter, segmenter)
+        if hasattr(segmenter, "segment_batch"):
+            self.segment_batch = segmenter.segment_batch
+
+    def __call__(self, text: str) -> List[str]:
+        return self.segmenter(text)
+
+    async def segment_async(self, text: str) -> List[str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.call, "__call__", text)
+
+    async def segment_batch_async(self, texts: List[str]) -> List[List[str]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self.call, "segment_batch", texts
+        )
+
+    def close(self):
+        # 等待进程池退出：工作进程结束时会先关闭队列再等待子进程，不等待可能永远阻塞
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def offload_segmenters(
+    segmenters: List[Any],
+    executor: Literal["thread", "process"] = "thread",
+    max_workers: int = 1,
+) -> List[Any]:
+    """Wrap the segmenters that run on whole buffers. Incremental segmenters
+    (with `create_stream`) only process the new characters and are kept."""
+    return [
+        (
+            s
+            if hasattr(s, "create_stream")
+            else OffloadedSegmenter(s, executor, max_workers)
+        )
+        for s in segmenters
+    ]
@@ -0,0 +1,122 @@
+import time
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+
+@dataclass(frozen=True)
+class SegmenterHandle:
+    """A segmenter identified by its level, method and options.
+
+    Cheap to pickle, e.g. into the segmentation processes: only the name is
+    sent, and the segmenter is loaded by `registry` in the process that first
+    uses it, at most once per process, then shared by all its sessions. The
+    other interfaces of the segmenter (`create_stream`, `segment_batch`...)
+    are available on the handle.
+    """
+
+    level: str
+    method: str
+    options: Tuple[Tuple[str, Any], ...] = ()
+
+    def __reduce__(self):
+        # 不序列化已加载的分割器
+        return (SegmenterHandle, (self.level, self.method, self.options))
+
+    def load(self) -> Any:
+        segmenter = self.__dict__.get("_segmenter")
+        if segmenter is None:
+            segmenter = registry.get(self)
+            object.__setattr__(self, "_segmenter", segmenter)
+        return segmenter
+
+    def __call__(self, text: str) -> List[str]:
+        return self.load()(text)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def provides(self, name: str) -> bool | None:
+        """Whether the segmenter has the interface `name`, without loading it:
+        known once loaded in this process, or when the factory is the class
+        itself, else None."""
+        segmenter = self.__dict__.get("_segmenter", registry.segmenters.get(self))
+        if segmenter is not None:
+            return hasattr(segmenter, name)
+        factory = registry.factories[(self.level, self.method)]
+        if isinstance(factory, type):
+            return hasattr(factory, name)
+        return None
+
+
+def provides(segmenter: Any, name: str) -> bool | None:
+    """`hasattr`, but a handle answers without loading its segmenter, see
+    `SegmenterHandle.provides`."""
+    if isinstance(segmenter, SegmenterHandle):
+        return segmenter.provides(name)
+    return hasattr(segmenter, name)
+
+
+class SegmenterRegistry:
+    """Factories of the segmenters by level and method, and the segmenters
+    loaded from them in this process, with their load times."""
+
+    def __init__(self):
+        self.factories: Dict[Tuple[str, str], Callable[..., Any]] = {}
+        self.validators: Dict[Tuple[str, str], Callable[..., None]] = {}
+        self.segmenters: Dict[SegmenterHandle, Any] = {}  # 已加载的分割器
+        self.load_times: Dict[SegmenterHandle, float] = {}  # 加载耗时（秒）
+        self.lock = threading.Lock()  # 多个线程同时使用时只加载一次
+
+    def register(
+        self,
+        level: str,
+        method: str,
+        factory: Callable[..., Any],
+        validate: Callable[..., None] | None = None,
+    ):
+        """`factory(**options)` creates the segmenter of a handle.
+        `validate(**options)` raises ValueError for options the factory would
+        fail on, when the handle is created rather than in the workers."""
+        self.factories[(level, method)] = factory
+        if validate is not None:
+            self.validators[(level, method)] = validate
+
+    def handle(self, level: str, method: str, **options: Any) -> SegmenterHandle:
+        if (level, method) not in self.factories:
+            methods = [m for l, m in self.factories if l == level]
+            raise ValueError(
+                f"Unknown {level} segmenter {method!r}, expected one of {methods}."
+            )
+        validate = self.validators.get((level, method))
+        if validate is not None:
+            validate(**options)
+        return SegmenterHandle(level, method, tuple(sorted(options.items())))
+
+    def get(self, handle: SegmenterHandle) -> Any:
+        segmenter = self.segmenters.get(handle)
+        if segmenter is not None:
+            return segmenter
+        with self.lock:
+            segmenter = self.segmenters.get(handle)
+            if segmenter is None:
+                factory = self.factories[(handle.level, handle.method)]
+                started = time.perf_counter()
+                segmenter = factory(**dict(handle.options))
+                self.load_times[handle] = time.perf_counter() - started
+                self.segmenters[handle] = segmenter
+        return segmenter
+
+    def warm_up(self, segmenters: List[Any]) -> Dict[SegmenterHandle, float]:
+        """Load the segmenters given by handles now rather than on first use,
+        and return the load time of each (0 if already loaded)."""
+        handles = [s for s in segmenters if isinstance(s, SegmenterHandle)]
+        loaded = set(self.segmenters)
+        for handle in handles:
+            handle.load()
+        return {h: 0.0 if h in loaded else self.load_times[h] for h in handles}
+
+
+registry = SegmenterRegistry()  # 进程内共享的注册表
@@ -2,8 +2,11 @@ from dataclasses import dataclass
 import asyncio
 from asyncio import Queue
 import time
-import re
-from typing import List, Callable, Union, AsyncGenerator
+from typing import List, Callable, Union, AsyncGenerator, Literal
+
+from .segment_buffer import Segment, SegmentBuffer, SegmentHistory
+from .segmenters import to_boundaries, get_boundary_chars
+from .clock import VirtualClock
 
 
 @dataclass
@@ -14,23 +17,74 @@ class SegmentationConfig:
     max_stream_time: float  # 流式超时时间
     first_min_seg_size: int
     min_seg_size: int
+    step_granularity: Literal["char", "chunk"] = "char"  # 分割条件的检查粒度
+    # 保留的分割历史：全部、最近 retention_size 个片段或字符、不保留
+    retention: Literal["all", "segments", "chars", "none"] = "all"
+    retention_size: int = 0
+    flush_size: int = 1  # 生成器每次至少输出的字符数，片段结束时除外
+    flush_window: float = 0.0  # 不足 flush_size 时最多等待的时间
+
+
+class SegmentationCore:
+    """Synchronous state machine of the generator pipeline: `feed(text, now)`
+    and `finish(now)` return the segments they complete."""
 
+    __slots__ = (
+        "config",
+        "segmenters",
+        "metrics",
+        "clock",
+        "on_spill",
+        "outputs",
+        "history",
+        "source",
+        "segmenteds",
+        "buffer",
+        "streams",
+        "is_async",
+        "is_started",
+        "is_cancelled",
+        "is_finished",
+        "is_detecting",
+        "detect_start_time",
+        "min_seg_size",
+        "start_time",
+    )
 
-class SegmentationPipeline:
     def __init__(
-        self, config: SegmentationConfig, segmenters: List[Callable[[str], str]]
+        self,
+        config: SegmentationConfig,
+        segmenters: List[Callable[[str], str]],
+        metrics=None,
+        clock: Callable[[], float] = time.monotonic,
+        on_spill: Union[Callable[[List[Segment], str], None] | None] = None,
     ):
         self.config = config  # 固定配置
         self.segmenters = segmenters
+        self.metrics = metrics  # 指标收集器，如 MetricsAggregator
+        self.clock = clock  # 计时用的时钟，如回放时的 VirtualClock
+        self.on_spill = on_spill  # 接收按 retention 丢弃的分割历史
         self.reset_status()
 
     def reset_status(self):
-        self.in_queue: Queue = Queue()  # 接收外部输入的文本流
-        self.out_queue: Queue = Queue()  # 输出分割结果到外部
-        self.mid_queue: Queue = Queue()  # 传递文本到异步生成器
-        self.source: List[str] = []  # 存储原始输入的文本流
-        self.segmenteds: List[str] = []  # 存储分割结果
-        self.buffer: str = ""  # 缓存输入的文本流
+        self.outputs: List[Segment] = []  # 尚未被 feed 或 finish 返回的分割结果
+        self.history = SegmentHistory(
+            self.config.retention, self.config.retention_size, self.on_spill
+        )
+        self.source: List[str] = self.history.source  # 存储原始输入的文本流
+        self.segmenteds: List[Segment] = self.history.segments  # 存储分割结果
+        self.buffer: SegmentBuffer = SegmentBuffer()  # 缓存输入的文本流
+        self.streams: list = [  # 增量分割器，只处理新增的字符
+            s.create_stream() if hasattr(s, "create_stream") else None
+            for s in self.segmenters
+        ]
+        self.is_async: bool = any(  # 是否需要等待异步分割器，只能由异步流水线处理
+            stream is None and hasattr(s, "segment_async")
+            for s, stream in zip(self.segmenters, self.streams)
+        )
+        self.is_started: bool = False  # 是否已开始计时
+        self.is_cancelled: bool = False  # 是否已取消，取消后不再处理输入
+        self.is_finished: bool = False  # 是否已结束输入
         self.is_detecting: bool = False  # 是否在检测
         self.detect_start_time: Union[float | None] = None  # 检测开始时间
         self.min_seg_size: int = 0  # 当前最小分割大小
@@ -38,95 +92,472 @@ class SegmentationPipeline:
     def get_segmenteds(self):
         return self.segmenteds
 
-    def fill(self, text: Union[str | None]):
-        self.in_queue.put_nowait(text)
-
-    def fire(self, finished=False):
-        if len(self.buffer) > 0:
-            self.segmenteds.append(self.buffer)
-            self.buffer = ""
-            self.mid_queue.put_nowait(None)
-            self.is_detecting = False
+    def fire(self, offset: Union[int | None] = None, forced=False):
+        if len(self.buffer) == 0:
+            return
+        start = self.buffer.start
+        end = self.buffer.end if offset is None else offset
+        if self.metrics is not None:
+            self.on_fire(end - start, forced)
+        segmented = Segment(
+            self.buffer.text(start, end),
+            self.buffer.source_offset(start),
+            self.buffer.source_offset(end),
+        )
+        self.history.append(segmented)
+        self.buffer.commit(end)
+        for stream in self.streams:
+            if stream is not None:
+                stream.commit(end)
+        self.emit(segmented)
+        self.is_detecting = False
+        if len(self.history) == 1:
             self.on_first_segment()
 
-        if not finished:
-            self.out_queue.put_nowait(self.get_async_generator())
-        else:
-            self.out_queue.put_nowait(None)
+    def emit(self, segmented: Segment):
+        self.outputs.append(segmented)
 
-    async def output_stream(self, interval=0.001):
-        start_time = time.time()
-        while True:
-            try:
-                generator: Union[AsyncGenerator[str, None] | None] = (
-                    self.out_queue.get_nowait()
-                )
-                if generator is None:
-                    return
-                start_time = time.time()
-                yield generator
-            except asyncio.QueueEmpty:
-                if (time.time() - start_time) > self.config.max_stream_time:
-                    return
-                await asyncio.sleep(interval)
+    def append(self, text: str, forward=True):
+        self.buffer.append(text)  # 累积缓存
+        for stream in self.streams:
+            if stream is not None:
+                stream.feed(text)
+        if forward:
+            self.forward_text(text)
 
-    async def get_async_generator(self):
-        while True:
-            item = await self.mid_queue.get()
-            if item is None:
-                return
-            yield item
+    def forward(self, start: int, end: int):
+        if end > start:
+            self.forward_text(self.buffer.text(start, end))
 
-    async def step(self):
-        self.on_start()
-        while True:
-            text = await self.in_queue.get()
-            if text is None:
+    def forward_text(self, text: str):
+        """Characters of the segment being built, as soon as they are known."""
+
+    def step(self, text: str, now: Union[float | None] = None):
+        for char in text:  # 以字符粒度分割
+            self.append(char)
+            can_detection, is_waiting_timeout = self.check_conditions(now)
+            if can_detection and (is_waiting_timeout or self.detect_breakpoint()):
+                self.fire(forced=is_waiting_timeout)
+            self.postprocessing()
+
+    def step_chunk(self, text: str, now: Union[float | None] = None):
+        """Segment a whole chunk at once, checking the conditions only at the
+        characters where the per-character path could have acted."""
+        now = self.clock() if now is None else now
+        i, n = 0, len(text)
+        while i < n:
+            if not self.is_detecting:
+                # 跳到首个达到最小分割大小的字符
+                k = max(i, i + self.min_seg_size - len(self.buffer) - 1)
+            else:
+                # 跳到首个可能是断点的字符
+                k = self.find_breakpoint_char(text, i, now)
+            if k >= n:
+                self.append(text[i:])
                 return
-            self.source.append(text)
-            text = re.sub(r"\s+", " ", text)
-            if len(text) > 0:
-                for char in text:  # 以字符粒度分割
-                    self.buffer += char  # 累积缓存
-                    self.mid_queue.put_nowait(char)
-                    can_detection, is_waiting_timeout = self.check_conditions()
-                    yield can_detection, is_waiting_timeout
-                    self.postprocessing()
+            self.append(text[i : k + 1])
+            i = k + 1
+            can_detection, is_waiting_timeout = self.check_conditions(now)
+            if can_detection and (is_waiting_timeout or self.detect_breakpoint()):
+                self.fire(forced=is_waiting_timeout)
+            self.postprocessing()
+
+    def find_breakpoint_char(self, text: str, i: int, now: float) -> int:
+        """The first character of `text` from `i` on that can end a sentence:
+        one of the `boundary_chars` of the segmenters, or the next one when the
+        waiting has timed out or a segmenter can split anywhere."""
+        if (now - self.detect_start_time) > self.config.max_waiting_time:
+            return i
+        chars = get_boundary_chars(self.streams)
+        if chars is None:
+            return i
+        for k in range(i, len(text)):
+            if text[k] in chars:
+                return k
+        return len(text)
 
     def detect_breakpoint(self):
-        target_text = self.buffer + self.config.segmentation_suffix
-        for segmenter in self.segmenters:
-            tail = segmenter(target_text)[-1]
-            if tail == self.config.segmentation_suffix:
+        suffix = self.config.segmentation_suffix
+        for segmenter, stream in zip(self.segmenters, self.streams):
+            started = time.perf_counter() if self.metrics is not None else None
+            if stream is None:
+                is_breakpoint = segmenter(self.buffer.text() + suffix)[-1] == suffix
+            else:
+                # 后缀单独成句，即最后一个句子从缓存末尾开始
+                bounds = stream.boundaries(suffix)
+                last = bounds[-1] if bounds else self.buffer.start
+                is_breakpoint = last == self.buffer.end
+            if started is not None:
+                self.on_segmenter_call(started)
+            if is_breakpoint:
                 return True
         return False
 
-    async def segment(self):
-        async for can_detection, is_waiting_timeout in self.step():
-            if can_detection and (is_waiting_timeout or self.detect_breakpoint()):
-                self.fire()
-        self.fire(True)
+    def add_source(self, text: str) -> str:
+        self.source.append(text)
+        return self.buffer.add_source(text)
 
-    def on_start(self):
-        self.fire()
+    def start(self, now: Union[float | None] = None):
+        if not self.is_started:
+            self.is_started = True
+            self.on_start(now)
+
+    def feed(self, text: str, now: Union[float | None] = None) -> List[Segment]:
+        """Process a chunk of text at time `now` (the clock by default) and
+        return the segments it completes."""
+        if self.is_cancelled:
+            return []
+        self.start(now)
+        text = self.add_source(text)
+        # 时间固定时，按块检查与逐字符检查的结果相同
+        if now is not None or self.config.step_granularity == "chunk":
+            self.step_chunk(text, now)
+        else:
+            self.step(text)
+        return self.take_outputs()
+
+    def finish(self, now: Union[float | None] = None) -> List[Segment]:
+        """End the input and return the remaining segment, if any."""
+        if self.is_cancelled:
+            return []
+        self.start(now)
+        self.is_finished = True
+        self.fire(forced=True)
+        return self.take_outputs()
+
+    def take_outputs(self) -> List[Segment]:
+        outputs, self.outputs = self.outputs, []
+        return outputs
+
+    def cancel(self) -> Segment:
+        """Stop the session at once, e.g. when the user barges in, and return
+        the text that was received but not output."""
+        text = self.buffer.text()
+        remainder = Segment(
+            text, self.history.tail_start(len(text)), self.buffer.source_size
+        )
+        self.is_cancelled = True
+        # 释放缓存，之后的 feed 和 finish 不再有输出
+        self.outputs = []
+        self.buffer = SegmentBuffer()
+        self.streams = [None] * len(self.segmenters)
+        return remainder
+
+    def on_start(self, now: Union[float | None] = None):
         self.min_seg_size = self.config.first_min_seg_size
+        self.start_time = self.clock() if now is None else now
 
     def on_first_segment(self):
+        if self.metrics is not None:
+            self.metrics.observe(
+                "time_to_first_segment_seconds", self.clock() - self.start_time
+            )
         self.min_seg_size = self.config.min_seg_size
-        setattr(self, "on_first_segment", lambda: None)
 
-    def check_conditions(self):
+    def on_fire(self, size: int, forced: bool):
+        self.metrics.inc("fires_forced" if forced else "fires_natural")
+        self.metrics.observe("segment_chars", size)
+        if self.is_detecting:
+            self.metrics.observe(
+                "segmentation_seconds", self.clock() - self.detect_start_time
+            )
+
+    def on_segmenter_call(self, started: float):
+        self.metrics.inc("segmenter_calls")
+        self.metrics.observe("segmenter_call_seconds", time.perf_counter() - started)
+
+    def check_conditions(self, now: Union[float | None] = None):
+        now = self.clock() if now is None else now
         if self.is_detecting:
             is_waiting_timeout = (
-                time.time() - self.detect_start_time
+                now - self.detect_start_time
             ) > self.config.max_waiting_time
+            if is_waiting_timeout and self.metrics is not None:
+                self.metrics.inc("waiting_timeouts")
             return True, is_waiting_timeout
 
         can_detection = len(self.buffer) >= self.min_seg_size
         if can_detection:
             self.is_detecting = True
-            self.detect_start_time = time.time()
+            self.detect_start_time = now
         return can_detection, False
 
+    def next_deadline(self) -> Union[float | None]:
+        """When the waiting for a breakpoint times out if no more text
+        arrives, or None if no breakpoint is being detected."""
+        if self.is_cancelled or self.is_finished or not self.is_detecting:
+            return None
+        if len(self.buffer) == 0:
+            return None
+        return self.detect_start_time + self.config.max_waiting_time
+
+    def tick(self, now: Union[float | None] = None) -> List[Segment]:
+        """Act on the waiting timeout if it expired by `now` (the clock by
+        default), and return the segment it completes. Lets the pending text
+        go out when the input stalls."""
+        if self.is_cancelled:
+            return []
+        now = self.clock() if now is None else now
+        deadline = self.next_deadline()
+        if deadline is not None and deadline <= now:
+            if self.metrics is not None:
+                self.metrics.inc("waiting_timeouts")
+            self.fire(forced=True)
+            self.postprocessing()
+        return self.take_outputs()
+
     def postprocessing(self):
         pass
+
+
+class SegmentationPipeline(SegmentationCore):
+    """Asyncio adapter of `SegmentationCore`: every segment is output as an
+    async generator that yields its characters as they arrive, instead of
+    being returned by `feed` and `finish`."""
+
+    def reset_status(self):
+        super().reset_status()
+        self.in_queue: Queue = Queue()  # 接收外部输入的文本流
+        self.out_queue: Queue = Queue()  # 输出分割结果到外部
+        self.mid_queue: Queue = Queue()  # 传递文本到异步生成器
+        self.pending: List[str] = []  # 尚未传递到异步生成器的文本
+        self.forwarded: int = 0  # 异步分割时已传递给生成器的位置
+        self.is_receiving: bool = False  # 是否在等待新的文本，即已处理完到达的文本
+        self.idle = asyncio.Event()  # 等待新的文本且没有未处理的文本时置位
+        self.task: Union[asyncio.Task | None] = None  # 运行 segment 的任务
+        self.timer: Union[asyncio.TimerHandle | None] = None  # 等待超时的定时器
+        self.timer_deadline: Union[float | None] = None  # 定时器对应的截止时间
+
+    def fill(self, text: Union[str | None]):
+        if not self.is_cancelled:
+            self.in_queue.put_nowait(text)
+            self.idle.clear()
+
+    def schedule(self):
+        """Arm a timer for the next deadline of the core, so the waiting times
+        out even when no more text arrives. Pipelines on a `VirtualClock` are
+        ticked by `replay_virtual` instead."""
+        deadline = self.next_deadline()
+        if deadline == self.timer_deadline:
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.timer_deadline = deadline
+        if deadline is not None and not isinstance(self.clock, VirtualClock):
+            loop = asyncio.get_running_loop()
+            self.timer = loop.call_later(deadline - self.clock(), self.on_timer)
+
+    def on_timer(self):
+        """Wake `segment` with an empty text to act on the expired timeout."""
+        self.timer = None
+        self.timer_deadline = None
+        self.fill("")
+
+    def forward_text(self, text: str):
+        self.pending.append(text)
+
+    def flush(self):
+        """Pass the pending text to the generator as one item."""
+        if len(self.pending) > 0:
+            self.mid_queue.put_nowait("".join(self.pending))
+            self.pending = []
+
+    def emit(self, segmented: Segment):
+        if self.metrics is not None:
+            self.metrics.observe("out_queue_depth", self.out_queue.qsize())
+        self.flush()
+        self.mid_queue.put_nowait(None)  # 结束当前的生成器
+        if not self.is_finished:
+            self.out_queue.put_nowait(self.get_async_generator())
+
+    async def output_stream(self):
+        # 流式超时按注入的时钟计算
+        deadline = self.clock() + self.config.max_stream_time
+        while True:
+            try:
+                generator: Union[AsyncGenerator[str, None] | None] = (
+                    self.out_queue.get_nowait()
+                )
+            except asyncio.QueueEmpty:
+                timeout = deadline - self.clock()
+                if timeout <= 0:
+                    return
+                if isinstance(self.clock, VirtualClock):
+                    # 虚拟时间不会自行前进，在下一个输出到达时判断是否已超时
+                    generator = await self.out_queue.get()
+                    if self.clock() > deadline:
+                        return
+                else:
+                    try:
+                        generator = await asyncio.wait_for(
+                            self.out_queue.get(), timeout
+                        )
+                    except asyncio.TimeoutError:  # 流式超时
+                        return
+            if generator is None:
+                return
+            deadline = self.clock() + self.config.max_stream_time
+            yield generator
+
+    async def get_async_generator(self):
+        """Yield the text of one segment, everything that arrived since the
+        last read at once."""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.mid_queue.get()
+            if item is None:
+                return
+            texts, size = [item], len(item)
+            deadline = loop.time() + self.config.flush_window
+            while True:
+                try:
+                    item = self.mid_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if size >= self.config.flush_size or timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.mid_queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:  # 片段结束
+                    yield "".join(texts)
+                    return
+                texts.append(item)
+                size += len(item)
+            yield "".join(texts)
+
+    async def receive(self, coalesce=False):
+        self.out_queue.put_nowait(self.get_async_generator())
+        self.start()
+        while True:
+            self.is_receiving = True
+            if self.in_queue.empty():
+                self.idle.set()
+            texts = [await self.in_queue.get()]
+            self.is_receiving = False
+            if coalesce:  # 合并所有已到达的文本
+                while texts[-1] is not None and not self.in_queue.empty():
+                    texts.append(self.in_queue.get_nowait())
+            is_end = texts[-1] is None
+            if is_end:
+                texts.pop()
+            if self.metrics is not None:
+                self.metrics.observe("in_queue_depth", self.in_queue.qsize())
+            text = "".join([self.add_source(t) for t in texts if len(t) > 0])
+            if len(text) > 0 or not is_end:  # 空文本由定时器放入，用于处理超时
+                yield text
+            if is_end:
+                return
+
+    async def detect_breakpoints_async(self):
+        """Offsets in the buffer where a sentence ends, as if the buffer were
+        followed by the suffix."""
+        suffix = self.config.segmentation_suffix
+        start, end = self.buffer.start, self.buffer.end
+        breakpoints = set()
+        for segmenter, stream in zip(self.segmenters, self.streams):
+            started = time.perf_counter() if self.metrics is not None else None
+            if stream is None:
+                text = self.buffer.text()
+                if hasattr(segmenter, "segment_async"):
+                    segmenteds = await segmenter.segment_async(text + suffix)
+                else:
+                    segmenteds = segmenter(text + suffix)
+                bounds = to_boundaries(text, segmenteds[:-1], start)
+                if not self.in_queue.empty():
+                    # 调用期间已有新的字符到达，缓存末尾的分割位置依赖后缀，丢弃
+                    bounds = [b for b in bounds if b < end]
+            else:
+                bounds = stream.boundaries(suffix)
+            if started is not None:
+                self.on_segmenter_call(started)
+            breakpoints.update(b for b in bounds if start < b <= end)
+        return sorted(breakpoints)
+
+    def cancel(self) -> Segment:
+        """Also drop the text the generators have not yielded yet, end them and
+        `output_stream`, and stop `segment` without waiting for the
+        segmenters."""
+        texts = []
+        while not self.mid_queue.empty():
+            item = self.mid_queue.get_nowait()
+            if item is not None:
+                texts.append(item)
+        texts += self.pending
+        if self.is_async and self.forwarded < self.buffer.end:  # 等待分割结果的文本
+            texts.append(self.buffer.text(max(self.forwarded, self.buffer.start)))
+        while not self.in_queue.empty():  # 未处理的文本也属于剩余文本
+            text = self.in_queue.get_nowait()
+            if text is not None and len(text) > 0:
+                texts.append(self.add_source(text))
+        text = "".join(texts)
+        remainder = Segment(
+            text, self.history.tail_start(len(text)), self.buffer.source_size
+        )
+        self.pending = []
+        super().cancel()
+        self.schedule()  # 取消后没有截止时间，即取消定时器
+        while not self.out_queue.empty():
+            self.out_queue.get_nowait()
+        self.mid_queue.put_nowait(None)  # 结束当前的生成器
+        self.out_queue.put_nowait(None)
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+        return remainder
+
+    async def step_async(self, text: str):
+        """Check a chunk with one segmentation call. Its characters are passed
+        to the generators once the breakpoints among them are known."""
+        self.forwarded = self.buffer.end
+        self.append(text, forward=False)
+        can_detection, is_waiting_timeout = self.check_conditions()
+        if can_detection and not is_waiting_timeout:
+            for bound in await self.detect_breakpoints_async():
+                # 上次丢弃的末尾位置 (forwarded) 在这次重新判断
+                size = bound - self.buffer.start
+                if bound >= self.forwarded and size >= self.min_seg_size:
+                    self.forward(self.forwarded, bound)
+                    self.forwarded = bound
+                    self.fire(offset=bound)
+        self.forward(self.forwarded, self.buffer.end)
+        self.forwarded = self.buffer.end
+        if is_waiting_timeout:
+            self.fire(forced=True)
+
+    async def segment(self):
+        self.task = asyncio.current_task()
+        if self.is_cancelled:
+            return
+        try:
+            if self.is_async:
+                # 等待检测结果期间到达的文本，下次一起处理
+                async for text in self.receive(coalesce=True):
+                    if len(text) == 0:
+                        self.tick()
+                    else:
+                        await self.step_async(text)
+                    self.flush()
+                    self.schedule()
+            else:
+                async for text in self.receive():
+                    if len(text) == 0:
+                        self.tick()
+                    elif self.config.step_granularity == "chunk":
+                        self.step_chunk(text)
+                    else:
+                        self.step(text)
+                    self.flush()  # 每段到达的文本只传递一次
+                    self.schedule()
+            if len(self.buffer) == 0:  # 结束最后一个生成器，否则其消费者会一直等待
+                self.mid_queue.put_nowait(None)
+            self.finish()
+            self.out_queue.put_nowait(None)
+        except asyncio.CancelledError:  # 被 cancel 取消时正常结束
+            if not self.is_cancelled:
+                raise
+        finally:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
@@ -2,8 +2,29 @@ from dataclasses import dataclass
 import asyncio
 from asyncio import Queue
 import time
-import re
-from typing import List, Callable, Union
+from typing import List, Callable, Union, Literal
+
+from .segment_buffer import (
+    Segment,
+    SegmentBuffer,
+    SegmentHistory,
+    join_segments,
+    whitespace_ptn,
+)
+from .segmenters import to_boundaries, get_boundary_chars
+from .clock import VirtualClock
+
+
+num_timings = 5  # 计算平均值的最近计时个数
+num_feedbacks = 64  # 可以通过 report_playback 反馈的最近片段数
+
+
+def add_recent(values: list, value, size: int):
+    """Append to a list that keeps only the last `size` values. For a few
+    values a list is much smaller than a `deque`."""
+    values.append(value)
+    if len(values) > size:
+        del values[0]
 
 
 @dataclass
@@ -23,33 +44,101 @@ class SegmentationConfig:
     loose_size: int  # 松弛大小
     fade_in_out_time: float  # 淡入淡出时间
     seconds_per_word: float  # 每词说话时长
-    # first_chunk_synthesis_time: float
-    # first_chunk_transfer_time: float
+    step_granularity: Literal["char", "chunk"] = "char"  # 分割条件的检查粒度
+    # 保留的分割历史：全部、最近 retention_size 个片段或字符、不保留
+    retention: Literal["all", "segments", "chars", "none"] = "all"
+    retention_size: int = 0
+    # 收到 report_playback 的实测值之前使用的估计
+    first_chunk_synthesis_time: float = 0.0  # 合成首块时间
+    first_chunk_transfer_time: float = 0.0  # 传输首块时间
+    # 级联分割：segmenters 为由粗到细的层级 (如句子、短语、韵律)，先只用第一级，
+    # 每过 max_waiting_time 的一等份或缓存超过 max_seg_size 时才加入更细的层级
+    cascade: bool = False
 
 
-class SegmentationPipeline:
+class SegmentationCore:
     """### 动态调整累积时间 \n
     - 假设：生成首块后，后续播放连续 \n
     - 预留时间 = 分割成功时间 (固定为上一次分割成功时间 * 2) + 合成首块时间 (动态计算) + 传输首块时间 (目前固定) + 淡入淡出时间 (固定) \n
     - 累积时间 = 下一次分割开始 - 当前分割完成 \n
     - 总时间 = 累积时间 + 预留时间 = 合成首块时间 (动态计算) + 传输首块时间 (目前固定) + 完整语音时长 (动态计算) \n
-    - 分割策略：累积时间 ==> 开始计算超时时间 ==> 循环 (最多句子检测 -> 最多短语检测 -> 最多韵律检测) 直至超时 ==> 返回剩余缓存
+    - 分割策略：累积时间 ==> 开始计算超时时间 ==> 循环 (最多句子检测 -> 最多短语检测 -> 最多韵律检测) 直至超时 ==> 返回剩余缓存 \n
+    - 级联 (cascade)：越接近超时可用的层级越多，某一级分割成功后不再调用更细的层级 \n
+    - 闭环：消费者通过 report_playback 反馈实际的合成首块时间和语音时长后，按预计的播放结束时间计算累积时间 \n
+    - 同步状态机：`feed(text, now)` 和 `finish(now)` 返回新的分割结果，不依赖 asyncio
     """
 
+    # 属性存储在 slots 中，减少大量会话时每个会话的内存
+    __slots__ = (
+        "config",
+        "segmenters",
+        "metrics",
+        "clock",
+        "on_spill",
+        "outputs",
+        "history",
+        "source",
+        "segmenteds",
+        "last_combined",
+        "combined_span",
+        "buffer",
+        "streams",
+        "is_async",
+        "is_started",
+        "is_cancelled",
+        "is_last_segmented",
+        "is_accumulating",
+        "accu_start_time",
+        "max_buffer_size",
+        "max_accu_time",
+        "seg_start_time",
+        "num_tried_levels",
+        "all_seg_time",
+        "all_first_chunk_time",
+        "all_seconds_per_char",
+        "segment_sizes",
+        "playback_end",
+        "last_reported",
+        "min_seg_size",
+        "num_consec_splits",
+        "start_time",
+    )
+
     def __init__(
-        self, config: SegmentationConfig, segmenters: List[Callable[[str], str]]
+        self,
+        config: SegmentationConfig,
+        segmenters: List[Callable[[str], str]],
+        metrics=None,
+        clock: Callable[[], float] = time.monotonic,
+        on_spill: Union[Callable[[List[Segment], str], None] | None] = None,
     ):
         self.config = config  # 固定配置
         self.segmenters = segmenters
+        self.metrics = metrics  # 指标收集器，如 MetricsAggregator
+        self.clock = clock  # 计时用的时钟，如回放时的 VirtualClock
+        self.on_spill = on_spill  # 接收按 retention 丢弃的分割历史
         self.reset_status()
 
     def reset_status(self):
-        self.in_queue: Queue = Queue()  # 接收外部输入的文本流
-        self.out_queue: Queue = Queue()  # 输出分割结果到外部
-        self.source: List[str] = []  # 存储原始输入的文本流
-        self.segmenteds: List[str] = []  # 存储分割结果
+        self.outputs: List[Segment] = []  # 尚未被 feed 或 finish 返回的分割结果
+        self.history = SegmentHistory(
+            self.config.retention, self.config.retention_size, self.on_spill
+        )
+        self.source: List[str] = self.history.source  # 存储原始输入的文本流
+        self.segmenteds: List[Segment] = self.history.segments  # 存储分割结果
         self.last_combined: str = ""  # 临时保存未满足条件的分割结果
-        self.buffer: str = ""  # 缓存输入的文本流
+        self.combined_span: List[int] = [0, 0]  # 合并结果在原始文本中的位置
+        self.buffer: SegmentBuffer = SegmentBuffer()  # 缓存输入的文本流
+        self.streams: list = [  # 增量分割器，只处理新增的字符
+            s.create_stream() if hasattr(s, "create_stream") else None
+            for s in self.segmenters
+        ]
+        self.is_async: bool = any(  # 是否需要等待异步分割器，只能由异步流水线处理
+            stream is None and hasattr(s, "segment_async")
+            for s, stream in zip(self.segmenters, self.streams)
+        )
+        self.is_started: bool = False  # 是否已开始计时
+        self.is_cancelled: bool = False  # 是否已取消，取消后不再处理输入
         self.is_last_segmented: bool = False  # 用于判断最近是否存在分割
 
         # 用于触发分割条件
@@ -60,7 +149,15 @@ class SegmentationPipeline:
 
         # 用于计算分割时长和超时时间
         self.seg_start_time: Union[float | None] = None  # 分割开始时间
-        self.all_seg_time: List[float] = []  # 保存最近的分割完成时间
+        self.num_tried_levels: int = 0  # 本次等待中已调用的层级数
+        self.all_seg_time: List[float] = []  # 最近的分割完成时间
+
+        # 用于根据合成和播放的反馈调整累积时间
+        self.all_first_chunk_time: List[float] = []  # 最近的首块时间 (合成 + 传输)
+        self.all_seconds_per_char: List[float] = []  # 最近的实际每字符语音时长
+        self.segment_sizes: List[int] = []  # 最近片段的字符数
+        self.playback_end: Union[float | None] = None  # 已反馈片段的播放结束时间
+        self.last_reported: int = -1  # 最后一个已反馈语音时长的片段
 
         # 用于限制分割结果
         self.min_seg_size: int = 0  # 当前最小分割大小
@@ -69,126 +166,381 @@ class SegmentationPipeline:
     def get_segmenteds(self):
         return self.segmenteds
 
-    def fill(self, text: Union[str | None]):
-        self.in_queue.put_nowait(text)
-
-    def fire(self, uncombined_segmenteds: list[str], forced=False, end=False):
-        while len(uncombined_segmenteds) > 0:
-            seg = uncombined_segmenteds.pop(0)
+    def fire(self, bounds: List[int], forced=False):
+        i = 0
+        while i < len(bounds):  # 依次合并缓存中到各个分割位置为止的文本
+            start, bound = self.buffer.start, bounds[i]
+            seg = self.buffer.text(start, bound)
             if len(seg) > 0:
                 striped = seg.strip()
                 lc_len = len(self.last_combined)
                 if lc_len + len(striped) <= self.config.max_seg_size or lc_len == 0:
+                    if len(striped) > 0:
+                        s = start + len(seg) - len(seg.lstrip())
+                        e = bound - len(seg) + len(seg.rstrip())
+                        if lc_len == 0:
+                            self.combined_span[0] = self.buffer.source_offset(s)
+                        self.combined_span[1] = self.buffer.source_offset(e)
                     self.last_combined += striped
-                    e = re.search(re.escape(seg), self.buffer).end()
-                    self.buffer = self.buffer[e:]
+                    self.consume(bound)
+                    i += 1
                 else:
-                    uncombined_segmenteds.insert(0, seg)
                     forced = True
+            else:
+                i += 1
 
             lc_len = len(self.last_combined)
             if lc_len >= self.min_seg_size or (forced and lc_len > 0):
-                self.on_first_segment()
+                if lc_len == 0:  # 只包含空白字符
+                    offset = self.buffer.source_offset(self.buffer.start)
+                    self.combined_span = [offset, offset]
+                segmented = Segment(self.last_combined, *self.combined_span)
+                if self.metrics is not None:
+                    natural = lc_len >= self.min_seg_size
+                    self.metrics.inc("fires_natural" if natural else "fires_forced")
+                    self.metrics.observe("segment_chars", lc_len)
+                if len(self.history) == 0:
+                    self.on_first_segment()
                 self.is_last_segmented = True
-                self.out_queue.put_nowait(self.last_combined)
-                self.segmenteds.append(self.last_combined)
+                self.emit(segmented)
+                self.history.append(segmented)
+                add_recent(self.segment_sizes, lc_len, num_feedbacks)
                 self.last_combined = ""
-        if end:
-            self.out_queue.put_nowait(None)
 
-    async def output_stream(self, interval=0.001):
-        start_time = time.time()
-        while True:
-            try:
-                segmented: Union[str | None] = self.out_queue.get_nowait()
-                if segmented is None:
-                    return
-                start_time = time.time()
-                yield segmented
-            except asyncio.QueueEmpty:
-                if (time.time() - start_time) > self.config.max_stream_time:
-                    return
-                await asyncio.sleep(interval)
+    def emit(self, segmented: Segment):
+        self.outputs.append(segmented)
 
-    async def step(self):
-        self.on_start()
-        while True:
-            text = await self.in_queue.get()
-            if text is None:
-                return
-            self.source.append(text)
-            text = re.sub(r"\s+", " ", text)
-            if len(text) > 0:
-                for char in text:  # 以字符粒度进行分割
-                    self.buffer += char  # 累积缓存
-                    can_segment, is_waiting_timeout = self.check_conditions()
-                    yield can_segment, is_waiting_timeout
-                    self.postprocessing()
-
-    def segment_once(self):
-        for segmenter in self.segmenters:
-            target_text = self.buffer + self.config.segmentation_suffix
-            segmenteds = segmenter(target_text)[:-1]
-            self.fire(segmenteds)
+    def append(self, text: str):
+        self.buffer.append(text)  # 累积缓存
+        for stream in self.streams:
+            if stream is not None:
+                stream.feed(text)
 
-    async def segment(self):
-        async for can_segment, is_waiting_timeout in self.step():
+    def consume(self, offset: int):
+        self.buffer.commit(offset)
+        for stream in self.streams:
+            if stream is not None:
+                stream.commit(offset)
+
+    def step(self, text: str, now: Union[float | None] = None):
+        for char in text:  # 以字符粒度进行分割
+            self.append(char)
+            can_segment, is_waiting_timeout = self.check_conditions(now)
             if can_segment:
-                self.segment_once()
+                self.segment_once(now)
                 if is_waiting_timeout:
-                    self.fire([self.buffer], forced=True)
+                    self.on_waiting_timeout()
+            self.postprocessing(now)
 
+    def step_chunk(self, text: str, now: Union[float | None] = None):
+        """Segment a whole chunk at once, checking the conditions only at the
+        characters where the per-character path could have acted."""
+        now = self.clock() if now is None else now
+        i, n = 0, len(text)
+        while i < n:
+            if self.is_accumulating:
+                # 累积时跳到首个达到累积时间或累积大小的字符
+                if (now - self.accu_start_time) >= self.max_accu_time:
+                    k = i
+                else:
+                    k = max(i, i + self.max_buffer_size - len(self.buffer))
+            else:
+                # 等待时跳到首个可能出现分割位置的字符，之前的字符只计入检查次数
+                k = self.find_boundary_char(text, i, now)
+                self.loosen(k - i)
+            if k >= n:
+                self.append(text[i:])
+                if not self.is_accumulating:
+                    self.num_tried_levels = self.get_levels(now)
+                return
+            self.append(text[i : k + 1])
+            i = k + 1
+            can_segment, is_waiting_timeout = self.check_conditions(now)
+            if can_segment:
+                self.segment_once(now)
+                if is_waiting_timeout:
+                    self.on_waiting_timeout()
+            self.postprocessing(now)
+
+    def advance(self, text: str, now: float):
+        """Append a chunk, checking the conditions at every character but
+        leaving the segmentation to one call at the end of the chunk."""
+        can_segment = is_waiting_timeout = False
+        for char in text:
+            self.append(char)
+            can, is_timeout = self.check_conditions(now)
+            can_segment |= can
+            is_waiting_timeout |= is_timeout
+        return can_segment, is_waiting_timeout
+
+    def find_boundary_char(self, text: str, i: int, now: float) -> int:
+        """The first character of `text` from `i` on where waiting for a
+        boundary can segment: at or right after one of the `boundary_chars` of
+        the segmenters in use, where more segmenters come into use, or at once
+        when the waiting has timed out or a segmenter can split anywhere."""
+        if (now - self.seg_start_time) > self.config.max_waiting_time:
+            return i
+        num_levels = self.get_levels(now)
+        if num_levels > self.num_tried_levels:  # 新的层级可能有未处理的分割位置
+            return i
+        chars = get_boundary_chars(self.streams[:num_levels])
+        if chars is None:
+            return i
+        n = len(text)
+        if num_levels < len(self.segmenters):  # 缓存超过 max_seg_size 后使用所有层级
+            n = min(n, i + self.config.max_seg_size - len(self.buffer))
+        last = self.buffer.last()
+        for k in range(i, n):
+            if text[k] in chars or last in chars:
+                return k
+            last = text[k]
+        return n
+
+    def loosen(self, num_checks: int):
+        """Count `num_checks` waiting checks that found no boundary, as
+        `check_conditions` does one by one."""
+        if num_checks <= 0:
+            return
+        period = self.config.loose_steps + 1
+        first = max(1, period + 1 - self.num_consec_splits)  # 首次放宽的检查
+        if num_checks < first:
+            self.num_consec_splits += num_checks
+            return
+        num_loosenings = 1 + (num_checks - first) // period
+        self.num_consec_splits = 1 + (num_checks - first) % period
+        self.min_seg_size = max(
+            0, self.min_seg_size - num_loosenings * self.config.loose_size
+        )
+        if self.metrics is not None:
+            self.metrics.inc("loosenings", num_loosenings)
+
+    def get_levels(self, now: Union[float | None] = None) -> int:
+        """How many of the segmenters to try: all of them, or with `cascade`
+        the first one plus one more for each equal share of the waiting time
+        spent, and all of them once the buffer exceeds `max_seg_size`."""
+        num_levels = len(self.segmenters)
+        if not self.config.cascade or num_levels <= 1:
+            return num_levels
+        if len(self.buffer) > self.config.max_seg_size:
+            return num_levels
+        if self.is_accumulating:  # 结束输入时仍在累积，尚未开始等待
+            return 1
+        if self.config.max_waiting_time <= 0:
+            return num_levels
+        now = self.clock() if now is None else now
+        return 1 + sum(now >= self.level_time(level) for level in range(1, num_levels))
+
+    def level_time(self, level: int) -> float:
+        """When the waiting unlocks the segmenter at `level` under `cascade`."""
+        return self.seg_start_time + (
+            level * self.config.max_waiting_time / len(self.segmenters)
+        )
+
+    def segment_once(self, now: Union[float | None] = None, first_level: int = 0):
+        suffix = self.config.segmentation_suffix
+        num_levels = self.num_tried_levels = self.get_levels(now)
+        for level, (segmenter, stream) in enumerate(zip(self.segmenters, self.streams)):
+            if level == num_levels:
+                break
+            if level < first_level:  # 缓存未变，已调用过的层级结果相同
+                continue
+            started = time.perf_counter() if self.metrics is not None else None
+            if stream is None:
+                text = self.buffer.text()
+                segmenteds = segmenter(text + suffix)[:-1]
+                bounds = to_boundaries(text, segmenteds, self.buffer.start)
+            else:
+                bounds = stream.boundaries(suffix)
+                bounds = [b for b in bounds if b <= self.buffer.end]
+            if started is not None:
+                self.on_segmenter_call(started, level)
+            self.fire(bounds)
+            if self.config.cascade and self.is_last_segmented:
+                break  # 已分割成功，不再调用更细的层级
+
+    def add_source(self, text: str) -> str:
+        self.source.append(text)
+        return self.buffer.add_source(text)
+
+    def start(self, now: Union[float | None] = None):
+        if not self.is_started:
+            self.is_started = True
+            self.on_start(now)
+
+    def feed(self, text: str, now: Union[float | None] = None) -> List[Segment]:
+        """Process a chunk of text at time `now` (the clock by default) and
+        return the segments it completes."""
+        if self.is_cancelled:
+            return []
+        self.start(now)
+        text = self.add_source(text)
+        # 时间固定时，按块检查与逐字符检查的结果相同
+        if now is not None or self.config.step_granularity == "chunk":
+            self.step_chunk(text, now)
+        else:
+            self.step(text)
+        return self.take_outputs()
+
+    def finish(self, now: Union[float | None] = None) -> List[Segment]:
+        """End the input and return the remaining segments."""
+        if self.is_cancelled:
+            return []
+        self.start(now)
         if len(self.buffer) > 0:
-            self.segment_once()
-        self.fire([self.buffer], forced=True, end=True)
+            self.segment_once(now)
+        self.fire([self.buffer.end], forced=True)
+        return self.take_outputs()
 
-    def on_start(self):
+    def take_outputs(self) -> List[Segment]:
+        outputs, self.outputs = self.outputs, []
+        return outputs
+
+    def cancel(self) -> Segment:
+        """Stop the session at once, e.g. when the user barges in, and return
+        the text that was received but not output."""
+        # 从原始文本取剩余部分，保留其中的空白 (规范化为一个空格)
+        if len(self.last_combined) > 0:
+            start = self.combined_span[0]
+        else:
+            text = self.buffer.text()
+            start = self.buffer.source_offset(self.buffer.end - len(text.lstrip()))
+        source = self.history.source_text(start)
+        remainder = Segment(
+            whitespace_ptn.sub(" ", source).strip(),
+            start,
+            start + len(source.rstrip()),
+        )
+        self.is_cancelled = True
+        # 释放缓存，之后的 feed 和 finish 不再有输出
+        self.outputs = []
+        self.last_combined = ""
+        self.buffer = SegmentBuffer()
+        self.streams = [None] * len(self.segmenters)
+        return remainder
+
+    def on_start(self, now: Union[float | None] = None):
         self.max_accu_time = self.config.first_max_accu_time
         self.max_buffer_size = self.config.first_max_buffer_size
         self.min_seg_size = self.config.first_min_seg_size
-        self.accu_start_time = time.time()
+        self.accu_start_time = self.start_time = self.clock() if now is None else now
 
     def on_first_segment(self):
+        if self.metrics is not None:
+            self.metrics.observe(
+                "time_to_first_segment_seconds", self.clock() - self.start_time
+            )
         self.max_buffer_size = self.config.max_buffer_size
         self.min_seg_size = self.config.min_seg_size
-        setattr(self, "on_first_segment", lambda: None)
 
-    def check_conditions(self):
+    def on_waiting_timeout(self):
+        if self.metrics is not None:
+            self.metrics.inc("waiting_timeouts")
+        self.fire([self.buffer.end], forced=True)
+
+    def on_segmenter_call(self, started: float, level: int = 0):
+        call_time = time.perf_counter() - started
+        self.metrics.inc("segmenter_calls")
+        self.metrics.observe("segmenter_call_seconds", call_time)
+        # 各层级的调用次数和耗时
+        self.metrics.inc(f"level{level}_segmenter_calls")
+        self.metrics.observe(f"level{level}_segmenter_call_seconds", call_time)
+
+    def check_conditions(self, now: Union[float | None] = None):
+        now = self.clock() if now is None else now
         if self.is_accumulating:
             # 在累积时，判断是否可以进行分割
             # 是否达到累积时间或累积大小
-            can_segment = (
-                time.time() - self.accu_start_time
-            ) >= self.max_accu_time or len(self.buffer) > self.max_buffer_size
+            by_time = (now - self.accu_start_time) >= self.max_accu_time
+            can_segment = by_time or len(self.buffer) > self.max_buffer_size
             if can_segment:
-                self.is_accumulating = False
-                self.seg_start_time = time.time()
-                self.num_consec_splits += 1
+                self.start_segmentation(now, by_time)
             return can_segment, False
         else:
             # 调整连续未分割成功的次数
             if self.num_consec_splits > self.config.loose_steps:
                 self.min_seg_size = max(0, self.min_seg_size - self.config.loose_size)
                 self.num_consec_splits = 0
+                if self.metrics is not None:
+                    self.metrics.inc("loosenings")
             self.num_consec_splits += 1
             is_waiting_timeout = (
-                time.time() - self.seg_start_time
+                now - self.seg_start_time
             ) > self.config.max_waiting_time
             return True, is_waiting_timeout
 
-    def postprocessing(self):
+    def start_segmentation(self, now: float, by_time: bool):
+        self.is_accumulating = False
+        self.seg_start_time = now
+        self.num_tried_levels = 0
+        self.num_consec_splits += 1
+        if self.metrics is not None:
+            self.metrics.inc(
+                "accumulations_by_time" if by_time else "accumulations_by_size"
+            )
+            self.metrics.observe("accumulation_seconds", now - self.accu_start_time)
+
+    def next_deadline(self) -> Union[float | None]:
+        """When a timeout acts on the pending text if no more text arrives:
+        the end of the accumulation, the unlocking of a finer level under
+        `cascade`, or the end of the waiting. None if nothing is pending."""
+        if self.is_cancelled or not self.is_started:
+            return None
+        if len(self.buffer) == 0 and len(self.last_combined) == 0:
+            return None
+        if self.is_accumulating:
+            return self.accu_start_time + self.max_accu_time
+        deadline = self.seg_start_time + self.config.max_waiting_time
+        if len(self.buffer) > 0 and self.num_tried_levels < self.get_levels(deadline):
+            # 更细的层级解锁时即调用，不等下一个字符
+            return self.level_time(self.num_tried_levels)
+        return deadline
+
+    def is_level_unlock(self, deadline: float) -> bool:
+        return deadline < self.seg_start_time + self.config.max_waiting_time
+
+    def tick(self, now: Union[float | None] = None) -> List[Segment]:
+        """Act on the timeouts expired by `now` (the clock by default), each at
+        the time it expired, and return the segments they complete. Lets the
+        pending text go out when the input stalls."""
+        if self.is_cancelled:
+            return []
+        now = self.clock() if now is None else now
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            if self.is_accumulating:  # 累积时间已到，不等下一个字符即开始分割
+                self.start_segmentation(deadline, True)
+                if len(self.buffer) > 0:
+                    self.segment_once(deadline)
+            elif self.is_level_unlock(deadline):  # 只调用新解锁的层级
+                self.segment_once(deadline, self.num_tried_levels)
+            else:
+                self.on_waiting_timeout()
+            self.postprocessing(deadline)
+        return self.take_outputs()
+
+    def postprocessing(self, now: Union[float | None] = None):
         if self.is_last_segmented:  # 如果最近存在分割
             self.is_last_segmented = False
+            now = self.clock() if now is None else now
 
             # 计算分割时间
-            seg_time = time.time() - self.seg_start_time
-            self.all_seg_time.append(seg_time)
-            if len(self.all_seg_time) > 5:
-                self.all_seg_time.pop(0)
+            seg_time = now - self.seg_start_time
+            if self.metrics is not None:
+                self.metrics.observe("segmentation_seconds", seg_time)
+            add_recent(self.all_seg_time, seg_time, num_timings)
+
+            self.num_consec_splits = 0
+            self.is_accumulating = True
+            self.accu_start_time = now
 
             # 调整累积时间
+            if len(self.all_seconds_per_char) > 0:
+                self.max_accu_time = self.get_feedback_accu_time(now)
+                return
             # https://speakingtimecalculator.com
-            num_words = len(self.segmenteds[-1])
+            num_words = self.segment_sizes[-1]
             num_words -= num_words // 10  # 字数 = 字符数 - 标点数
             full_duration = num_words * self.config.seconds_per_word
             mean_seg_time = sum(self.all_seg_time) / len(self.all_seg_time)
@@ -197,6 +549,276 @@ class SegmentationPipeline:
                 (full_duration - mean_seg_time * 2 - self.config.fade_in_out_time),
             )
 
-            self.num_consec_splits = 0
-            self.is_accumulating = True
-            self.accu_start_time = time.time()
+    def report_playback(
+        self,
+        index: int,
+        synthesis_start: Union[float | None] = None,
+        first_chunk_time: Union[float | None] = None,
+        audio_duration: Union[float | None] = None,
+    ):
+        """Feedback of the consumer on the `index`-th output segment: when its
+        synthesis started, when its first audio chunk was ready (both on the
+        pipeline's clock) and how long its audio is."""
+        if synthesis_start is not None and first_chunk_time is not None:
+            first_chunk_seconds = first_chunk_time - synthesis_start
+            add_recent(self.all_first_chunk_time, first_chunk_seconds, num_timings)
+        if audio_duration is None:
+            return
+        if index < 0:
+            index += len(self.history)
+        i = index - (len(self.history) - len(self.segment_sizes))
+        num_chars = self.segment_sizes[i] if 0 <= i < len(self.segment_sizes) else 0
+        if num_chars > 0:
+            seconds_per_char = audio_duration / num_chars
+            add_recent(self.all_seconds_per_char, seconds_per_char, num_timings)
+        if first_chunk_time is not None:
+            # 假设片段在首块就绪且上一个片段播完后开始播放
+            start = max(first_chunk_time, self.playback_end or first_chunk_time)
+            self.playback_end = start + audio_duration
+        self.last_reported = max(self.last_reported, index)
+        if self.is_accumulating and len(self.segment_sizes) > 0:
+            self.max_accu_time = self.get_feedback_accu_time(self.clock())
+
+    def get_feedback_accu_time(self, now: float) -> float:
+        """Accumulate until the audio of the output segments is about to run
+        out, leaving time to segment and synthesize the next one."""
+        if len(self.all_first_chunk_time) > 0:
+            first_chunk_time = sum(self.all_first_chunk_time) / len(
+                self.all_first_chunk_time
+            )
+        else:
+            first_chunk_time = (
+                self.config.first_chunk_synthesis_time
+                + self.config.first_chunk_transfer_time
+            )
+        seconds_per_char = sum(self.all_seconds_per_char) / len(
+            self.all_seconds_per_char
+        )
+        mean_seg_time = sum(self.all_seg_time) / max(1, len(self.all_seg_time))
+
+        # 尚未反馈的片段按实测语速估计，排在已反馈的片段之后播放
+        num_unreported = len(self.history) - self.last_reported - 1
+        num_known = min(num_unreported, len(self.segment_sizes))
+        pending = self.segment_sizes[len(self.segment_sizes) - num_known :]
+        playback_end = max(self.playback_end or now, now + first_chunk_time)
+        playback_end += sum(pending) * seconds_per_char
+
+        reserved = mean_seg_time * 2 + first_chunk_time + self.config.fade_in_out_time
+        accu_time = playback_end - reserved - self.accu_start_time
+        return max(self.config.first_max_accu_time, accu_time)
+
+
+class SegmentationPipeline(SegmentationCore):
+    """Asyncio adapter of `SegmentationCore`: text is passed in with `fill`,
+    segmented by `segment` and read from `output_stream`."""
+
+    def reset_status(self):
+        super().reset_status()
+        self.in_queue: Queue = Queue()  # 接收外部输入的文本流
+        self.out_queue: Queue = Queue()  # 输出分割结果到外部
+        self.is_receiving: bool = False  # 是否在等待新的文本，即已处理完到达的文本
+        self.idle = asyncio.Event()  # 等待新的文本且没有未处理的文本时置位
+        self.task: Union[asyncio.Task | None] = None  # 运行 segment 的任务
+        self.timer: Union[asyncio.TimerHandle | None] = None  # 下一个超时的定时器
+        self.timer_deadline: Union[float | None] = None  # 定时器对应的截止时间
+
+    def fill(self, text: Union[str | None]):
+        if not self.is_cancelled:
+            self.in_queue.put_nowait(text)
+            self.idle.clear()
+
+    def schedule(self):
+        """Arm a timer for the next deadline of the core, so the timeouts act
+        even when no more text arrives. Pipelines on a `VirtualClock` are
+        ticked by `replay_virtual` instead."""
+        deadline = self.next_deadline()
+        if deadline == self.timer_deadline:
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.timer_deadline = deadline
+        if deadline is not None and not isinstance(self.clock, VirtualClock):
+            loop = asyncio.get_running_loop()
+            self.timer = loop.call_later(deadline - self.clock(), self.on_timer)
+
+    def on_timer(self):
+        """Wake `segment` with an empty text to act on the expired timeouts."""
+        self.timer = None
+        self.timer_deadline = None
+        self.fill("")
+
+    def report_playback(self, *args, **kwargs):
+        super().report_playback(*args, **kwargs)
+        if self.task is not None and not self.task.done():
+            self.schedule()  # 累积时间可能已改变
+
+    def put_outputs(self, outputs: List[Segment]):
+        for segmented in outputs:
+            if self.metrics is not None:
+                self.metrics.observe("out_queue_depth", self.out_queue.qsize())
+            self.out_queue.put_nowait(segmented)
+
+    async def output_stream(self):
+        # 流式超时按注入的时钟计算
+        deadline = self.clock() + self.config.max_stream_time
+        while True:
+            try:
+                segmented: Union[str | None] = self.out_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - self.clock()
+                if timeout <= 0:
+                    return
+                if isinstance(self.clock, VirtualClock):
+                    # 虚拟时间不会自行前进，在下一个输出到达时判断是否已超时
+                    segmented = await self.out_queue.get()
+                    if self.clock() > deadline:
+                        return
+                else:
+                    try:
+                        segmented = await asyncio.wait_for(
+                            self.out_queue.get(), timeout
+                        )
+                    except asyncio.TimeoutError:  # 流式超时
+                        return
+            if segmented is None:
+                return
+            deadline = self.clock() + self.config.max_stream_time
+            yield segmented
+
+    async def receive(self, coalesce=False):
+        self.start()
+        while True:
+            self.is_receiving = True
+            if self.in_queue.empty():
+                self.idle.set()
+            texts = [await self.in_queue.get()]
+            self.is_receiving = False
+            if coalesce:  # 合并所有已到达的文本
+                while texts[-1] is not None and not self.in_queue.empty():
+                    texts.append(self.in_queue.get_nowait())
+            is_end = texts[-1] is None
+            if is_end:
+                texts.pop()
+            if self.metrics is not None:
+                self.metrics.observe("in_queue_depth", self.in_queue.qsize())
+            text = "".join([self.add_source(t) for t in texts if len(t) > 0])
+            if len(text) > 0 or not is_end:  # 空文本由定时器放入，用于处理超时
+                yield text
+            if is_end:
+                return
+
+    def cancel(self) -> Segment:
+        """Also drop the outputs not read yet, end `output_stream` and stop
+        `segment`, without waiting for the segmenters."""
+        segments = []
+        while not self.out_queue.empty():
+            segmented = self.out_queue.get_nowait()
+            if segmented is not None:
+                segments.append(segmented)
+        while not self.in_queue.empty():  # 未处理的文本也属于剩余文本
+            text = self.in_queue.get_nowait()
+            if text is not None and len(text) > 0:
+                self.add_source(text)
+        segments.append(super().cancel())
+        self.schedule()  # 取消后没有截止时间，即取消定时器
+        self.out_queue.put_nowait(None)
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+        return join_segments(segments)
+
+    async def segment_once_async(
+        self, now: Union[float | None] = None, first_level: int = 0
+    ):
+        suffix = self.config.segmentation_suffix
+        num_levels = self.num_tried_levels = self.get_levels(now)
+        for level, (segmenter, stream) in enumerate(zip(self.segmenters, self.streams)):
+            if level == num_levels:
+                break
+            if level < first_level:
+                continue
+            started = time.perf_counter() if self.metrics is not None else None
+            if stream is None:
+                text = self.buffer.text()
+                if hasattr(segmenter, "segment_async"):
+                    segmenteds = await segmenter.segment_async(text + suffix)
+                else:
+                    segmenteds = segmenter(text + suffix)
+                bounds = to_boundaries(text, segmenteds[:-1], self.buffer.start)
+                if not self.in_queue.empty():
+                    # 调用期间已有新的字符到达，缓存末尾的分割位置依赖后缀，丢弃
+                    bounds = [b for b in bounds if b < self.buffer.end]
+            else:
+                bounds = stream.boundaries(suffix)
+                bounds = [b for b in bounds if b <= self.buffer.end]
+            if started is not None:
+                self.on_segmenter_call(started, level)
+            self.fire(bounds)
+            self.put_outputs(self.take_outputs())
+            if self.config.cascade and self.is_last_segmented:
+                break
+
+    async def tick_async(self):
+        """`tick`, awaiting the segmenters."""
+        now = self.clock()
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            if self.is_accumulating:
+                self.start_segmentation(deadline, True)
+                if len(self.buffer) > 0:
+                    await self.segment_once_async(deadline)
+            elif self.is_level_unlock(deadline):
+                await self.segment_once_async(deadline, self.num_tried_levels)
+            else:
+                self.on_waiting_timeout()
+                self.put_outputs(self.take_outputs())
+            self.postprocessing(deadline)
+
+    async def segment(self):
+        self.task = asyncio.current_task()
+        if self.is_cancelled:
+            return
+        try:
+            if not self.is_async:
+                async for text in self.receive():
+                    if len(text) == 0:
+                        self.put_outputs(self.tick())
+                    elif self.config.step_granularity == "chunk":
+                        self.step_chunk(text)
+                    else:
+                        self.step(text)
+                    self.put_outputs(self.take_outputs())
+                    self.schedule()
+                self.put_outputs(self.finish())
+                self.out_queue.put_nowait(None)
+                return
+
+            # 等待分割结果期间到达的文本，下次一起处理
+            async for text in self.receive(coalesce=True):
+                if len(text) == 0:
+                    await self.tick_async()
+                    self.schedule()
+                    continue
+                now = self.clock()
+                can_segment, is_waiting_timeout = self.advance(text, now)
+                if can_segment:
+                    await self.segment_once_async(now)
+                    if is_waiting_timeout:
+                        self.on_waiting_timeout()
+                        self.put_outputs(self.take_outputs())
+                self.postprocessing()
+                self.schedule()
+            if len(self.buffer) > 0:
+                await self.segment_once_async()
+            self.fire([self.buffer.end], forced=True)
+            self.put_outputs(self.take_outputs())
+            self.out_queue.put_nowait(None)
+        except asyncio.CancelledError:  # 被 cancel 取消时正常结束
+            if not self.is_cancelled:
+                raise
+        finally:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
@@ -1,10 +1,17 @@
-import queue
+import os
+import time
+import zlib
+import heapq
 import asyncio
+import itertools
+import threading
 from dataclasses import dataclass
-from typing import List, Callable, Dict
-from multiprocessing import Manager, Process
+from typing import Any, List, Callable, Dict, Set, Literal, Tuple
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
 
 from .seg2stream import (
+    SegmentationCore as SegSent2StreamCore,
     SegmentationPipeline as SegSent2StreamPipeline,
     SegmentationConfig as SegSent2StreamConfig,
 )
@@ -12,7 +19,13 @@ from .seg2generator import (
     SegmentationPipeline as SegSent2GeneratorPipeline,
     SegmentationConfig as SegSent2GeneratorConfig,
 )
+from .segment_buffer import Segment, join_segments
 from .segmenters import get_sentence_segmenter
+from .registry import registry, provides
+from .batching import batch_segmenters
+from .offload import offload_segmenters
+from .metrics import MetricsAggregator, merge_snapshots
+from .channel import ChannelWriter, create_channel, read_any, read_any_async
 
 
 @dataclass
@@ -21,25 +34,439 @@ class SegmentationTask:
         self,
         id: str,
         pipeline: SegSent2StreamPipeline | SegSent2GeneratorPipeline,
-        out_queue: queue.Queue,
+        out_channel: ChannelWriter,
+        stats: "WorkerStats | None" = None,
+        on_finished: Callable[[Any], None] | None = None,
     ):
         async def process_output():
             async for output in pipeline.output_stream():
-                out_queue.put_nowait((id, output))
-            out_queue.put_nowait((id, None))
+                out_channel.send(id, output)
+                if stats is not None:
+                    stats.add("segments")
+            out_channel.send(id, None)
+            if stats is not None:
+                stats.add("finished_sessions")
+            # 输出已结束（包括流式超时），不再需要继续分割
+            if not segment_task.done():
+                segment_task.cancel()
+            if on_finished is not None:
+                on_finished(id)
 
+        self.id = id
         self.pipeline = pipeline
-        self.future = asyncio.gather(process_output(), pipeline.segment())
+        self.out_channel = out_channel
+        self.last_active_time = time.monotonic()  # 最近一次输入的时间
+        self.evicted = False  # 已因空闲结束输入，等待输出结束
+        segment_task = asyncio.ensure_future(pipeline.segment())
+        self.future = asyncio.gather(
+            process_output(), segment_task, return_exceptions=True
+        )
 
     def send(self, text: str | None):
+        self.last_active_time = time.monotonic()
         self.pipeline.fill(text)
 
+    def cancel(self, return_remainder: bool = False):
+        # 输出流随即结束，由 process_output 发送 (id, None) 并释放会话
+        remainder = self.pipeline.cancel()
+        if return_remainder:
+            self.out_channel.send(self.id, Remainder(remainder, *remainder.span))
+
+
+class SyncSegmentationTask:
+    """Same interface as `SegmentationTask`, but feeds the text straight to the
+    synchronous core of the pipeline, without a queue and a task per session.
+    Used when no segmenter has to be awaited."""
+
+    def __init__(
+        self,
+        id: str,
+        pipeline: SegSent2StreamCore,
+        out_channel: ChannelWriter,
+        stats: "WorkerStats | None" = None,
+        on_finished: Callable[[Any], None] | None = None,
+    ):
+        self.id = id
+        self.pipeline = pipeline
+        self.out_channel = out_channel
+        self.stats = stats
+        self.on_finished = on_finished
+        self.last_active_time = time.monotonic()  # 最近一次输入的时间
+        self.evicted = False
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.timer: asyncio.TimerHandle | None = None
+        self.reset_timer()
+        # 分割超时的定时器，输入停顿时也按时输出缓存
+        self.tick_timer: asyncio.TimerHandle | None = None
+        self.tick_deadline: float | None = None
+
+    def reset_timer(self):
+        # 与 output_stream 相同，超过 max_stream_time 没有输出时结束会话
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.loop.call_later(
+            self.pipeline.config.max_stream_time, self.close
+        )
+
+    def schedule(self):
+        """Arm the timer for the next deadline of the core."""
+        deadline = self.pipeline.next_deadline()
+        if deadline == self.tick_deadline:
+            return
+        if self.tick_timer is not None:
+            self.tick_timer.cancel()
+            self.tick_timer = None
+        self.tick_deadline = deadline
+        if deadline is not None:
+            delay = deadline - self.pipeline.clock()
+            self.tick_timer = self.loop.call_later(delay, self.tick)
+
+    def tick(self):
+        self.tick_timer = None
+        self.tick_deadline = None
+        self.send_outputs(self.pipeline.tick())
+        self.schedule()
+
+    def send(self, text: str | None):
+        if self.future.done():
+            return
+        self.last_active_time = time.monotonic()
+        if text is None:
+            self.send_outputs(self.pipeline.finish())
+            self.close()
+        else:
+            self.send_outputs(self.pipeline.feed(text))
+            self.schedule()
+
+    def send_outputs(self, outputs: List[Any]):
+        for output in outputs:
+            self.out_channel.send(self.id, output)
+        if len(outputs) > 0:
+            self.reset_timer()
+            if self.stats is not None:
+                self.stats.add("segments", len(outputs))
+
+    def cancel(self, return_remainder: bool = False):
+        if self.future.done():
+            return
+        remainder = self.pipeline.cancel()
+        if return_remainder:
+            self.out_channel.send(self.id, Remainder(remainder, *remainder.span))
+        self.close()
+
+    def close(self):
+        if self.future.done():
+            return
+        self.timer.cancel()
+        if self.tick_timer is not None:
+            self.tick_timer.cancel()
+        self.out_channel.send(self.id, None)
+        if self.stats is not None:
+            self.stats.add("finished_sessions")
+        self.future.set_result(None)
+        if self.on_finished is not None:
+            self.on_finished(self.id)
+
+
+class WorkerStats:
+    """Load counters of the segmentation workers, kept in shared memory so the
+    manager can read them while the workers update them."""
+
+    fields = (
+        "sessions",
+        "finished_sessions",
+        "evicted_sessions",
+        "cancelled_sessions",
+        "messages",
+        "chars",
+        "segments",
+        "memory",  # 进程常驻内存的字节数，空闲时及报告指标时采样
+    )
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self.values = RawArray("q", num_workers * len(self.fields))
+        self.index = 0  # 当前进程对应的 worker
+
+    def bind(self, index: int):
+        self.index = index
+        return self
+
+    def add(self, field: str, value: int = 1):
+        self.values[self.index * len(self.fields) + self.fields.index(field)] += value
+
+    def set(self, field: str, value: int):
+        self.values[self.index * len(self.fields) + self.fields.index(field)] = value
+
+    def get(self) -> List[Dict[str, int]]:
+        n = len(self.fields)
+        loads = []
+        for i in range(self.num_workers):
+            load = dict(zip(self.fields, self.values[i * n : (i + 1) * n]))
+            load["active_sessions"] = load["sessions"] - load["finished_sessions"]
+            loads.append(load)
+        return loads
+
+
+def get_memory_usage() -> int:
+    """Resident memory of the current process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MetricsReport:
+    """Message id of the metrics snapshots sent by the segmentation workers."""
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class WorkerFailure:
+    """Message id of the error that stopped a segmentation worker before it
+    took any session, e.g. a segmenter that cannot be loaded."""
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+@dataclass
+class PlaybackReport:
+    """Consumer feedback on one output segment, see
+    `SegSent2StreamPipeline.report_playback`."""
+
+    index: int
+    synthesis_start: float | None = None
+    first_chunk_time: float | None = None
+    audio_duration: float | None = None
+
+
+@dataclass
+class CancelRequest:
+    """Message of `SegmentationManager.cancel`."""
+
+    return_remainder: bool = False
+
+
+class Remainder(Segment):
+    """Text a cancelled session received but did not output, yielded just
+    before its `(id, None)` when asked for by `SegmentationManager.cancel`."""
+
+
+class MultiplexedSession(SegSent2StreamCore):
+    """A session of `MultiplexedEngine`: the synchronous core and the engine's
+    bookkeeping, all in slots."""
+
+    __slots__ = ("id", "deadline", "wake_time", "last_active_time")
+
+
+class MultiplexedEngine:
+    """Drive all the sessions of a worker from its inbound messages in one
+    scheduler. Each message is fed straight to the synchronous core of its
+    session, and the deadlines of all the sessions, for the stream timeout and
+    for the segmentation timeouts, are kept in one heap checked by a single
+    timer. A session costs no coroutine, queue, future or timer. Only for the
+    stream pipeline when no segmenter has to be awaited.
+    """
+
+    def __init__(
+        self,
+        config: SegSent2StreamConfig,
+        segmenters: List[Callable[[str], str]],
+        out_channel: ChannelWriter,
+        stats: "WorkerStats | None" = None,
+        metrics: MetricsAggregator | None = None,
+    ):
+        self.config = config
+        self.segmenters = segmenters
+        self.out_channel = out_channel
+        self.stats = stats
+        self.metrics = metrics
+        self.sessions: Dict[Any, MultiplexedSession] = {}
+        # 会话唤醒时间的小顶堆。截止时间推迟时不更新，弹出时按会话的截止时间
+        # 重新加入；提前时加入新的条目，旧的条目弹出时因与 wake_time 不同而忽略
+        self.deadlines: List[Tuple[float, int, Any]] = []
+        self.counter = itertools.count()  # 截止时间相同时按加入顺序弹出
+        self.timer: asyncio.TimerHandle | None = None
+        self.closed: asyncio.Future | None = None  # 所有会话结束时完成
+
+    def dispatch(self, id: Any, message: Any):
+        session = self.sessions.get(id)
+        if isinstance(message, PlaybackReport):  # 会话已结束时忽略
+            if session is not None:
+                session.report_playback(
+                    message.index,
+                    message.synthesis_start,
+                    message.first_chunk_time,
+                    message.audio_duration,
+                )
+                self.schedule(session)  # 累积时间可能已改变
+        elif isinstance(message, CancelRequest):
+            if session is not None:
+                remainder = session.cancel()
+                if message.return_remainder:
+                    self.out_channel.send(id, Remainder(remainder, *remainder.span))
+                self.close(session)
+                if self.stats is not None:
+                    self.stats.add("cancelled_sessions")
+        else:
+            if session is None:
+                session = self.open(id)
+            self.send(session, message)
+            if self.stats is not None:
+                self.stats.add("messages")
+                if message is not None:
+                    self.stats.add("chars", len(message))
+
+    def open(self, id: Any) -> MultiplexedSession:
+        loop = asyncio.get_running_loop()
+        # 使用事件循环的时钟，分割的截止时间可以直接放入堆中
+        session = MultiplexedSession(
+            self.config, self.segmenters, metrics=self.metrics, clock=loop.time
+        )
+        session.id = id
+        session.deadline = session.wake_time = loop.time() + self.config.max_stream_time
+        self.sessions[id] = session
+        self.wake_at(session.wake_time, id)
+        if self.stats is not None:
+            self.stats.add("sessions")
+        return session
+
+    def send(self, session: MultiplexedSession, text: str | None):
+        session.last_active_time = time.monotonic()
+        if text is None:
+            self.send_outputs(session, session.finish())
+            self.close(session)
+        else:
+            self.send_outputs(session, session.feed(text))
+            self.schedule(session)
+
+    def send_outputs(self, session: MultiplexedSession, outputs: List[Any]):
+        for output in outputs:
+            self.out_channel.send(session.id, output)
+        if len(outputs) > 0:
+            # 与 output_stream 相同，超过 max_stream_time 没有输出时结束会话
+            session.deadline = asyncio.get_running_loop().time()
+            session.deadline += self.config.max_stream_time
+            if self.stats is not None:
+                self.stats.add("segments", len(outputs))
+
+    def schedule(self, session: MultiplexedSession):
+        """Wake the session at its next segmentation deadline, if earlier than
+        its entry in the heap."""
+        deadline = session.next_deadline()
+        if deadline is not None and deadline < session.wake_time:
+            session.wake_time = deadline
+            self.wake_at(deadline, session.id)
+
+    def wake_at(self, when: float, id: Any):
+        heapq.heappush(self.deadlines, (when, next(self.counter), id))
+        if self.timer is None or when < self.timer.when():
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = asyncio.get_running_loop().call_at(when, self.expire)
+
+    def close(self, session: MultiplexedSession):
+        del self.sessions[session.id]
+        self.out_channel.send(session.id, None)
+        if self.stats is not None:
+            self.stats.add("finished_sessions")
+            if len(self.sessions) == 0:  # 空闲时更新内存占用
+                self.stats.set("memory", get_memory_usage())
+        if len(self.sessions) == 0 and self.closed is not None:
+            if not self.closed.done():
+                self.closed.set_result(None)
+
+    def expire(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while len(self.deadlines) > 0 and self.deadlines[0][0] <= now:
+            wake_time, _, id = heapq.heappop(self.deadlines)
+            session = self.sessions.get(id)
+            if session is None or wake_time != session.wake_time:  # 已结束或已提前
+                continue
+            self.send_outputs(session, session.tick(now))
+            if session.deadline <= now:
+                self.close(session)
+                continue
+            deadline = session.next_deadline()
+            if deadline is None or deadline > session.deadline:
+                deadline = session.deadline
+            session.wake_time = deadline
+            heapq.heappush(self.deadlines, (deadline, next(self.counter), id))
+        self.timer = None
+        if len(self.deadlines) > 0:
+            self.timer = loop.call_at(self.deadlines[0][0], self.expire)
+
+    def evict_idle(self, deadline: float):
+        """End the input of the sessions idle since before `deadline`."""
+        for session in list(self.sessions.values()):
+            if session.last_active_time < deadline:
+                self.send(session, None)  # 输出剩余缓存后释放
+                if self.stats is not None:
+                    self.stats.add("evicted_sessions")
+
+    async def wait_closed(self):
+        """Wait until every session has ended."""
+        if len(self.sessions) > 0:
+            self.closed = asyncio.get_running_loop().create_future()
+            await self.closed
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+class SessionLimitError(RuntimeError):
+    """Raised by `SegmentationManager.add_text` when a new session would exceed
+    `max_sessions`."""
+
+
+def needs_awaiting(
+    segmenter: Any, executor: str | None = None, batch_delay: float | None = None
+) -> bool | None:
+    """Whether a segmenter has to be awaited once wrapped by the workers, None
+    for a handle that would have to be loaded to tell."""
+    has_batch, has_stream, has_async = [
+        provides(segmenter, name)
+        for name in ("segment_batch", "create_stream", "segment_async")
+    ]
+    if None in (has_batch, has_stream, has_async):
+        return None
+    if batch_delay is not None and has_batch:
+        return True
+    if has_stream:  # 增量分割器不会被包装
+        return False
+    return executor is not None or has_async
+
+
+def get_worker_index(id: Any, num_workers: int) -> int:
+    """Stable across processes and runs, unlike `hash`."""
+    if num_workers == 1:
+        return 0
+    return zlib.crc32(repr(id).encode("utf-8")) % num_workers
+
 
 class SegmentationManager:
     def __init__(
         self,
         seg_config: SegSent2StreamConfig | SegSent2GeneratorConfig,
         segmenters: List[Callable[[str], str]] | None = None,
+        num_workers: int = 1,
+        max_sessions: int | None = None,
+        session_ttl: float | None = None,
+        batch_delay: float | None = None,
+        max_batch_size: int = 64,
+        executor: Literal["thread", "process"] | None = None,
+        executor_workers: int = 1,
+        metrics: bool = False,
+        metrics_interval: float = 1.0,
+        engine: Literal["tasks", "multiplexed"] = "tasks",
+        start_method: Literal["fork", "spawn", "forkserver"] | None = None,
     ):
         self.seg_config = seg_config
 
@@ -49,63 +476,319 @@ class SegmentationManager:
             self.seg_pipeline_class = SegSent2GeneratorPipeline
 
         self.segmenters = segmenters if segmenters else [get_sentence_segmenter()]
-        self.manager = Manager()
-        self.in_queue = self.manager.Queue()
-        self.out_queue = self.manager.Queue()
+        # 每个分割进程各有一对管道，同一会话始终发往同一进程以保证顺序
+        self.num_workers = num_workers
+        self.in_channels = [create_channel() for _ in range(num_workers)]
+        self.out_channels = [create_channel() for _ in range(num_workers)]
+        self.out_readers = [reader for reader, _ in self.out_channels]
+        self.stats = WorkerStats(num_workers)
+
+        # 会话生命周期
+        self.max_sessions = max_sessions  # 同时存在的最大会话数
+        self.session_ttl = session_ttl  # 超过该时间没有输入的会话会被结束
+        self.sessions: Set[Any] = set()  # 尚未输出 (id, None) 的会话
+        # 已取消、尚未收到 (id, None) 的会话，及其被丢弃的输出 (不需要剩余文本时为 None)
+        self.cancelled: Dict[Any, List[str] | None] = {}
+
+        # 合并各会话对模型分割器的调用，每个请求最多额外等待 batch_delay 秒
+        self.batch_delay = batch_delay
+        self.max_batch_size = max_batch_size
+        # 在线程池或进程池中运行整段分割的分割器，不阻塞事件循环
+        self.executor = executor
+        self.executor_workers = executor_workers
+
+        # 分割进程定期发送指标快照，由 get_metrics 汇总
+        self.metrics = metrics
+        self.metrics_interval = metrics_interval
+        self.worker_metrics: Dict[int, Dict[str, Any]] = {}
+
+        # tasks: 每个会话一个任务；multiplexed: 每个分割进程用一个调度器驱动所有会话
+        self.engine = engine
+        if engine == "multiplexed":
+            self.check_multiplexed()
+
+        # 分割进程的启动方式，默认为 multiprocessing 的全局设置
+        self.start_method = start_method
+
+    def check_multiplexed(self):
+        """Raise if the multiplexed engine cannot drive the sessions. Handles
+        are not loaded for this: those that only tell once loaded are checked
+        again by the workers, after loading them."""
+        if self.seg_pipeline_class is not SegSent2StreamPipeline or any(
+            needs_awaiting(s, self.executor, self.batch_delay) is True
+            for s in self.segmenters
+        ):
+            raise ValueError(
+                "The multiplexed engine needs a SegSent2StreamConfig and "
+                "segmenters that do not have to be awaited."
+            )
 
-    def segmentation_process(self):
+    def segmentation_process(self, index: int):
+        in_reader, _ = self.in_channels[index]
+        _, out_writer = self.out_channels[index]
+        stats = self.stats.bind(index)
         tasks: Dict[str, SegmentationTask] = {}
+        metrics = MetricsAggregator() if self.metrics else None
+        # 在接收会话之前加载模型，冷启动时间不计入首个会话
+        try:
+            load_times = registry.warm_up(self.segmenters)
+            if self.engine == "multiplexed":
+                self.check_multiplexed()
+        except Exception as e:
+            # 通知管理器，而不是让读取输出的一方一直等待
+            out_writer.send(WorkerFailure(index), repr(e))
+            out_writer.flush(block=True)
+            return
+        if metrics is not None:
+            for load_time in load_times.values():
+                metrics.observe("segmenter_load_seconds", load_time)
+        segmenters = self.segmenters
+        if self.executor is not None:
+            segmenters = offload_segmenters(
+                segmenters, self.executor, self.executor_workers
+            )
+        if self.batch_delay is not None:  # 同一进程的所有会话共享批量分割器
+            segmenters = batch_segmenters(
+                segmenters, self.batch_delay, self.max_batch_size
+            )
+
+        # 不需要等待分割器时，直接使用同步的分割核心
+        pipeline_class, task_class = self.seg_pipeline_class, SegmentationTask
+        if pipeline_class is SegSent2StreamPipeline:
+            if not SegSent2StreamCore(self.seg_config, segmenters).is_async:
+                pipeline_class, task_class = SegSent2StreamCore, SyncSegmentationTask
+
+        engine = None
+        if self.engine == "multiplexed":
+            engine = MultiplexedEngine(
+                self.seg_config, segmenters, out_writer, stats, metrics
+            )
+
+        def on_finished(id):
+            # 输出 (id, None) 后立即释放会话
+            tasks.pop(id, None)
+            if len(tasks) == 0:  # 空闲时更新内存占用，其余时候由 report_metrics 采样
+                stats.set("memory", get_memory_usage())
+
+        def evict_idle_sessions():
+            deadline = time.monotonic() - self.session_ttl
+            if engine is not None:
+                engine.evict_idle(deadline)
+            for id, task in list(tasks.items()):
+                if task.last_active_time < deadline and not task.evicted:
+                    task.send(None)  # 结束输入，输出剩余缓存后释放
+                    task.evicted = True  # 输出结束前仍在 tasks 中，只计一次
+                    stats.add("evicted_sessions")
+            asyncio.get_running_loop().call_later(
+                self.session_ttl / 2, evict_idle_sessions
+            )
+
+        reported_counts = {}  # 上次报告时的会话数、消息数等
+
+        def report_metrics(repeat=True):
+            counts = stats.get()[index]
+            del counts["memory"]
+            # 空闲时计数不变，不再发送相同的快照
+            if counts != reported_counts or not repeat:
+                reported_counts.update(counts)
+                stats.set("memory", get_memory_usage())
+                for name, value in stats.get()[index].items():
+                    metrics.set(name, value)
+                metrics.set("out_channel_pending_bytes", len(out_writer.out_buffer))
+                out_writer.send(MetricsReport(index), metrics.snapshot())
+            if repeat:
+                asyncio.get_running_loop().call_later(
+                    self.metrics_interval, report_metrics
+                )
 
         async def main():
-            while True:
-                try:
-                    id, text = self.in_queue.get_nowait()
-                except queue.Empty:
-                    await asyncio.sleep(0.001)
-                    continue
-                if id is None:
-                    break
-                if id not in tasks:
-                    tasks[id] = SegmentationTask(
-                        id=id,
-                        pipeline=self.seg_pipeline_class(
-                            config=self.seg_config, segmenters=self.segmenters
-                        ),
-                        out_queue=self.out_queue,
-                    )
-                tasks[id].send(text)
-
-            for s in tasks.values():
-                await s.future
+            if self.session_ttl is not None:
+                evict_idle_sessions()
+            if metrics is not None:
+                report_metrics()
+
+            is_closed = False
+            while not is_closed:
+                for id, text in await in_reader.read_async():
+                    if id is None:
+                        is_closed = True
+                        break
+                    if engine is not None:
+                        engine.dispatch(id, text)
+                        continue
+                    if isinstance(text, PlaybackReport):  # 会话已结束时忽略
+                        task = tasks.get(id)
+                        pipeline = getattr(task, "pipeline", None)
+                        if hasattr(pipeline, "report_playback"):
+                            pipeline.report_playback(
+                                text.index,
+                                text.synthesis_start,
+                                text.first_chunk_time,
+                                text.audio_duration,
+                            )
+                            if isinstance(task, SyncSegmentationTask):
+                                task.schedule()  # 累积时间可能已改变
+                        continue
+                    if isinstance(text, CancelRequest):
+                        if id in tasks:
+                            tasks[id].cancel(text.return_remainder)
+                            stats.add("cancelled_sessions")
+                        continue
+                    if id not in tasks:
+                        tasks[id] = task_class(
+                            id=id,
+                            pipeline=pipeline_class(
+                                config=self.seg_config,
+                                segmenters=segmenters,
+                                metrics=metrics,
+                            ),
+                            out_channel=out_writer,
+                            stats=stats,
+                            on_finished=on_finished,
+                        )
+                        stats.add("sessions")
+                    tasks[id].send(text)
+                    stats.add("messages")
+                    if text is not None:
+                        stats.add("chars", len(text))
+
+            await asyncio.gather(*[task.future for task in list(tasks.values())])
+            if engine is not None:
+                await engine.wait_closed()
+            if metrics is not None:
+                report_metrics(repeat=False)
+            # 事件循环关闭后不再写入管道，等待剩余的输出全部写入后再退出
+            out_writer.flush(block=True)
+            for segmenter in segmenters:
+                if segmenter not in self.segmenters and hasattr(segmenter, "close"):
+                    segmenter.close()
 
         asyncio.run(main())
 
     def start(self):
-        self.seg_process = Process(target=self.segmentation_process, name="segmenting")
-        self.seg_process.start()
+        context = multiprocessing.get_context(self.start_method)
+        # 启动全部进程后再保存，spawn 时序列化的管理器中不能含有已启动的进程
+        seg_processes = [
+            context.Process(
+                target=self.segmentation_process,
+                args=(i,),
+                name=f"segmenting-{i}",
+            )
+            for i in range(self.num_workers)
+        ]
+        for process in seg_processes:
+            process.start()
+        self.seg_processes = seg_processes
+
+    def get_worker_loads(self) -> List[Dict[str, int]]:
+        return self.stats.get()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Latest metrics snapshots of all workers, added up. Snapshots arrive
+        with the outputs, so they are only updated while outputs are read."""
+        return merge_snapshots(self.worker_metrics.values())
+
+    def get_session_count(self) -> int:
+        """Sessions opened by `add_text` whose end has not been read yet."""
+        return len(self.sessions)
 
-    def add_text(self, id: str | None, text: str | None):
-        self.in_queue.put_nowait((id, text))
+    def add_text(self, id: str, text: str | None):
+        if id is None:  # (None, None) 是分割进程的结束标记，只由 close 发送
+            raise ValueError("Session id cannot be None, call close() to stop.")
+        if id in self.cancelled:  # 已取消的会话不再接收输入
+            return
+        if id not in self.sessions:
+            num_sessions = len(self.sessions)
+            if self.max_sessions is not None and num_sessions >= self.max_sessions:
+                raise SessionLimitError(
+                    f"Cannot open session {id!r}: {num_sessions} sessions "
+                    f"are alive (max_sessions={self.max_sessions})."
+                )
+            self.sessions.add(id)
+        _, in_writer = self.in_channels[get_worker_index(id, self.num_workers)]
+        in_writer.send(id, text)
+
+    def report_playback(
+        self,
+        id: str,
+        index: int,
+        synthesis_start: float | None = None,
+        first_chunk_time: float | None = None,
+        audio_duration: float | None = None,
+    ):
+        """Feedback on the `index`-th output segment of a session, with times
+        from `time.monotonic()`. Ignored once the session has finished."""
+        _, in_writer = self.in_channels[get_worker_index(id, self.num_workers)]
+        in_writer.send(
+            id,
+            PlaybackReport(index, synthesis_start, first_chunk_time, audio_duration),
+        )
+
+    def cancel(self, id: str, return_remainder: bool = False):
+        """Stop a session at once, e.g. when the user barges in. Its slot is
+        freed immediately, its outputs that have not been read are dropped and
+        it ends with `(id, None)` as usual. With `return_remainder`, the text it
+        received but did not output is yielded as a `Remainder` before that."""
+        if id not in self.sessions:
+            return
+        self.sessions.discard(id)
+        self.cancelled[id] = [] if return_remainder else None
+        _, in_writer = self.in_channels[get_worker_index(id, self.num_workers)]
+        in_writer.send(id, CancelRequest(return_remainder))
+
+    def filter_output(self, id: Any, output: Any) -> List[Tuple[Any, Any]]:
+        """The outputs to yield for a message of a worker."""
+        if type(id) is MetricsReport:
+            self.worker_metrics[id.index] = output
+            return []
+        if type(id) is WorkerFailure:
+            raise RuntimeError(f"Segmentation process {id.index} failed: {output}")
+        if id in self.cancelled:
+            dropped = self.cancelled[id]
+            if output is None:
+                del self.cancelled[id]
+                return [(id, None)]
+            if type(output) is Remainder:  # 加上已丢弃的输出
+                remainder = join_segments(dropped + [output])
+                return [(id, Remainder(remainder, *remainder.span))]
+            if dropped is not None:
+                dropped.append(output)
+            return []
+        if output is None:
+            self.sessions.discard(id)
+        return [(id, output)]
 
     async def get_async_output(self):
-        while True:
-            try:
-                id, output = self.out_queue.get_nowait()
-            except queue.Empty:
-                await asyncio.sleep(0.001)
-                continue
-            if id is None:
-                return
-            yield (id, output)
+        num_closed = 0  # 每个分割进程结束时各发送一次 (None, None)
+        while num_closed < self.num_workers:
+            for id, output in await read_any_async(self.out_readers):
+                if id is None:
+                    num_closed += 1
+                    continue
+                for item in self.filter_output(id, output):
+                    yield item
 
     def get_output(self):
-        while True:
-            id, output = self.out_queue.get()
-            if id is None:
-                return
-            yield (id, output)
+        num_closed = 0
+        while num_closed < self.num_workers:
+            for id, output in read_any(self.out_readers):
+                if id is None:
+                    num_closed += 1
+                    continue
+                yield from self.filter_output(id, output)
 
     def close(self):
-        self.in_queue.put((None, None))
-        self.seg_process.join()
-        self.out_queue.put((None, None))
+        """End the workers once they have output everything sent so far. Does
+        not wait for them: their outputs must still be read until the output
+        iterators end."""
+        for _, in_writer in self.in_channels:
+            in_writer.send(None, None)
+            in_writer.flush()
+        # 分割进程写满输出管道时会阻塞，在线程中等待其退出，读取输出的一方不被阻塞
+        threading.Thread(target=self.join, name="segmenting-join").start()
+
+    def join(self):
+        for process, (_, out_writer) in zip(self.seg_processes, self.out_channels):
+            process.join()
+            out_writer.send(None, None)
+            out_writer.flush()
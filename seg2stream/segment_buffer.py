@@ -0,0 +1,256 @@
+import re
+import bisect
+from typing import Callable, List, Literal, Tuple, Union
+
+
+whitespace_ptn = re.compile(r"\s+")
+
+
+class Segment(str):
+    """Segmented text carrying its `(start, end)` offsets in the source text."""
+
+    def __new__(cls, text: str, start: int, end: int):
+        segment = super().__new__(cls, text)
+        segment.start = start
+        segment.end = end
+        return segment
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        return self.start, self.end
+
+    def __reduce__(self):
+        return self.__class__, (str(self), self.start, self.end)
+
+
+def normalize(text: str) -> Tuple[str, Union[List[int] | None]]:
+    """Collapse the whitespace runs of a raw chunk to one space, and map each
+    normalized character to its raw position (None if nothing changed)."""
+    normalized = whitespace_ptn.sub(" ", text)
+    if len(normalized) == len(text):
+        return normalized, None
+    index_map, pos = [], 0
+    for match in whitespace_ptn.finditer(text):
+        index_map.extend(range(pos, match.start() + 1))
+        pos = match.end()
+    index_map.extend(range(pos, len(text)))
+    return normalized, index_map
+
+
+def join_segments(segments: List[Segment]) -> Segment:
+    """Join segments of one source in order, with a space where whitespace
+    separates them in the source."""
+    non_empty = [s for s in segments if len(s) > 0]
+    if len(non_empty) == 0:
+        return segments[-1] if len(segments) > 0 else Segment("", 0, 0)
+    texts = [non_empty[0]]
+    for last, segment in zip(non_empty, non_empty[1:]):
+        if segment.start > last.end:
+            texts.append(" ")
+        texts.append(segment)
+    return Segment("".join(texts), non_empty[0].start, non_empty[-1].end)
+
+
+class SegmentBuffer:
+    """Append-only text stream with a committed-offset cursor.
+
+    Offsets are absolute positions in the normalized stream (whitespace runs
+    collapsed to one space). Text before the cursor is dropped on `commit`, and
+    `source_offset` maps offsets back to the raw input registered with
+    `add_source`.
+    """
+
+    __slots__ = (
+        "chunks",
+        "chunks_start",
+        "start",
+        "end",
+        "source_starts",
+        "source_spans",
+        "source_size",
+        "normalized_size",
+    )
+
+    def __init__(self):
+        self.chunks: List[str] = []  # 未提交的文本块
+        self.chunks_start: int = 0  # 第一个文本块的起始位置
+        self.start: int = 0  # 已提交的位置
+        self.end: int = 0  # 已输入的位置
+        # 原始文本的映射：(规范化起始位置, 原始起始位置, 逐字符映射或 None)
+        self.source_starts: List[int] = []
+        self.source_spans: List[Tuple[int, int, Union[List[int] | None]]] = []
+        self.source_size: int = 0
+        self.normalized_size: int = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __str__(self):
+        return self.text()
+
+    def add_source(self, text: str) -> str:
+        """Register a raw input chunk and return its normalized text."""
+        normalized, index_map = normalize(text)
+        if len(normalized) > 0:
+            self.source_starts.append(self.normalized_size)
+            self.source_spans.append(
+                (self.normalized_size, self.source_size, index_map)
+            )
+        self.source_size += len(text)
+        self.normalized_size += len(normalized)
+        return normalized
+
+    def source_offset(self, offset: int) -> int:
+        """Map an offset of the normalized stream to the raw input."""
+        if offset >= self.normalized_size:
+            return self.source_size
+        idx = bisect.bisect_right(self.source_starts, offset) - 1
+        start, source_start, index_map = self.source_spans[idx]
+        if index_map is None:
+            return source_start + offset - start
+        return source_start + index_map[offset - start]
+
+    def append(self, text: str):
+        if len(text) > 0:
+            self.chunks.append(text)
+            self.end += len(text)
+
+    def text(self, start: Union[int | None] = None, end: Union[int | None] = None):
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        if start >= end:
+            return ""
+        if len(self.chunks) > 1 or self.chunks_start < self.start:
+            # 合并文本块并丢弃已提交的部分，避免重复拼接
+            joined = "".join(self.chunks)[self.start - self.chunks_start :]
+            self.chunks = [joined]
+            self.chunks_start = self.start
+        return self.chunks[0][start - self.chunks_start : end - self.chunks_start]
+
+    def last(self) -> str:
+        """The last character, or "" when all the text is committed."""
+        return self.chunks[-1][-1] if self.end > self.start else ""
+
+    def commit(self, offset: int):
+        """Advance the cursor to `offset` and release the text before it."""
+        if offset <= self.start:
+            return
+        self.start = min(offset, self.end)
+        num_chunks = 0
+        while num_chunks < len(self.chunks):
+            size = len(self.chunks[num_chunks])
+            if self.chunks_start + size > self.start:
+                break
+            num_chunks += 1
+            self.chunks_start += size
+        del self.chunks[:num_chunks]
+        if len(self.chunks) == 0:
+            self.chunks_start = self.start
+        # 保留仍可能被映射的原始文本位置
+        idx = bisect.bisect_right(self.source_starts, self.start) - 1
+        if idx > 0:
+            del self.source_starts[:idx]
+            del self.source_spans[:idx]
+
+
+class SegmentHistory:
+    """Segments and raw input chunks of a session, trimmed by a retention
+    policy so that a long-lived session uses constant memory.
+
+    - all: keep everything
+    - segments: keep the last `limit` segments
+    - chars: keep the last segments that total at most `limit` characters
+    - none: keep nothing
+
+    Dropped history is passed to `on_spill(segments, source)` first.
+    """
+
+    __slots__ = (
+        "retention",
+        "limit",
+        "on_spill",
+        "segments",
+        "source",
+        "num_dropped",
+        "source_start",
+        "num_chars",
+    )
+
+    def __init__(
+        self,
+        retention: Literal["all", "segments", "chars", "none"] = "all",
+        limit: int = 0,
+        on_spill: Union[Callable[[List[Segment], str], None] | None] = None,
+    ):
+        if retention not in ("all", "segments", "chars", "none"):
+            raise ValueError(f"Unknown retention: {retention}")
+        self.retention = retention
+        self.limit = limit
+        self.on_spill = on_spill
+        self.segments: List[Segment] = []  # 保留的分割结果
+        self.source: List[str] = []  # 保留的原始文本块
+        self.num_dropped: int = 0  # 已丢弃的片段数，即 segments[0] 的序号
+        self.source_start: int = 0  # source[0] 在原始文本中的位置
+        self.num_chars: int = 0  # 保留的片段的字符数
+
+    def __len__(self):
+        return self.num_dropped + len(self.segments)
+
+    def append(self, segment: Segment):
+        self.segments.append(segment)
+        self.num_chars += len(segment)
+        if self.retention != "all":
+            self.trim()
+
+    def source_text(self, start: int) -> str:
+        """The kept source text from offset `start` on."""
+        return "".join(self.source)[max(start - self.source_start, 0) :]
+
+    def tail_start(self, size: int) -> int:
+        """Offset in the source where its last `size` normalized characters
+        start, or where the kept source starts if they were dropped."""
+        pos = self.source_start + sum(len(chunk) for chunk in self.source)
+        if size == 0:
+            return pos
+        for chunk in reversed(self.source):
+            pos -= len(chunk)
+            normalized, index_map = normalize(chunk)
+            if size <= len(normalized):
+                i = len(normalized) - size
+                return pos + (i if index_map is None else index_map[i])
+            size -= len(normalized)
+        return self.source_start
+
+    def trim(self):
+        if self.retention == "none":
+            drop = len(self.segments)
+        elif self.retention == "segments":
+            drop = max(0, len(self.segments) - self.limit)
+        else:
+            drop, num_chars = 0, self.num_chars
+            while drop < len(self.segments) and num_chars > self.limit:
+                num_chars -= len(self.segments[drop])
+                drop += 1
+        # 丢弃最早保留的片段之前的原始文本
+        if drop < len(self.segments):
+            keep_from = self.segments[drop].start
+        else:
+            keep_from = self.segments[-1].end
+        num_chunks, pos = 0, self.source_start
+        while num_chunks < len(self.source):
+            size = len(self.source[num_chunks])
+            if pos + size > keep_from:
+                break
+            pos += size
+            num_chunks += 1
+        if drop == 0 and num_chunks == 0:
+            return
+
+        spilled = self.segments[:drop]
+        if self.on_spill is not None:
+            self.on_spill(spilled, "".join(self.source[:num_chunks]))
+        del self.segments[:drop]
+        del self.source[:num_chunks]
+        self.num_dropped += drop
+        self.num_chars -= sum(len(s) for s in spilled)
+        self.source_start = pos
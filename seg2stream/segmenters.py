@@ -1,5 +1,12 @@
+import os
 import re
-from typing import Literal
+import bisect
+import warnings
+import importlib.util
+import functools
+from typing import List, Literal, Set
+
+from .registry import SegmenterHandle, registry
 
 
 class JioNLPSentenceSegmenter(object):
@@ -129,78 +136,429 @@ class JioNLPSentenceSegmenter(object):
         return final_sentences
 
 
-def get_sentence_segmenter(
-    method_name: Literal["jionlp", "pysbd", "stanza"] = "jionlp",
-):
+class JioNLPStreamingSegmenter(object):
+    """Incremental version of `JioNLPSentenceSegmenter`.
+
+    Characters are pushed with `feed`, each one is inspected exactly once. A
+    sentence can only start at the beginning of a token and the decision only
+    depends on the text before it, so the boundaries found so far never change
+    and `boundaries` / `commit` do not rescan the buffer. A boundary is only
+    found at or right after one of the `boundary_chars`.
+    """
+
+    __slots__ = (
+        "puncs",
+        "split_puncs",
+        "lone_puncs",
+        "boundary_chars",
+        "offset",
+        "end",
+        "chunks",
+        "bounds",
+        "_started",
+        "_quote_flag",
+        "_last",
+        "_last2",
+        "_size",
+        "_in_text",
+        "_pending",
+        "_pending_char",
+    )
+    front_quote_list = {"“", "‘"}
+    back_quote_list = {"”", "’"}
+    punctuations = {}  # 各标准的标点集合，所有实例共享
+
+    @staticmethod
+    def make_punctuations(criterion):
+        if criterion == "coarse":
+            puncs = {"。", "！", "？", "\n", "“", "”", "‘", "’"}
+            split_puncs = set("。“”！？\n")
+        elif criterion == "fine":
+            puncs = {
+                "……",
+                "\r\n",
+                "，",
+                "。",
+                ";",
+                "；",
+                "…",
+                "！",
+                "!",
+                "?",
+                "？",
+                "\r",
+                "\n",
+                "“",
+                "”",
+                "‘",
+                "’",
+                "：",
+            }
+            split_puncs = set("，：。;“”；…！!?？\r\n")
+        else:
+            raise ValueError("The parameter `criterion` must be " "`coarse` or `fine`.")
+        # 不参与切分但被视作标点的字符，只有单独成段时才按标点处理
+        lone_puncs = {p for p in puncs if len(p) == 1} - split_puncs
+        return puncs, split_puncs, lone_puncs
+
+    def __init__(self, criterion="coarse"):
+        if criterion not in self.punctuations:
+            self.punctuations[criterion] = self.make_punctuations(criterion)
+        self.puncs, self.split_puncs, self.lone_puncs = self.punctuations[criterion]
+        self.boundary_chars = frozenset("".join(self.puncs))  # 标点中的字符
+
+        self.offset = 0  # 已提交的位置
+        self.end = 0  # 已输入的位置
+        self.chunks = []  # 未提交的文本
+        self.bounds = []  # 未提交部分中的句子起始位置
+        self._reset()
+
+    def _reset(self):
+        self._started = False  # 是否已有句子
+        self._quote_flag = False
+        self._last = ""  # 当前句子的最后一个字符
+        self._last2 = ""  # 当前句子的倒数第二个字符
+        self._size = 0  # 当前句子的长度
+        self._in_text = False  # 是否处于非标点片段中
+        self._pending = -1  # 尚未确定是否单独成段的标点位置
+        self._pending_char = ""
+
+    def _save(self):
+        return (
+            self._started,
+            self._quote_flag,
+            self._last,
+            self._last2,
+            self._size,
+            self._in_text,
+            self._pending,
+            self._pending_char,
+            len(self.bounds),
+        )
+
+    def _restore(self, state):
+        (
+            self._started,
+            self._quote_flag,
+            self._last,
+            self._last2,
+            self._size,
+            self._in_text,
+            self._pending,
+            self._pending_char,
+            num_bounds,
+        ) = state
+        del self.bounds[num_bounds:]
+
+    def _append(self, char):
+        self._last2 = self._last
+        self._last = char
+        self._size += 1
+
+    def _new_sentence(self, char, pos):
+        if self._started:
+            self.bounds.append(pos)
+        self._started = True
+        self._last2 = ""
+        self._last = char
+        self._size = 1
+
+    def _punc_token(self, char, pos):
+        if not self._started:  # 即文本起始字符是标点
+            if char in self.front_quote_list:
+                self._quote_flag = True
+            self._new_sentence(char, pos)
+        elif char in self.front_quote_list:
+            if self._last in self.puncs:  # 前引号前有标点：另起一句
+                self._new_sentence(char, pos)
+            else:  # 前引号之前无任何终止标点，与前一句合并
+                self._append(char)
+            self._quote_flag = True
+        else:  # 普通,非前引号，则与前一句合并
+            self._append(char)
+
+    def _text_token(self, char, pos):
+        if not self._started:  # 起始句且非标点
+            self._new_sentence(char, pos)
+        elif self._quote_flag:  # 当前句子之前有前引号，须与前引号合并
+            self._append(char)
+            self._quote_flag = False
+        elif self._last in self.back_quote_list:
+            if self._size <= 1 or self._last2 not in self.puncs:
+                self._append(char)
+            else:  # 后引号前有终止符，另起一句
+                self._new_sentence(char, pos)
+        else:
+            self._new_sentence(char, pos)
+
+    def _push(self, char, pos):
+        if char in self.split_puncs:
+            if self._pending >= 0:
+                self._punc_token(self._pending_char, self._pending)
+                self._pending = -1
+            self._punc_token(char, pos)
+            self._in_text = False
+        elif self._pending >= 0:
+            self._text_token(self._pending_char, self._pending)
+            self._pending = -1
+            self._append(char)
+        elif self._in_text:
+            self._append(char)
+        else:
+            self._in_text = True
+            if char in self.lone_puncs:
+                self._pending = pos
+                self._pending_char = char
+            else:
+                self._text_token(char, pos)
+
+    def feed(self, chars: str):
+        pos = self.end
+        for char in chars:
+            self._push(char, pos)
+            pos += 1
+        self.end = pos
+        self.chunks.append(chars)
+
+    def boundaries(self, suffix: str = ""):
+        """Start offsets of the sentences after the committed offset, as if the
+        uncommitted text were followed by `suffix`."""
+        state = self._save()
+        pos = self.end
+        for char in suffix:
+            self._push(char, pos)
+            pos += 1
+        if self._pending >= 0:  # 文本以单独的引号结尾
+            self._punc_token(self._pending_char, self._pending)
+        bounds = self.bounds[:]
+        self._restore(state)
+        return bounds
+
+    def commit(self, offset: int):
+        """Drop the text before `offset` and restart segmentation from there."""
+        if offset <= self.offset:
+            return
+        if offset >= self.end:
+            self.offset = self.end = offset
+            self.chunks = []
+            self.bounds = []
+            self._reset()
+            return
+
+        text = "".join(self.chunks)[offset - self.offset :]
+        idx = bisect.bisect_left(self.bounds, offset)
+        if idx < len(self.bounds) and self.bounds[idx] == offset:
+            # 从句子起始处提交时，后续的分割状态与重新分割完全一致
+            self.offset = offset
+            self.chunks = [text]
+            self.bounds = self.bounds[idx + 1 :]
+        else:
+            self.offset = self.end = offset
+            self.chunks = []
+            self.bounds = []
+            self._reset()
+            self.feed(text)
+
+
+class JioNLPSegmenter(object):
+    """`JioNLPSentenceSegmenter` with a fixed criterion, which can also create
+    incremental segmenters for the pipelines."""
+
+    def __init__(self, criterion="coarse"):
+        self.criterion = criterion
+        self.segmenter = JioNLPSentenceSegmenter()
+
+    def __call__(self, text):
+        return self.segmenter(text, criterion=self.criterion)
+
+    def create_stream(self):
+        return JioNLPStreamingSegmenter(self.criterion)
+
+
+class StanzaSegmenter(object):
+    """Stanza sentence segmentation, with batched calls for many texts."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def __call__(self, text):
+        return [s.text for s in self.pipeline(text).sentences]
+
+    def segment_batch(self, texts: List[str]) -> List[List[str]]:
+        docs = self.pipeline.bulk_process(texts)
+        return [[s.text for s in doc.sentences] for doc in docs]
+
+
+def get_boundary_chars(streams: list) -> Set[str] | None:
+    """The characters at or right after which the incremental `streams` can
+    find a boundary, or None if one of them can find one anywhere."""
+    chars = set()
+    for stream in streams:
+        stream_chars = getattr(stream, "boundary_chars", None)
+        if stream_chars is None:
+            return None
+        chars |= stream_chars
+    return chars
+
+
+def to_boundaries(text: str, segmenteds: List[str], offset: int = 0) -> List[int]:
+    """End offsets of `segmenteds`, located one after another in `text`."""
+    bounds, pos = [], 0
+    for seg in segmenteds:
+        idx = text.find(seg, pos)
+        if idx < 0:
+            break
+        pos = idx + len(seg)
+        bounds.append(offset + pos)
+    return bounds
+
+
+class PysbdSegmenter(object):
+    """pysbd sentence segmentation."""
+
+    def __init__(self, language="zh"):
+        import pysbd
+
+        self.segmenter = pysbd.Segmenter(language=language, clean=False)
+
+    def __call__(self, text):
+        return self.segmenter.segment(text)
+
+
+class RegexPhraseSegmenter(object):
+    """Phrases ended by punctuation marks."""
+
+    seg_puncts = re.escape("。？！，；：.?!,;:")
+
+    def __init__(self):
+        self.pattern = re.compile(rf"[{self.seg_puncts}]")
+
+    def __call__(self, text):
+        # 一次扫描找出所有标点，每个标点结束一个短语
+        phrases, start = [], 0
+        for match in self.pattern.finditer(text):
+            phrases.append(text[start : match.end()])
+            start = match.end()
+        if start < len(text):
+            phrases.append(text[start:])
+        return phrases
+
+
+class RhythmSegmenter(object):
+    """Prosodic phrases predicted by the PaddleSpeech rhythm model."""
+
+    def __init__(self, model_path):
+        from paddlespeech.t2s.frontend.zh_frontend import RhyPredictor
+
+        self.detector = RhyPredictor(model_path)
+
+    def __call__(self, text):
+        rhythms = []
+        pred = self.detector.get_prediction(text)
+        bounds = re.sub("[%`~]", "", pred).split("$")[:-1]
+        pi, last_s = 0, 0
+        for idx, rhy in enumerate(bounds):
+            for ci, char in enumerate(rhy):
+                pi = text.find(char, pi)
+                if idx >= 1 and ci == 0:
+                    rhythms.append(text[last_s:pi])
+                    last_s = pi
+                pi += 1
+        rhythms.append(text[last_s:])
+        return rhythms
+
+
+def load_or_fall_back(name, load):
+    """`load()`, or the jionlp sentence segmenter with a warning when the model
+    cannot be loaded, e.g. not installed or not downloaded on an offline host."""
     try:
-        match method_name:
-            case "pysbd":
-                import pysbd
-
-                segmenter = pysbd.Segmenter(language="zh", clean=False)
-                return lambda text: segmenter.segment(text)
-            case "stanza":
-                import stanza
-
-                stanza.download("zh")
-                segmenter = stanza.Pipeline(
-                    "zh", processors="tokenize", download_method=None
-                )
-                return lambda text: [s.text for s in segmenter(text).sentences]
-            case _:
-                raise
-    except:
-        segmenter = JioNLPSentenceSegmenter()
-        return lambda text: segmenter(text, criterion="coarse")
+        return load()
+    except Exception as e:
+        warnings.warn(
+            f"Cannot load the {name} sentence segmenter ({e!r}), "
+            "falling back to jionlp.",
+            RuntimeWarning,
+        )
+        return JioNLPSegmenter(criterion="coarse")
+
+
+def load_stanza():
+    import stanza
+
+    # 复用已下载的模型，只在本地没有时下载
+    pipeline = stanza.Pipeline(
+        "zh",
+        processors="tokenize",
+        download_method=stanza.DownloadMethod.REUSE_RESOURCES,
+    )
+    return StanzaSegmenter(pipeline)
+
+
+def load_boundary(language, level):
+    from .boundary import BoundarySegmenter
+
+    return BoundarySegmenter(language, level=level)
+
+
+def check_language(language):
+    from .boundary import language_packs
+
+    if language not in language_packs:
+        raise ValueError(
+            f"Unknown language {language!r}, expected one of {list(language_packs)}."
+        )
+
+
+# 模型在每个进程中只加载一次，由所有会话共享
+registry.register("sentence", "jionlp", lambda: JioNLPSegmenter(criterion="coarse"))
+registry.register(
+    "sentence", "pysbd", lambda: load_or_fall_back("pysbd", PysbdSegmenter)
+)
+registry.register(
+    "sentence", "stanza", lambda: load_or_fall_back("stanza", load_stanza)
+)
+registry.register(
+    "sentence",
+    "boundary",
+    functools.partial(load_boundary, level="sentence"),
+    validate=check_language,
+)
+registry.register("phrase", "jionlp", lambda: JioNLPSegmenter(criterion="fine"))
+registry.register("phrase", "regex", RegexPhraseSegmenter)
+registry.register(
+    "phrase",
+    "boundary",
+    functools.partial(load_boundary, level="phrase"),
+    validate=check_language,
+)
+registry.register("rhythm", "paddlespeech", RhythmSegmenter)
+
+
+def get_sentence_segmenter(
+    method_name: Literal["jionlp", "pysbd", "stanza", "boundary"] = "jionlp",
+    language: Literal["zh", "en", "ja", "mixed"] = "mixed",
+) -> SegmenterHandle:
+    """A picklable handle of the segmenter, loaded on first use, see
+    `SegmenterHandle`."""
+    if method_name == "boundary":
+        return registry.handle("sentence", method_name, language=language)
+    return registry.handle("sentence", method_name)
 
 
 def get_phrase_segmenter(
-    method_name: Literal["jionlp", "regex"] = "regex",
-):
-    match method_name:
-        case "jionlp":
-            segmenter = JioNLPSentenceSegmenter()
-            return lambda text: segmenter(text, criterion="fine")
-        case _:
-            seg_puncts = re.escape("。？！，；：.?!,;:")
-            patern = re.compile(rf"^[\S\s]*?[{seg_puncts}]")
-
-            def func(text):
-                phrases = []
-                while True:
-                    match = patern.search(text)
-                    if match is None:
-                        break
-                    phrases.append(match.group())
-                    text = text[match.span()[1] :]
-                if len(text) > 0:
-                    phrases.append(text)
-                return phrases
-
-            return func
-
-
-def get_rhythm_segmenter(model_path):
-    try:
-        from paddlespeech.t2s.frontend.zh_frontend import RhyPredictor
+    method_name: Literal["jionlp", "regex", "boundary"] = "regex",
+    language: Literal["zh", "en", "ja", "mixed"] = "mixed",
+) -> SegmenterHandle:
+    if method_name == "boundary":
+        return registry.handle("phrase", method_name, language=language)
+    return registry.handle("phrase", method_name)
 
-        detector = RhyPredictor(model_path)
-
-        def func(text):
-            rhythms = []
-            pred = detector.get_prediction(text)
-            bounds = re.sub("[%`~]", "", pred).split("$")[:-1]
-            pi, last_s = 0, 0
-            for idx, rhy in enumerate(bounds):
-                for ci, char in enumerate(rhy):
-                    pi = text.find(char, pi)
-                    if idx >= 1 and ci == 0:
-                        rhythms.append(text[last_s:pi])
-                        last_s = pi
-                    pi += 1
-            rhythms.append(text[last_s:])
-            return rhythms
-
-        return func
-    except:
+
+def get_rhythm_segmenter(model_path) -> SegmenterHandle | None:
+    """None when PaddleSpeech is not installed or `model_path` does not
+    exist."""
+    if importlib.util.find_spec("paddlespeech") is None:
+        return None
+    if not os.path.exists(model_path):
         return None
+    return registry.handle("rhythm", "paddlespeech", model_path=model_path)
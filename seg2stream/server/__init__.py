@@ -0,0 +1,2 @@
+from .service import SegmentationServer, default_config
+from .client import SegmentationClient, SegmentationClientPool, ClientSession
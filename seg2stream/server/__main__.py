@@ -0,0 +1,47 @@
+import signal
+import asyncio
+import argparse
+
+from .. import get_sentence_segmenter, SegmentationManager
+from ..tuner import load_config
+from .service import SegmentationServer, default_config
+
+
+parser = argparse.ArgumentParser(
+    prog="python -m seg2stream.server",
+    description="Serve the segmentation over a Unix domain socket or a TCP port.",
+)
+parser.add_argument("--unix", help="socket path, instead of the TCP port")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--config", help="JSON SegSent2StreamConfig, e.g. from the tuner")
+parser.add_argument("--segmenter", choices=["jionlp", "boundary"], default="jionlp")
+parser.add_argument("--workers", type=int, default=1, help="segmentation processes")
+parser.add_argument("--max-sessions", type=int)
+parser.add_argument("--session-ttl", type=float)
+parser.add_argument("--engine", choices=["tasks", "multiplexed"], default="tasks")
+args = parser.parse_args()
+
+manager = SegmentationManager(
+    seg_config=load_config(args.config) if args.config else default_config,
+    segmenters=[get_sentence_segmenter(args.segmenter)],
+    num_workers=args.workers,
+    max_sessions=args.max_sessions,
+    session_ttl=args.session_ttl,
+    engine=args.engine,
+)
+
+
+async def main():
+    server = SegmentationServer(manager, args.unix, args.host, args.port)
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"serving on {server.address}", flush=True)
+    await stop.wait()
+    await server.close()
+
+
+asyncio.run(main())
@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+from typing import Dict, List
+
+from ..seg_manager import SessionLimitError, Remainder
+from .protocol import (
+    OPEN,
+    TEXT,
+    END,
+    CANCEL,
+    PLAYBACK,
+    SEGMENT,
+    REMAINDER,
+    CLOSED,
+    REJECTED,
+    FrameWriter,
+    read_frames,
+    frame_errors,
+    decode_segment,
+    encode_playback,
+)
+
+
+class ClientSession:
+    """A session opened by `SegmentationClient.open`: push its text with `push`
+    and `end`, and read its segments from `output_stream`."""
+
+    def __init__(self, client: "SegmentationClient", id: int):
+        self.client = client
+        self.id = id
+        self.outputs: asyncio.Queue = asyncio.Queue()  # 片段、剩余文本、异常或 None
+
+    def push(self, text: str):
+        self.client.out.send(TEXT, self.id, text.encode("utf-8"))
+
+    async def drain(self):
+        """Wait until the server has taken the text pushed so far, to slow down
+        with it instead of piling text up in the connection, see
+        `FrameWriter`."""
+        await self.client.out.drain()
+
+    def end(self):
+        self.client.out.send(END, self.id)
+
+    def cancel(self, return_remainder: bool = False):
+        """See `SegmentationManager.cancel`."""
+        self.client.out.send(CANCEL, self.id, bytes([return_remainder]))
+
+    def report_playback(
+        self,
+        index: int,
+        synthesis_start: float | None = None,
+        first_chunk_time: float | None = None,
+        audio_duration: float | None = None,
+    ):
+        """See `SegmentationManager.report_playback`. The times are compared
+        with the server's `time.monotonic()`, so only meaningful on the same
+        host."""
+        payload = encode_playback(
+            index, synthesis_start, first_chunk_time, audio_duration
+        )
+        self.client.out.send(PLAYBACK, self.id, payload)
+
+    async def output_stream(self):
+        """Yield the segments of the session, and its `Remainder` when cancelled
+        with `return_remainder`, until it ends."""
+        while True:
+            output = await self.outputs.get()
+            if output is None:
+                return
+            if isinstance(output, Exception):
+                raise output
+            yield output
+
+
+class SegmentationClient:
+    """A connection to a `SegmentationServer`, shared by any number of
+    sessions."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.out = FrameWriter(writer)
+        self.sessions: Dict[int, ClientSession] = {}  # 尚未结束的会话
+        self.counter = itertools.count()
+        self.is_closed = False
+        self.read_task = asyncio.create_task(self.read_outputs(reader))
+
+    @classmethod
+    async def connect(
+        cls, path: str | None = None, host: str = "127.0.0.1", port: int | None = None
+    ) -> "SegmentationClient":
+        """Connect to the Unix domain socket `path`, or else to `host:port`."""
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    def open(self) -> ClientSession:
+        """Open a session. Its text can be pushed at once, without waiting for
+        the server; a rejected session raises `SessionLimitError` from
+        `output_stream`."""
+        if self.is_closed:
+            raise ConnectionError("The connection to the server is closed.")
+        session = ClientSession(self, next(self.counter))
+        self.sessions[session.id] = session
+        self.out.send(OPEN, session.id)
+        return session
+
+    async def read_outputs(self, reader: asyncio.StreamReader):
+        try:
+            async for frames in read_frames(reader):
+                for op, id, payload in frames:
+                    session = self.sessions.get(id)
+                    if session is None:
+                        continue
+                    if op == SEGMENT:
+                        session.outputs.put_nowait(decode_segment(payload))
+                    elif op == REMAINDER:
+                        remainder = decode_segment(payload)
+                        remainder = Remainder(remainder, *remainder.span)
+                        session.outputs.put_nowait(remainder)
+                    elif op == REJECTED:
+                        error = SessionLimitError(str(payload, "utf-8"))
+                        session.outputs.put_nowait(error)
+                    elif op == CLOSED:
+                        del self.sessions[id]
+                        session.outputs.put_nowait(None)
+        except frame_errors:
+            pass
+        finally:
+            # 连接断开，未结束的会话以异常结束
+            self.is_closed = True
+            for session in self.sessions.values():
+                error = ConnectionError("Lost the connection to the server.")
+                session.outputs.put_nowait(error)
+            self.sessions.clear()
+
+    async def close(self):
+        """Close the connection. The server cancels the sessions still open."""
+        self.is_closed = True
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self.read_task
+
+
+class SegmentationClientPool:
+    """Up to `size` connections to one server, opened on demand. A new session
+    goes to an idle connection, else to a new one, else to the connection
+    with the fewest sessions. Lost connections are replaced."""
+
+    def __init__(
+        self,
+        path: str | None = None,
+        host: str = "127.0.0.1",
+        port: int | None = None,
+        size: int = 4,
+    ):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.size = size
+        self.clients: List[SegmentationClient] = []
+        self.lock = asyncio.Lock()  # 同时打开的会话不重复建立连接
+
+    async def open(self) -> ClientSession:
+        async with self.lock:
+            self.clients = [c for c in self.clients if not c.is_closed]
+            client = min(self.clients, key=lambda c: len(c.sessions), default=None)
+            if client is None or (
+                len(client.sessions) > 0 and len(self.clients) < self.size
+            ):
+                client = await SegmentationClient.connect(
+                    self.path, self.host, self.port
+                )
+                self.clients.append(client)
+            return client.open()
+
+    async def close(self):
+        clients, self.clients = self.clients, []
+        await asyncio.gather(*[client.close() for client in clients])
+
+    def get_session_count(self) -> int:
+        return sum(len(client.sessions) for client in self.clients)
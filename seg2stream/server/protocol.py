@@ -0,0 +1,123 @@
+import math
+import struct
+import asyncio
+from typing import List, Tuple
+
+from ..segment_buffer import Segment
+
+
+# 帧：4 字节长度 + 1 字节操作 + 8 字节会话 id + 内容。不使用 pickle，可以接受不受信任的连接
+header = struct.Struct("<IBq")
+span_struct = struct.Struct("<qq")
+playback_struct = struct.Struct("<qddd")
+max_frame_size = 1 << 24  # 超过该大小的帧视为协议错误
+max_pending_size = 1 << 24  # 对端不读取时，最多等待发送的字节数
+# 连接断开，或帧无法解析 (内容不是 UTF-8、过短)，都关闭连接
+frame_errors = (ConnectionError, ValueError, IndexError, struct.error)
+
+# 客户端 -> 服务端
+OPEN = ord("O")  # 打开会话
+TEXT = ord("T")  # 输入文本，内容为 UTF-8 文本
+END = ord("E")  # 结束输入
+CANCEL = ord("C")  # 取消会话，内容为 1 字节是否返回剩余文本
+PLAYBACK = ord("P")  # 播放反馈，内容为片段序号和三个时间 (NaN 表示 None)
+
+# 服务端 -> 客户端
+SEGMENT = ord("S")  # 分割结果，内容为在原始文本中的位置和 UTF-8 文本
+REMAINDER = ord("R")  # 取消的会话未输出的文本，内容同 SEGMENT
+CLOSED = ord("Z")  # 会话结束，即 (id, None)
+REJECTED = ord("X")  # 会话被拒绝，内容为原因
+
+
+def encode_frame(op: int, id: int, payload: bytes = b"") -> bytes:
+    return header.pack(header.size - 4 + len(payload), op, id) + payload
+
+
+def encode_segment(segment: Segment) -> bytes:
+    return span_struct.pack(segment.start, segment.end) + segment.encode("utf-8")
+
+
+def decode_segment(payload: memoryview) -> Segment:
+    start, end = span_struct.unpack_from(payload)
+    return Segment(str(payload[span_struct.size :], "utf-8"), start, end)
+
+
+def encode_playback(index: int, *times: float | None) -> bytes:
+    return playback_struct.pack(index, *[math.nan if t is None else t for t in times])
+
+
+def decode_playback(
+    payload: memoryview,
+) -> Tuple[int, float | None, float | None, float | None]:
+    index, *times = playback_struct.unpack_from(payload)
+    return index, *[None if math.isnan(t) else t for t in times]
+
+
+class FrameWriter:
+    """Write frames to a stream. Frames sent in the same event loop tick are
+    written at once. When the peer stops reading and more than
+    `max_pending_size` bytes wait to be sent, the connection is dropped;
+    `drain` lets a sender wait for the peer instead."""
+
+    def __init__(
+        self, writer: asyncio.StreamWriter, max_pending_size: int = max_pending_size
+    ):
+        self.writer = writer
+        self.max_pending_size = max_pending_size
+        self.out_buffer = bytearray()
+        self.is_scheduled = False
+
+    def pending_size(self) -> int:
+        """Bytes sent but not yet taken by the peer's socket."""
+        return len(self.out_buffer) + self.writer.transport.get_write_buffer_size()
+
+    def send(self, op: int, id: int, payload: bytes = b""):
+        if self.writer.is_closing():  # 连接已断开时丢弃
+            return
+        self.out_buffer += encode_frame(op, id, payload)
+        if self.pending_size() > self.max_pending_size:
+            # 对端不读取，不再无限缓存，断开连接，由读取方结束其会话
+            self.out_buffer.clear()
+            self.writer.transport.abort()
+            return
+        if not self.is_scheduled:
+            self.is_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        self.is_scheduled = False
+        if not self.writer.is_closing() and len(self.out_buffer) > 0:
+            self.writer.write(bytes(self.out_buffer))
+        self.out_buffer.clear()
+
+    async def drain(self):
+        """Write the frames sent so far and wait until the transport's buffer
+        is below its high-water mark."""
+        self.flush()
+        await self.writer.drain()
+
+
+async def read_frames(reader: asyncio.StreamReader):
+    """Yield the frames `(op, id, payload)` that arrived together, until the
+    stream ends."""
+    in_buffer = bytearray()
+    while True:
+        data = await reader.read(1 << 16)
+        if not data:
+            return
+        in_buffer += data
+        frames: List[Tuple[int, int, Tuple[int, int]]] = []
+        pos = 0
+        while len(in_buffer) - pos >= header.size:
+            size, op, id = header.unpack_from(in_buffer, pos)
+            if size > max_frame_size or size < header.size - 4:
+                raise ConnectionError(f"Invalid frame of {size} bytes.")
+            if len(in_buffer) - pos - 4 < size:
+                break
+            frames.append((op, id, (pos + header.size, pos + 4 + size)))
+            pos += 4 + size
+        if pos == 0:
+            continue
+        view = memoryview(bytes(in_buffer[:pos]))
+        del in_buffer[:pos]
+        yield [(op, id, view[start:end]) for op, id, (start, end) in frames]
@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+from typing import Any, Dict, Tuple
+
+from ..seg2stream import SegmentationConfig as SegSent2StreamConfig
+from ..seg_manager import SegmentationManager, SessionLimitError, Remainder
+from .protocol import (
+    OPEN,
+    TEXT,
+    END,
+    CANCEL,
+    PLAYBACK,
+    SEGMENT,
+    REMAINDER,
+    CLOSED,
+    REJECTED,
+    FrameWriter,
+    read_frames,
+    frame_errors,
+    encode_segment,
+    decode_playback,
+    max_pending_size,
+)
+
+
+# 服务的默认配置，可由命令行的 --config 替换
+default_config = SegSent2StreamConfig(
+    segmentation_suffix="####",
+    ################
+    first_max_accu_time=0.1,
+    max_accu_time=1.0,
+    first_max_buffer_size=20,
+    max_buffer_size=50,
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=20,
+    min_seg_size=50,
+    max_seg_size=70,
+    loose_steps=4,
+    loose_size=10,
+    fade_in_out_time=0.2,
+    seconds_per_word=0.3,
+)
+
+
+class Connection:
+    """A client connection and the sessions it opened."""
+
+    def __init__(self, writer: asyncio.StreamWriter, max_pending_size: int):
+        self.out = FrameWriter(writer, max_pending_size)
+        self.sessions: Dict[int, int] = {}  # 客户端的会话 id -> 管理器的会话 id
+
+
+class SegmentationServer:
+    """Host a `SegmentationManager` behind a Unix domain socket (`path`) or a
+    TCP port, so that the processes of a frontend share one warm segmentation
+    backend. Each connection multiplexes any number of sessions, see
+    `SegmentationClient`. A connection that stops reading is dropped once
+    `max_pending_size` bytes of output wait for it, rather than holding up
+    the other connections."""
+
+    def __init__(
+        self,
+        manager: SegmentationManager,
+        path: str | None = None,
+        host: str | None = "127.0.0.1",
+        port: int = 0,
+        max_pending_size: int = max_pending_size,
+    ):
+        self.manager = manager
+        self.path = path
+        self.host = host
+        self.port = port
+        self.max_pending_size = max_pending_size
+        # 管理器的会话 id -> 所属连接与客户端的会话 id
+        self.routes: Dict[int, Tuple[Connection, int]] = {}
+        self.counter = itertools.count()
+        self.server: asyncio.AbstractServer | None = None
+        self.output_task: asyncio.Task | None = None
+
+    @property
+    def address(self) -> Any:
+        """The socket path, or the `(host, port)` actually bound."""
+        if self.path is not None:
+            return self.path
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def start(self):
+        self.manager.start()
+        self.output_task = asyncio.create_task(self.route_outputs())
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, self.path)
+        else:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+    async def close(self):
+        """Stop accepting connections, cancel the open sessions and stop the
+        manager."""
+        self.server.close()
+        await self.server.wait_closed()
+        for id in list(self.routes):
+            self.manager.cancel(id)
+        # 分割进程退出前继续转发输出，直到各分割进程的结束标记
+        self.manager.close()
+        await self.output_task
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(writer, self.max_pending_size)
+        try:
+            async for frames in read_frames(reader):
+                for op, id, payload in frames:
+                    self.dispatch(connection, op, id, payload)
+        except frame_errors:  # 连接断开或协议错误
+            pass
+        finally:
+            # 断开的连接不再读取输出，取消其会话
+            for id in list(connection.sessions.values()):
+                self.manager.cancel(id)
+            writer.close()
+
+    def dispatch(self, connection: Connection, op: int, id: int, payload: memoryview):
+        if op == OPEN:
+            session_id = next(self.counter)
+            try:
+                self.manager.add_text(session_id, "")  # 打开会话，检查会话数
+            except SessionLimitError as e:
+                connection.out.send(REJECTED, id, str(e).encode("utf-8"))
+                connection.out.send(CLOSED, id)
+                return
+            connection.sessions[id] = session_id
+            self.routes[session_id] = (connection, id)
+            return
+        session_id = connection.sessions.get(id)
+        if session_id is None:  # 会话已结束时忽略
+            return
+        if op == TEXT:
+            self.manager.add_text(session_id, str(payload, "utf-8"))
+        elif op == END:
+            self.manager.add_text(session_id, None)
+        elif op == CANCEL:
+            self.manager.cancel(session_id, return_remainder=payload[0] == 1)
+        elif op == PLAYBACK:
+            self.manager.report_playback(session_id, *decode_playback(payload))
+
+    async def route_outputs(self):
+        async for session_id, output in self.manager.get_async_output():
+            route = self.routes.get(session_id)
+            if route is None:
+                continue
+            connection, id = route
+            if output is None:
+                del self.routes[session_id]
+                connection.sessions.pop(id, None)
+                connection.out.send(CLOSED, id)
+            elif type(output) is Remainder:
+                connection.out.send(REMAINDER, id, encode_segment(output))
+            else:
+                connection.out.send(SEGMENT, id, encode_segment(output))
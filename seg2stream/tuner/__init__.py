@@ -0,0 +1,11 @@
+from .search import (
+    Tuner,
+    default_space,
+    default_config,
+    objectives,
+    evaluate,
+    pareto_front,
+    load_corpus,
+    load_config,
+    save_config,
+)
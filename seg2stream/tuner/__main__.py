@@ -0,0 +1,61 @@
+import json
+import argparse
+
+from .search import (
+    Tuner,
+    default_config,
+    load_config,
+    load_corpus,
+    objectives,
+    save_config,
+)
+
+
+parser = argparse.ArgumentParser(
+    prog="python -m seg2stream.tuner",
+    description="Search SegSent2StreamConfig against recorded token streams.",
+)
+parser.add_argument("-o", "--output", default="config.json", help="best config file")
+parser.add_argument(
+    "--corpus", help="JSON token streams, the benchmark traces by default"
+)
+parser.add_argument("--space", help="JSON object of config name -> candidate values")
+parser.add_argument("--base", help="JSON config for the items outside the space")
+parser.add_argument(
+    "--strategy", choices=["grid", "random", "pareto"], default="pareto"
+)
+parser.add_argument("--trials", type=int, default=100)
+parser.add_argument("--workers", type=int, default=1, help="evaluation processes")
+parser.add_argument("--segmenter", choices=["jionlp", "boundary"], default="jionlp")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument(
+    "--weights",
+    type=float,
+    nargs=len(objectives),
+    metavar="W",
+    help=f"weights of {', '.join(objectives)} to pick the best config on the front",
+)
+parser.add_argument("--front", help="write the Pareto front to this JSON file")
+args = parser.parse_args()
+
+space = None
+if args.space:
+    with open(args.space) as f:
+        space = json.load(f)
+corpus = load_corpus(args.corpus) if args.corpus else None
+base_config = load_config(args.base) if args.base else default_config
+tuner = Tuner(corpus, space, args.segmenter, args.workers, args.seed, base_config)
+tuner.search(args.strategy, args.trials)
+
+front = sorted(tuner.front(), key=lambda t: t["objectives"]["time_to_first_segment"])
+print(f"{len(tuner.trials)} trials, {len(front)} on the Pareto front")
+print("".join(f"{k:>24}" for k in objectives))
+for trial in front:
+    print("".join(f"{trial['objectives'][k]:>24.4f}" for k in objectives))
+if args.front:
+    with open(args.front, "w") as f:
+        json.dump(front, f, indent=2, ensure_ascii=False)
+
+weights = dict(zip(objectives, args.weights)) if args.weights else None
+save_config(tuner.best(weights), args.output)
+print(f"best config written to {args.output}")
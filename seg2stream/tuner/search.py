@@ -0,0 +1,341 @@
+import json
+import random
+import asyncio
+import functools
+import itertools
+from dataclasses import asdict, replace
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Literal, Tuple
+
+from .. import (
+    get_sentence_segmenter,
+    SegSent2StreamPipeline,
+    SegSent2StreamConfig,
+    MetricsAggregator,
+    VirtualClock,
+    replay_virtual,
+)
+from ..benchmark.traces import get_traces
+
+
+Events = List[Tuple[float, str]]
+
+# 搜索的起点，可由 Tuner 的 base_config 替换
+default_config = SegSent2StreamConfig(
+    segmentation_suffix="####",
+    ################
+    first_max_accu_time=0.1,
+    max_accu_time=1.0,
+    first_max_buffer_size=20,
+    max_buffer_size=50,
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=20,
+    min_seg_size=50,
+    max_seg_size=70,
+    loose_steps=4,
+    loose_size=10,
+    fade_in_out_time=0.2,
+    seconds_per_word=0.3,
+)
+# 搜索的取值，未列出的配置项保持 base_config 的值
+default_space: Dict[str, List[Any]] = {
+    "first_max_accu_time": [0.05, 0.1, 0.2, 0.4],
+    "max_accu_time": [0.5, 1.0, 2.0],
+    "first_max_buffer_size": [10, 20, 40],
+    "max_buffer_size": [30, 50, 80],
+    "first_min_seg_size": [5, 10, 20, 30],
+    "min_seg_size": [20, 35, 50, 80],
+    "max_seg_size": [50, 70, 100, 150],
+    "loose_steps": [2, 4, 8],
+    "loose_size": [5, 10, 20],
+    "seconds_per_word": [0.2, 0.3, 0.4],
+}
+objectives = [
+    "time_to_first_segment",
+    "segments_per_100_chars",
+    "forced_rate",
+    "playback_gaps",
+]
+speech_seconds_per_char = 0.2  # 预测播放时长用的语速，与被调的 seconds_per_word 无关
+synthesis_delay = 0.3  # 片段分割后到开始播放的合成时间
+
+
+def load_corpus(path: str) -> Dict[str, Events]:
+    """A JSON list of `{"name": ..., "events": [[timestamp, token], ...]}`."""
+    with open(path) as f:
+        return {
+            t["name"]: [(ts, token) for ts, token in t["events"]] for t in json.load(f)
+        }
+
+
+def default_corpus() -> Dict[str, Events]:
+    return {name: trace.events() for name, trace in get_traces().items()}
+
+
+def save_config(config: SegSent2StreamConfig, path: str):
+    with open(path, "w") as f:
+        json.dump(asdict(config), f, indent=2, ensure_ascii=False)
+
+
+def load_config(path: str) -> SegSent2StreamConfig:
+    with open(path) as f:
+        return SegSent2StreamConfig(**json.load(f))
+
+
+def make_config(
+    params: Dict[str, Any], base_config: SegSent2StreamConfig = default_config
+) -> SegSent2StreamConfig:
+    return replace(base_config, **params)
+
+
+def is_valid(
+    params: Dict[str, Any], base_config: SegSent2StreamConfig = default_config
+) -> bool:
+    config = make_config(params, base_config)
+    return (
+        config.first_min_seg_size <= config.max_seg_size
+        and config.min_seg_size <= config.max_seg_size
+    )
+
+
+def predict_gaps(emits: List[Tuple[float, str]]) -> float:
+    """Seconds of silence between the segments, if each one is spoken as soon
+    as it is synthesized and the previous one has finished."""
+    gaps, end = 0.0, None
+    for emit_time, segment in emits:
+        start = emit_time + synthesis_delay
+        if end is not None and start > end:
+            gaps += start - end
+        end = max(start, end or start) + len(segment) * speech_seconds_per_char
+    return gaps
+
+
+async def replay_trace(config, segmenters, events: Events):
+    metrics = MetricsAggregator()
+    pipeline = SegSent2StreamPipeline(
+        config, segmenters, metrics=metrics, clock=VirtualClock(events[0][0])
+    )
+    emits = await replay_virtual(pipeline, events)
+    emits = [(t, s) for t, s in emits if len(s) > 0]
+    return emits, metrics.snapshot()["counters"]
+
+
+def evaluate(
+    params: Dict[str, Any],
+    segmenters: List[Any],
+    corpus: Dict[str, Events],
+    base_config: SegSent2StreamConfig = default_config,
+) -> Dict[str, float]:
+    """Replay the corpus in simulated time, return the objectives (all lower
+    is better)."""
+    config = make_config(params, base_config)
+    first_times, gaps = [], []
+    num_chars = num_segments = num_forced = num_fires = 0
+    for events in corpus.values():
+        emits, counters = asyncio.run(replay_trace(config, segmenters, events))
+        if emits:
+            first_times.append(emits[0][0] - events[0][0])
+        gaps.append(predict_gaps(emits))
+        num_chars += sum(len(token) for _, token in events)
+        num_segments += len(emits)
+        num_forced += counters.get("fires_forced", 0)
+        num_fires += counters.get("fires_forced", 0) + counters.get("fires_natural", 0)
+    return {
+        "time_to_first_segment": sum(first_times) / max(1, len(first_times)),
+        "segments_per_100_chars": num_segments * 100 / max(1, num_chars),
+        "forced_rate": num_forced / max(1, num_fires),
+        "playback_gaps": sum(gaps) / max(1, len(gaps)),
+    }
+
+
+# 每个进程只创建一次分割器和语料
+worker_state: Dict[str, Any] = {}
+
+
+def init_worker(
+    segmenter: str, corpus: Dict[str, Events], base_config: SegSent2StreamConfig
+):
+    worker_state["segmenters"] = [get_sentence_segmenter(segmenter)]
+    worker_state["corpus"] = corpus
+    worker_state["base_config"] = base_config
+
+
+def evaluate_in_worker(params: Dict[str, Any]) -> Dict[str, float]:
+    return evaluate(
+        params,
+        worker_state["segmenters"],
+        worker_state["corpus"],
+        worker_state["base_config"],
+    )
+
+
+def dominates(a: Dict[str, float], b: Dict[str, float]) -> bool:
+    return all(a[k] <= b[k] for k in objectives) and any(
+        a[k] < b[k] for k in objectives
+    )
+
+
+def pareto_front(trials: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        t
+        for t in trials
+        if not any(dominates(o["objectives"], t["objectives"]) for o in trials)
+    ]
+
+
+def pick_best(front: List[Dict[str, Any]], weights: Dict[str, float]) -> Dict[str, Any]:
+    """The trial with the lowest weighted sum of the min-max normalized
+    objectives."""
+    bounds = {
+        k: (
+            min(t["objectives"][k] for t in front),
+            max(t["objectives"][k] for t in front),
+        )
+        for k in objectives
+    }
+
+    def score(trial):
+        total = 0.0
+        for k in objectives:
+            low, high = bounds[k]
+            if high > low:
+                total += (
+                    weights.get(k, 1.0) * (trial["objectives"][k] - low) / (high - low)
+                )
+        return total
+
+    return min(front, key=score)
+
+
+def sample(space: Dict[str, List[Any]], rng: random.Random) -> Dict[str, Any]:
+    return {name: rng.choice(values) for name, values in space.items()}
+
+
+def mutate(
+    params: Dict[str, Any], space: Dict[str, List[Any]], rng: random.Random
+) -> Dict[str, Any]:
+    """Move one or two knobs to a neighbouring value."""
+    params = dict(params)
+    for name in rng.sample(list(space), min(len(space), rng.choice([1, 2]))):
+        values = space[name]
+        i = values.index(params[name]) + rng.choice([-1, 1])
+        params[name] = values[min(max(i, 0), len(values) - 1)]
+    return params
+
+
+class Tuner(object):
+    """Search `SegSent2StreamConfig` against a corpus of recorded token streams.
+
+    - grid: every combination of the space
+    - random: `trials` uniform samples of the space
+    - pareto: a quarter of the trials at random, then rounds of small changes
+      to the configs on the current Pareto front
+
+    The config items outside the space keep the values of `base_config`.
+    """
+
+    def __init__(
+        self,
+        corpus: Dict[str, Events] | None = None,
+        space: Dict[str, List[Any]] | None = None,
+        segmenter: Literal["jionlp", "boundary"] = "jionlp",
+        workers: int = 1,
+        seed: int = 0,
+        base_config: SegSent2StreamConfig = default_config,
+    ):
+        self.corpus = corpus or default_corpus()
+        self.space = space or default_space
+        self.segmenter = segmenter
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.base_config = base_config  # 搜索空间之外的配置项
+        self.trials: List[Dict[str, Any]] = []
+        self.seen = set()
+
+    def propose(self, params: Dict[str, Any]) -> bool:
+        key = tuple(sorted(params.items()))
+        if key in self.seen or not is_valid(params, self.base_config):
+            return False
+        self.seen.add(key)
+        return True
+
+    def run_batch(self, executor, batch: List[Dict[str, Any]]):
+        if executor is None:
+            segmenters = [get_sentence_segmenter(self.segmenter)]
+            results = [
+                evaluate(p, segmenters, self.corpus, self.base_config) for p in batch
+            ]
+        else:
+            results = list(executor.map(evaluate_in_worker, batch))
+        self.trials += [{"params": p, "objectives": r} for p, r in zip(batch, results)]
+
+    def sample_params(self) -> Dict[str, Any]:
+        return sample(self.space, self.rng)
+
+    def mutate_front(self, front: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return mutate(self.rng.choice(front)["params"], self.space, self.rng)
+
+    def random_batch(self, size: int, make) -> List[Dict[str, Any]]:
+        batch, attempts = [], 0
+        while len(batch) < size and attempts < size * 100:
+            attempts += 1
+            params = make()
+            if self.propose(params):
+                batch.append(params)
+        return batch
+
+    def search(
+        self, strategy: Literal["grid", "random", "pareto"] = "random", trials: int = 50
+    ):
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(
+                self.workers,
+                initializer=init_worker,
+                initargs=(self.segmenter, self.corpus, self.base_config),
+            )
+        try:
+            if strategy == "grid":
+                names = list(self.space)
+                grid = [
+                    dict(zip(names, values))
+                    for values in itertools.product(*self.space.values())
+                ]
+                if len(grid) > trials:
+                    raise ValueError(
+                        f"The grid has {len(grid)} configs, more than {trials} trials."
+                    )
+                self.run_batch(executor, [p for p in grid if self.propose(p)])
+            elif strategy == "random":
+                self.run_batch(executor, self.random_batch(trials, self.sample_params))
+            elif strategy == "pareto":
+                batch = self.random_batch(max(1, trials // 4), self.sample_params)
+                self.run_batch(executor, batch)
+                round_size = max(1, self.workers) * 2
+                while len(self.trials) < trials:
+                    make = functools.partial(self.mutate_front, self.front())
+                    size = min(round_size, trials - len(self.trials))
+                    batch = self.random_batch(size, make)
+                    if len(batch) == 0:  # 前沿附近已搜索完
+                        break
+                    self.run_batch(executor, batch)
+            else:
+                raise ValueError(f"Unknown strategy: {strategy}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self.trials
+
+    def front(self) -> List[Dict[str, Any]]:
+        return pareto_front(self.trials)
+
+    def best(self, weights: Dict[str, float] | None = None) -> SegSent2StreamConfig:
+        front = self.front()
+        if len(front) == 0:
+            raise RuntimeError(
+                "No trials to pick the best config from: run search() first, "
+                "with a space that has valid configs."
+            )
+        best = pick_best(front, weights or {})
+        return make_config(best["params"], self.base_config)
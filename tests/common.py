@@ -0,0 +1,168 @@
+"""Inputs and drivers shared by the test scripts."""
+
+import asyncio
+from dataclasses import replace
+from typing import Any, Dict, List, Tuple
+from seg2stream import (
+    SegSent2StreamConfig,
+    SegSent2GeneratorConfig,
+    SegmentationManager,
+    Segment,
+    VirtualClock,
+)
+
+
+test_text = """凌晨三点，林夏被手机铃声惊醒。屏幕上显示“未知号码”，她犹豫着接起，电话那头只有沙沙的雨声。
+“喂？”她试探着问。“记得带伞。”一个熟悉的声音轻轻响起，是已故母亲的口吻。
+林夏猛地坐起，窗外暴雨如注。她冲到玄关，发现一把陌生的黑伞静静立着——伞柄上刻着她的小名，字迹早已褪色。
+第二天，新闻播报昨夜基站故障，全市通信中断四小时。林夏握紧伞柄，雨滴从檐角坠落，像谁的眼泪。"""
+short_text = "\n".join(test_text.splitlines()[:3])  # 前三段
+
+# 不累积、尽早输出的配置
+stream_config = SegSent2StreamConfig(
+    segmentation_suffix="####",
+    ################
+    first_max_accu_time=0.0,
+    max_accu_time=0.0,
+    first_max_buffer_size=10,
+    max_buffer_size=20,
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=5,
+    min_seg_size=10,
+    max_seg_size=70,
+    loose_steps=4,
+    loose_size=10,
+    fade_in_out_time=0.0,
+    seconds_per_word=0.0,
+)
+# 片段没有最小长度，每个句子尽早输出
+eager_stream_config = replace(
+    stream_config,
+    first_max_buffer_size=20,
+    max_buffer_size=50,
+    first_min_seg_size=0,
+    min_seg_size=0,
+)
+generator_config = SegSent2GeneratorConfig(
+    segmentation_suffix="####",
+    ################
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=5,
+    min_seg_size=10,
+)
+# 按语速累积的配置，与 test_seg2stream.py 相同
+paced_stream_config = SegSent2StreamConfig(
+    segmentation_suffix="####",
+    ################
+    first_max_accu_time=0.1,
+    max_accu_time=1.0,
+    first_max_buffer_size=20,
+    max_buffer_size=50,
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=20,
+    min_seg_size=50,
+    max_seg_size=70,
+    loose_steps=4,
+    loose_size=10,
+    fade_in_out_time=0.2,
+    seconds_per_word=0.3,
+)
+paced_generator_config = SegSent2GeneratorConfig(
+    segmentation_suffix="####",
+    ################
+    max_waiting_time=2.0,
+    max_stream_time=30.0,
+    first_min_seg_size=20,
+    min_seg_size=100,
+)
+
+
+def clean(text: str) -> str:
+    """The text without whitespace, which the segments of a CJK text join up to."""
+    return "".join(text.split())
+
+
+def split_text(text: str, size: int) -> List[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+async def run_pipeline(
+    pipeline: Any, tokens: List[str], interval: float | None = 0.0
+) -> List[str]:
+    """Feed the tokens to an asyncio pipeline while it segments, `interval`
+    seconds apart (all before segmenting if None), and return its non-empty
+    outputs: the segments of a stream pipeline, the joined texts of a
+    generator pipeline."""
+    outputs = []
+
+    async def consume():
+        async for output in pipeline.output_stream():
+            if not isinstance(output, str):
+                output = "".join([text async for text in output])
+            if len(output) > 0:
+                outputs.append(output)
+
+    async def send_text():
+        for token in tokens:
+            pipeline.fill(token)
+            if interval is not None:
+                await asyncio.sleep(interval)
+        pipeline.fill(None)
+
+    if interval is None:
+        await send_text()
+        await asyncio.gather(consume(), pipeline.segment())
+    else:
+        await asyncio.gather(consume(), pipeline.segment(), send_text())
+    return outputs
+
+
+async def run_sessions(
+    seg_manager: SegmentationManager,
+    sessions: Dict[Any, List[str]],
+    interval: float = 0.0,
+    num_ended: int | None = None,
+) -> Dict[Any, List[Any]]:
+    """Send the tokens of all the sessions round by round, `interval` seconds
+    apart, end them, and return the outputs of each session once `num_ended`
+    sessions (all of them by default) have ended."""
+    num_ended = len(sessions) if num_ended is None else num_ended
+
+    async def send_texts():
+        for i in range(max(len(tokens) for tokens in sessions.values())):
+            for id, tokens in sessions.items():
+                if i < len(tokens):
+                    seg_manager.add_text(id, tokens[i])
+            await asyncio.sleep(interval)
+        for id in sessions:
+            seg_manager.add_text(id, None)
+
+    async def get_outputs():
+        outputs = {id: [] for id in sessions}
+        ended = 0
+        async for id, output in seg_manager.get_async_output():
+            if output is None:
+                ended += 1
+                if ended == num_ended:
+                    return outputs
+            else:
+                outputs.setdefault(id, []).append(output)
+
+    return (await asyncio.gather(send_texts(), get_outputs()))[1]
+
+
+def run_core(core: Any, events: List[Tuple[float, str]]) -> List[Tuple[float, Segment]]:
+    """Feed `(timestamp, token)` events to a synchronous core, acting on the
+    timeouts that expire in between, and return the segments with the time
+    they were output. A `VirtualClock` of the core follows the events."""
+    emits = []
+    for timestamp, token in events:
+        if isinstance(core.clock, VirtualClock):
+            core.clock.set(timestamp)
+        emits += [(timestamp, s) for s in core.tick(timestamp)]
+        emits += [(timestamp, s) for s in core.feed(token, timestamp)]
+    emits += [(events[-1][0], s) for s in core.finish(events[-1][0])]
+    return emits
@@ -0,0 +1,94 @@
+import time
+import asyncio
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    BatchedSegmenter,
+    SegSent2GeneratorPipeline,
+    SegmentationManager,
+)
+from common import (
+    short_text,
+    stream_config,
+    generator_config,
+    clean,
+    split_text,
+    run_pipeline,
+    run_sessions,
+)
+
+
+seg_config = replace(
+    stream_config,
+    first_max_buffer_size=20,
+    max_buffer_size=50,
+    first_min_seg_size=10,
+    min_seg_size=20,
+)
+gen_config = replace(generator_config, first_min_seg_size=10, min_seg_size=20)
+
+
+class MockModel:
+    """Stands in for a neural segmenter: every call has a fixed cost, and a
+    batch costs little more than a single text."""
+
+    def __init__(self, call_cost=0.002, text_cost=0.00005):
+        self.call_cost = call_cost
+        self.text_cost = text_cost
+        self.segmenter = get_sentence_segmenter("jionlp")
+
+    def __call__(self, text):
+        time.sleep(self.call_cost + self.text_cost)
+        return self.segmenter(text)
+
+    def segment_batch(self, texts):
+        time.sleep(self.call_cost + self.text_cost * len(texts))
+        return [self.segmenter(text) for text in texts]
+
+
+async def run_manager(batch_delay, num_sessions=20, token_size=5):
+    seg_manager = SegmentationManager(
+        seg_config=seg_config, segmenters=[MockModel()], batch_delay=batch_delay
+    )
+    seg_manager.start()
+    tokens = split_text(short_text, token_size)
+    sessions = {id: tokens for id in range(num_sessions)}
+    s = time.time()
+    outputs = await run_sessions(seg_manager, sessions, interval=0.001)
+    spent_time = time.time() - s
+    seg_manager.close()
+
+    for segments in outputs.values():
+        assert "".join(segments) == clean(short_text)
+    print(
+        f"batch_delay={batch_delay}: "
+        f"{num_sessions * len(short_text) / spent_time:.0f} chars/s, "
+        f"{sum(len(s) for s in outputs.values()) / num_sessions:.1f} segments/session"
+    )
+    return spent_time
+
+
+async def run_generators(num_sessions=20):
+    segmenter = BatchedSegmenter(MockModel(), max_delay=0.005)
+    pipelines = [
+        SegSent2GeneratorPipeline(config=gen_config, segmenters=[segmenter])
+        for _ in range(num_sessions)
+    ]
+
+    outputs = await asyncio.gather(
+        *[run_pipeline(pipeline, list(short_text)) for pipeline in pipelines]
+    )
+    for sents in outputs:
+        assert len(sents) > 1
+        assert clean("".join(sents)) == clean(short_text)
+    print(
+        f"{num_sessions} generator pipelines: {segmenter.num_requests} requests "
+        f"in {segmenter.num_calls} batched calls"
+    )
+    assert segmenter.num_calls < segmenter.num_requests
+
+
+unbatched = asyncio.run(run_manager(None))
+batched = asyncio.run(run_manager(0.005))
+assert batched < unbatched
+asyncio.run(run_generators())
@@ -0,0 +1,30 @@
+import json
+from seg2stream.benchmark import get_traces, run_benchmark, compare
+
+
+# 同样的 trace 每次生成完全相同的 token 和间隔
+traces = get_traces()
+assert [t.tokens for t in traces.values()] == [t.tokens for t in get_traces().values()]
+assert [t.gaps for t in traces.values()] == [t.gaps for t in get_traces().values()]
+for trace in traces.values():
+    print(f"{trace.name}: {len(trace.tokens)} tokens, {len(trace.text)} chars")
+
+for segmenter in ["jionlp", "boundary"]:
+    results = run_benchmark(
+        traces=["zh", "en", "short_zh"],
+        time_scale=0.05,
+        num_sessions=2,
+        segmenter=segmenter,
+    )
+    results = json.loads(json.dumps(results))  # 可以保存为 JSON
+    for r in results["results"]:
+        assert r["chars_per_second"] > 0
+        assert r["segments"] > 0 and r["time_to_first_segment"] is not None
+        print(
+            f"{segmenter:<10}{r['target']:<10}{r['trace']:<10}"
+            f"{r['chars_per_second']:>10.0f} chars/s, first segment "
+            f"{r['time_to_first_segment'] * 1000:.1f}ms, p90 emit latency "
+            f"{r['emit_latency']['p90'] * 1000:.1f}ms, {r['segments']} segments, "
+            f"{r['segmenter_calls']} calls, peak memory {r['peak_memory']}"
+        )
+    assert len(compare(results, results)) > 0
@@ -0,0 +1,59 @@
+import re
+import time
+from seg2stream import get_sentence_segmenter, get_phrase_segmenter
+from common import test_text
+
+
+examples = {
+    "zh": (
+        "“喂？”她试探着问。“记得带伞。”声音（很轻！）响起",
+        ["“喂？”", "她试探着问。", "“记得带伞。”", "声音（很轻！）", "响起"],
+    ),
+    "en": (
+        'Pi is 3.14, right? "Yes." He left... Then U.S.A (really!) won.',
+        [
+            "Pi is 3.14, right?",
+            ' "Yes."',
+            " He left...",
+            " Then U.S.A (really!)",
+            " won.",
+        ],
+    ),
+    "ja": (
+        "「おはよう。」と彼は言った。本当？はい！",
+        ["「おはよう。」", "と彼は言った。", "本当？", "はい！"],
+    ),
+    "mixed": (
+        "今天发布了v2.0版本。It works! 太好了……继续",
+        ["今天发布了v2.0版本。", "It works!", " 太好了……", "继续"],
+    ),
+}
+for language, (text, expected) in examples.items():
+    segmenteds = get_sentence_segmenter("boundary", language)(text)
+    assert segmenteds == expected, (language, segmenteds)
+    assert "".join(segmenteds) == text
+
+phrases = get_phrase_segmenter("boundary", "zh")(
+    "凌晨三点，林夏被手机铃声惊醒。屏幕上显示"
+)
+assert phrases == ["凌晨三点，", "林夏被手机铃声惊醒。", "屏幕上显示"], phrases
+
+
+def benchmark(segmenter, text, repeats=10):
+    s = time.perf_counter()
+    for _ in range(repeats):
+        segmenter(text)
+    return (time.perf_counter() - s) / repeats
+
+
+# 流水线中的文本已将空白合并为空格
+long_text = re.sub(r"\s+", " ", test_text) * 200
+for name, old, new in [
+    ("sentence", get_sentence_segmenter("jionlp"), get_sentence_segmenter("boundary")),
+    ("phrase", get_phrase_segmenter("jionlp"), get_phrase_segmenter("boundary")),
+]:
+    old_time, new_time = benchmark(old, long_text), benchmark(new, long_text)
+    print(
+        f"{name} ({len(long_text)} chars): {old_time * 1000:.2f}ms -> "
+        f"{new_time * 1000:.2f}ms, {old_time / new_time:.1f}x"
+    )
@@ -0,0 +1,183 @@
+import time
+import asyncio
+import statistics
+from seg2stream import (
+    get_sentence_segmenter,
+    OffloadedSegmenter,
+    SegSent2StreamPipeline,
+    SegSent2GeneratorPipeline,
+    SegmentationManager,
+    Remainder,
+)
+from common import short_text, stream_config, generator_config, clean, split_text
+
+
+class SlowSegmenter:
+    """A blocking segmenter that takes `cost` seconds per call."""
+
+    def __init__(self, cost):
+        self.cost = cost
+        self.segmenter = get_sentence_segmenter("jionlp")
+
+    def __call__(self, text):
+        time.sleep(self.cost)
+        return self.segmenter(text)
+
+
+async def cancel_pipeline(pipeline_class, config, segmenter, num_tokens=40):
+    pipeline = pipeline_class(config=config, segmenters=[segmenter])
+    received = []
+
+    async def consume():
+        async for output in pipeline.output_stream():
+            if isinstance(output, str):
+                received.append(output)
+            else:
+                async for text in output:
+                    received.append(text)
+
+    segment_task = asyncio.create_task(pipeline.segment())
+    consume_task = asyncio.create_task(consume())
+    tokens = split_text(short_text, 2)[:num_tokens]
+    for token in tokens:
+        pipeline.fill(token)
+        await asyncio.sleep(0.002)
+
+    s = time.perf_counter()
+    remainder = pipeline.cancel()
+    await asyncio.gather(segment_task, consume_task)
+    latency = time.perf_counter() - s
+    pipeline.fill("不再处理")
+
+    # 已输出的文本与剩余文本合起来就是收到的全部文本
+    assert clean("".join(received + [remainder])) == clean("".join(tokens))
+    assert pipeline.in_queue.empty() and len(pipeline.buffer) == 0
+    return latency, len(remainder)
+
+
+async def cancel_pipelines():
+    for pipeline_class, config in [
+        (SegSent2StreamPipeline, stream_config),
+        (SegSent2GeneratorPipeline, generator_config),
+    ]:
+        segmenter = get_sentence_segmenter("jionlp")
+        latency, size = await cancel_pipeline(pipeline_class, config, segmenter)
+        print(
+            f"{pipeline_class.__module__}: cancelled in {latency * 1000:.3f}ms, "
+            f"{size} chars not output"
+        )
+        assert latency < 0.05
+
+        # 不等待进行中的慢分割器调用
+        slow = OffloadedSegmenter(SlowSegmenter(0.5))
+        latency, size = await cancel_pipeline(pipeline_class, config, slow)
+        slow.close()
+        print(
+            f"{pipeline_class.__module__} with a pending 0.5s segmenter call: "
+            f"cancelled in {latency * 1000:.3f}ms, {size} chars not output"
+        )
+        assert latency < 0.05
+
+
+async def cancel_sessions(num_sessions=200, num_rounds=3, token_size=3):
+    seg_manager = SegmentationManager(seg_config=stream_config)
+    seg_manager.start()
+    tokens = split_text(short_text, token_size)
+
+    memories, latencies = [], []
+    for r in range(num_rounds):
+        received = {(r, i): [] for i in range(num_sessions)}
+        cancelled_at, remainders, ended = {}, {}, set()
+
+        async def consume():
+            async for id, output in seg_manager.get_async_output():
+                if output is None:
+                    if id in cancelled_at:
+                        latencies.append(time.perf_counter() - cancelled_at[id])
+                    ended.add(id)
+                    if len(ended) == num_sessions:
+                        return
+                elif isinstance(output, Remainder):
+                    remainders[id] = output
+                else:
+                    assert id not in cancelled_at  # 取消后不再有输出
+                    received[id].append(output)
+
+        consume_task = asyncio.create_task(consume())
+        # 所有会话同时输入，打断一半的会话
+        for k, token in enumerate(tokens):
+            for i in range(num_sessions):
+                if (r, i) not in cancelled_at:
+                    seg_manager.add_text((r, i), token)
+            if k == len(tokens) // 2:
+                for i in range(0, num_sessions, 2):
+                    cancelled_at[(r, i)] = time.perf_counter()
+                    seg_manager.cancel((r, i), return_remainder=True)
+            await asyncio.sleep(0.01)
+        for i in range(1, num_sessions, 2):
+            seg_manager.add_text((r, i), None)
+        await consume_task
+
+        sent = "".join(tokens[: len(tokens) // 2 + 1])
+        for id in cancelled_at:
+            text = "".join(received[id]) + remainders[id]
+            assert clean(text) == clean(sent)
+        for i in range(1, num_sessions, 2):
+            assert "".join(received[(r, i)]) == clean(short_text)
+        assert seg_manager.get_session_count() == 0
+        while seg_manager.get_worker_loads()[0]["active_sessions"] > 0:
+            await asyncio.sleep(0.01)
+        memories.append(seg_manager.get_worker_loads()[0]["memory"] / 2**20)
+
+    load = seg_manager.get_worker_loads()[0]
+    seg_manager.close()
+    print(
+        f"{load['cancelled_sessions']} of {load['sessions']} sessions cancelled, "
+        f"latency median {statistics.median(latencies) * 1000:.3f}ms, "
+        f"max {max(latencies) * 1000:.3f}ms, "
+        f"worker memory after each round (MB): {[round(m, 1) for m in memories]}"
+    )
+    assert load["cancelled_sessions"] == num_sessions // 2 * num_rounds
+    assert load["active_sessions"] == 0
+    assert max(latencies) < 1.0
+    assert memories[-1] - memories[0] < 5
+
+
+english_text = (
+    "It was three in the morning.  The phone rang\nagain, and she picked it up"
+)
+# 剩余文本保留单词之间的空白，连续的空白规范化为一个空格
+english_remainder = " ".join(english_text.split())
+
+
+async def cancel_english():
+    segmenter = get_sentence_segmenter("boundary", language="en")
+    # 未读取的片段、缓存和未处理的文本之间保留空格
+    for num_read in [0, 1]:
+        pipeline = SegSent2StreamPipeline(config=stream_config, segmenters=[segmenter])
+        pipeline.put_outputs(pipeline.feed(english_text[:54]))
+        pipeline.fill(english_text[54:])
+        outputs = [pipeline.out_queue.get_nowait() for _ in range(num_read)]
+        remainder = pipeline.cancel()
+        print(f"english remainder after {num_read} read: {remainder!r}")
+        assert " ".join(outputs + [remainder]) == english_remainder
+        assert remainder.span[1] == len(english_text)
+
+    # 经过管理器时，已丢弃的输出与剩余文本之间也保留空格
+    seg_manager = SegmentationManager(seg_config=stream_config, segmenters=[segmenter])
+    seg_manager.start()
+    for token in english_text.split(" "):
+        seg_manager.add_text("en", token + " ")
+    seg_manager.cancel("en", return_remainder=True)
+    outputs = []
+    async for _, output in seg_manager.get_async_output():
+        outputs.append(output)
+        if output is None:
+            break
+    seg_manager.close()
+    assert outputs == [english_remainder, None] and type(outputs[0]) is Remainder
+
+
+asyncio.run(cancel_pipelines())
+asyncio.run(cancel_english())
+asyncio.run(cancel_sessions())
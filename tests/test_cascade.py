@@ -0,0 +1,152 @@
+import asyncio
+import statistics
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    get_phrase_segmenter,
+    SegSent2StreamCore,
+    SegSent2StreamPipeline,
+    MetricsAggregator,
+    VirtualClock,
+    replay_virtual,
+)
+import common
+from common import test_text, stream_config, clean
+
+
+seg_config = replace(
+    stream_config, max_accu_time=0.5, max_waiting_time=1.5, max_seg_size=40
+)
+cascade_config = replace(seg_config, cascade=True)
+
+
+class RhythmLikeSegmenter(object):
+    """Stands for the rhythm model, which is not installed in the tests:
+    every 4 characters end a prosodic phrase. Records when it is called."""
+
+    def __init__(self, core=None):
+        self.core = core
+        self.waited = []  # 调用时已等待的时间
+
+    def __call__(self, text):
+        if self.core is not None:
+            self.waited.append(self.core.clock() - self.core.seg_start_time)
+        return [text[i : i + 4] for i in range(0, len(text), 4)]
+
+
+def run_core(config, segmenters, events):
+    """Feed `(timestamp, token)` events, return the segments with their emit
+    times and the metrics."""
+    metrics = MetricsAggregator()
+    core = SegSent2StreamCore(config, segmenters, metrics=metrics, clock=VirtualClock())
+    for segmenter in segmenters:
+        if isinstance(segmenter, RhythmLikeSegmenter):
+            segmenter.core = core
+    return common.run_core(core, events), metrics.snapshot()
+
+
+def get_latencies(events, emits):
+    """Emit time minus the arrival of the last character of each segment."""
+    arrivals = []
+    for timestamp, token in events:
+        arrivals += [timestamp] * len(token)
+    return [t - arrivals[min(o.end, len(arrivals)) - 1] for t, o in emits]
+
+
+def level_calls(metrics, level):
+    return metrics["counters"].get(f"level{level}_segmenter_calls", 0)
+
+
+def check_common_path():
+    # 有标点的文本：大多由句子级完成，很少用到更细的层级
+    events = [(i * 0.05, test_text[i : i + 2]) for i in range(0, len(test_text), 2)]
+    text = clean(test_text)
+    results = {}
+    for name, config in [("flat", seg_config), ("cascade", cascade_config)]:
+        segmenters = [
+            get_sentence_segmenter("jionlp"),
+            get_phrase_segmenter("regex"),
+            RhythmLikeSegmenter(),
+        ]
+        emits, metrics = run_core(config, segmenters, events)
+        assert "".join(o for _, o in emits) == text
+        assert all(len(o) <= config.max_seg_size for _, o in emits)
+        latencies = get_latencies(events, emits)
+        calls = [level_calls(metrics, level) for level in range(3)]
+        results[name] = calls, max(latencies)
+        print(
+            f"{name}: {len(emits)} segments, calls per level {calls}, "
+            f"latency p50 {statistics.median(latencies):.2f}s max {max(latencies):.2f}s"
+        )
+    (flat_calls, flat_latency), (calls, latency) = results["flat"], results["cascade"]
+    # 更细的层级按时解锁后片段略有不同，句子级的调用次数相近
+    assert calls[0] <= flat_calls[0] * 1.1
+    assert calls[1] * 4 < flat_calls[1] and calls[2] * 4 < flat_calls[2]
+    # 不超过累积时间加等待超时
+    bound = cascade_config.max_accu_time + cascade_config.max_waiting_time + 0.05
+    assert flat_latency <= bound and latency <= bound
+
+
+def check_escalation():
+    # 没有标点的文本：更细的层级只在接近超时时才被调用
+    events = [
+        (i * 0.1, test_text[i]) for i in range(60) if test_text[i] not in "，。“”？"
+    ]
+    rhythm = RhythmLikeSegmenter()
+    segmenters = [
+        get_sentence_segmenter("jionlp"),
+        get_phrase_segmenter("regex"),
+        rhythm,
+    ]
+    run_core(cascade_config, segmenters, events)
+    assert len(rhythm.waited) > 0
+    assert min(rhythm.waited) >= cascade_config.max_waiting_time * 2 / 3 - 1e-9
+    print(
+        f"rhythm level called {len(rhythm.waited)} times, after waiting "
+        f"{min(rhythm.waited):.2f}s at least"
+    )
+
+    # 缓存超过 max_seg_size 时立即使用所有层级
+    config = replace(cascade_config, max_seg_size=5)
+    rhythm = RhythmLikeSegmenter()
+    segmenters = [
+        get_sentence_segmenter("jionlp"),
+        get_phrase_segmenter("regex"),
+        rhythm,
+    ]
+    run_core(config, segmenters, events)
+    assert min(rhythm.waited) < config.max_waiting_time / 3
+
+    # 输入停顿时，更细的层级到解锁时间即被调用，不等下一个字符
+    rhythm = RhythmLikeSegmenter()
+    segmenters = [
+        get_sentence_segmenter("jionlp"),
+        get_phrase_segmenter("regex"),
+        rhythm,
+    ]
+    core = SegSent2StreamCore(cascade_config, segmenters, clock=VirtualClock())
+    rhythm.core = core
+    assert core.feed("凌晨三点林夏被手机铃声惊醒", now=0.0) == []
+    # 缓存超过首个累积大小，立即开始等待，每 0.5s 解锁一级
+    for unlock in [0.5, 1.0]:
+        assert abs(core.next_deadline() - unlock) < 1e-9
+        core.clock.set(unlock)
+        outputs = core.tick(unlock)
+    assert outputs == ["凌晨三点"] and rhythm.waited == [1.0]
+    print(f"rhythm level unlocked by the timer: {outputs}")
+
+
+async def check_pipeline():
+    # 流水线与分割核心的结果一致
+    events = [(i * 0.05, test_text[i : i + 3]) for i in range(0, len(test_text), 3)]
+    segmenters = [get_sentence_segmenter("jionlp"), get_phrase_segmenter("regex")]
+    pipeline = SegSent2StreamPipeline(cascade_config, segmenters, clock=VirtualClock())
+    emits = await replay_virtual(pipeline, events)
+    expected, _ = run_core(cascade_config, segmenters, events)
+    assert [(t, o, o.span) for t, o in emits] == [(t, o, o.span) for t, o in expected]
+    print(f"pipeline: {len(emits)} segments, same as the core")
+
+
+check_common_path()
+check_escalation()
+asyncio.run(check_pipeline())
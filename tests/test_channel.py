@@ -0,0 +1,160 @@
+import time
+import queue
+import asyncio
+import statistics
+from multiprocessing import Manager, Process
+from seg2stream import SegmentationManager
+from seg2stream.channel import create_channel
+from seg2stream.segment_buffer import Segment
+from common import test_text, eager_stream_config
+
+
+num_messages = 100000
+num_pings = 500
+token = "你好，世界"
+
+
+def check_encoding():
+    reader, writer = create_channel()
+    messages = [
+        (0, token),
+        ("session", Segment(token, 3, 8)),
+        (None, None),
+        (-1, {"other": [1, 2]}),
+    ]
+    for id, value in messages:
+        writer.send(id, value)
+    received = []
+    while len(received) < len(messages):
+        received += reader.read()
+    assert received == messages
+    assert received[1][1].span == (3, 8)
+
+
+def send_and_exit(out_writer, size):
+    async def main():
+        for i in range(size):
+            out_writer.send(i, token)
+        await asyncio.sleep(0)  # 管道写满，剩余部分等待可写
+        out_writer.flush(block=True)
+
+    asyncio.run(main())
+    out_writer.send(None, None)
+
+
+def check_blocking_flush(size=100000):
+    # 事件循环关闭前写完剩余的输出，读取方不会停在不完整的帧上
+    reader, writer = create_channel()
+    process = Process(target=send_and_exit, args=(writer, size))
+    process.start()
+    time.sleep(0.2)
+    received = []
+    while len(received) == 0 or received[-1][0] is not None:
+        received += reader.read()
+    process.join()
+    assert received == [(i, token) for i in range(size)] + [(None, None)]
+
+
+async def close_with_pending_outputs(num_sessions=300):
+    # 输出管道写满时 close 不阻塞读取输出的一方
+    seg_manager = SegmentationManager(seg_config=eager_stream_config)
+    seg_manager.start()
+    text = test_text.replace("\n", "")[:160] * 2
+    outputs = {i: [] for i in range(num_sessions)}
+
+    async def get_output():
+        async for id, output in seg_manager.get_async_output():
+            if output is not None:
+                outputs[id].append(output)
+
+    get_output_task = asyncio.create_task(get_output())
+    for i in range(num_sessions):
+        seg_manager.add_text(i, text)
+        seg_manager.add_text(i, None)
+    seg_manager.close()
+    await asyncio.wait_for(get_output_task, 120)
+    assert all("".join(outputs[i]) == text for i in range(num_sessions))
+    print(f"closed with pending outputs: {sum(map(len, outputs.values()))} segments")
+
+
+def queue_echo(in_queue, out_queue):
+    while True:
+        id, text = in_queue.get()
+        if id is None:
+            out_queue.put((None, None))
+            return
+        if id == "ping":
+            out_queue.put((id, text))
+
+
+def channel_echo(in_reader, out_writer):
+    while True:
+        for id, text in in_reader.read():
+            if id is None:
+                out_writer.send(None, None)
+                return
+            if id == "ping":
+                out_writer.send(id, text)
+
+
+def bench_queue():
+    manager = Manager()
+    in_queue, out_queue = manager.Queue(), manager.Queue()
+    process = Process(target=queue_echo, args=(in_queue, out_queue))
+    process.start()
+
+    latencies = []
+    for _ in range(num_pings):
+        s = time.perf_counter()
+        in_queue.put_nowait(("ping", token))
+        out_queue.get()
+        latencies.append(time.perf_counter() - s)
+
+    s = time.perf_counter()
+    for i in range(num_messages // 10):
+        in_queue.put_nowait((i, token))
+    in_queue.put_nowait((None, None))
+    out_queue.get()
+    throughput = num_messages // 10 / (time.perf_counter() - s)
+    process.join()
+    manager.shutdown()
+    return throughput, statistics.median(latencies)
+
+
+async def bench_channel():
+    in_reader, in_writer = create_channel()
+    out_reader, out_writer = create_channel()
+    process = Process(target=channel_echo, args=(in_reader, out_writer))
+    process.start()
+
+    latencies = []
+    for _ in range(num_pings):
+        s = time.perf_counter()
+        in_writer.send("ping", token)
+        await out_reader.read_async()
+        latencies.append(time.perf_counter() - s)
+
+    # 模拟事件循环中连续到达的 token，每次让出控制权时打包成一帧
+    s = time.perf_counter()
+    for i in range(num_messages):
+        in_writer.send(i, token)
+        if i % 10 == 9:
+            await asyncio.sleep(0)
+    in_writer.send(None, None)
+    await out_reader.read_async()
+    throughput = num_messages / (time.perf_counter() - s)
+    process.join()
+    return throughput, statistics.median(latencies)
+
+
+check_encoding()
+check_blocking_flush()
+asyncio.run(close_with_pending_outputs())
+for name, (throughput, latency) in [
+    ("Manager().Queue", bench_queue()),
+    ("channel", asyncio.run(bench_channel())),
+]:
+    print(
+        f"{name}: {throughput:.0f} messages/s, "
+        f"per-token round trip {latency * 1000:.3f}ms"
+    )
@@ -0,0 +1,115 @@
+import time
+import asyncio
+import random
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamPipeline,
+    SegSent2GeneratorPipeline,
+    VirtualClock,
+    replay_virtual,
+)
+from seg2stream.benchmark import get_traces
+from common import paced_stream_config, paced_generator_config, short_text, split_text
+
+
+seg_config = paced_stream_config
+gen_config = paced_generator_config
+segmenters = [get_sentence_segmenter("jionlp")]
+
+
+def hour_of_traffic():
+    """The fixed traces one after another, with pauses of up to a few seconds
+    between the tokens, about an hour in total."""
+    rng = random.Random(0)
+    tokens = []
+    for trace in get_traces().values():
+        tokens += trace.tokens
+    events, now = [], 0.0
+    while now < 3600:
+        for token in tokens:
+            now += rng.choice([0.02, 0.05, 0.1, 0.5, 3.0])
+            events.append((now, token))
+    return events
+
+
+def run(cls, config, events):
+    pipeline = cls(config=config, segmenters=segmenters, clock=VirtualClock())
+    return asyncio.run(replay_virtual(pipeline, events))
+
+
+events = hour_of_traffic()
+text = "".join(token for _, token in events)
+for cls, config in [
+    (SegSent2StreamPipeline, seg_config),
+    (SegSent2GeneratorPipeline, gen_config),
+]:
+    s = time.perf_counter()
+    emits = run(cls, config, events)
+    spent_time = time.perf_counter() - s
+    print(
+        f"{cls.__module__}: {events[-1][0]:.0f}s of traffic, {len(text)} chars, "
+        f"{len(emits)} segments, replayed in {spent_time:.2f}s"
+    )
+    assert spent_time < 60
+    # 所有字符依次出现在分割结果中
+    assert "".join(s for _, s in emits).replace(" ", "") == "".join(text.split())
+    # 分割时间不早于片段最后一个字符的到达时间
+    offsets, end = [], 0
+    for _, token in events:
+        end += len(token)
+        offsets.append(end)
+    for t, segment in emits:
+        arrival = next(ts for (ts, _), o in zip(events, offsets) if o >= segment.end)
+        assert t >= arrival
+    # 相同的输入得到完全相同的分割决策
+    again = run(cls, config, events)
+    assert [(t, str(s), s.start, s.end) for t, s in emits] == [
+        (t, str(s), s.start, s.end) for t, s in again
+    ]
+
+clock = VirtualClock(10.0)
+clock.advance(1.5)
+assert clock() == 11.5
+try:
+    clock.set(1.0)
+    raise AssertionError("clock went back")
+except ValueError:
+    pass
+
+# 真实时钟的流水线不能用于虚拟回放
+try:
+    asyncio.run(
+        replay_virtual(SegSent2StreamPipeline(seg_config, segmenters), events[:3])
+    )
+    raise AssertionError("replayed with a real clock")
+except ValueError:
+    pass
+
+
+# 流式超时也按虚拟时间计算：停顿 15s 后不再输出
+async def stream_timeout():
+    config = replace(seg_config, max_stream_time=5.0)
+    pipeline = SegSent2StreamPipeline(config, segmenters, clock=VirtualClock())
+    tokens = split_text(short_text, 4)
+    events = [(i * 0.1, token) for i, token in enumerate(tokens[:10])]
+    events += [(20.0 + i * 0.1, token) for i, token in enumerate(tokens[10:])]
+    received = []
+
+    async def consume():
+        async for segment in pipeline.output_stream():
+            received.append((pipeline.clock(), segment))
+
+    consume_task = asyncio.ensure_future(consume())
+    emits = await replay_virtual(pipeline, events)
+    await asyncio.sleep(0)
+    assert consume_task.done()
+    assert len(received) > 0 and all(t < 5.0 for t, _ in received)
+    assert len(emits) > len(received)
+    print(
+        f"stream timed out in virtual time after {len(received)} of "
+        f"{len(emits)} segments"
+    )
+
+
+asyncio.run(stream_timeout())
@@ -0,0 +1,68 @@
+import asyncio
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2GeneratorCore,
+    SegSent2GeneratorPipeline,
+)
+from common import short_text, generator_config, split_text
+
+
+tokens = split_text(short_text, 2)
+segmenters = [get_sentence_segmenter("jionlp")]
+seg_config = replace(
+    generator_config,
+    max_waiting_time=60.0,
+    max_stream_time=60.0,
+    first_min_seg_size=10,
+    min_seg_size=20,
+)
+
+
+async def run(config, interval):
+    pipeline = SegSent2GeneratorPipeline(config=config, segmenters=segmenters)
+
+    async def add_text():
+        for token in tokens:
+            pipeline.fill(token)
+            if interval > 0:
+                await asyncio.sleep(interval)
+        pipeline.fill(None)
+
+    async def get_items():
+        items = []
+        async for generator in pipeline.output_stream():
+            items.append([text async for text in generator])
+        return items
+
+    _, items, _ = await asyncio.gather(pipeline.segment(), get_items(), add_text())
+    return [s for s in items if len(s) > 0]
+
+
+# 等待不会超时，分割结果与同步版本相同
+core = SegSent2GeneratorCore(seg_config, segmenters)
+expected = [s for t in tokens for s in core.feed(t, now=0.0)] + core.finish(now=0.0)
+
+# 文本一次性到达：每个片段只唤醒消费者一次
+items = asyncio.run(run(seg_config, 0.0))
+assert ["".join(s) for s in items] == expected
+assert all(len(s) == 1 for s in items)
+num_items = sum(len(s) for s in items)
+print(f"burst: {len(short_text)} chars in {num_items} items, {len(items)} segments")
+assert num_items * 10 < len(short_text)
+
+# 逐个到达：每个 token 一项
+items = asyncio.run(run(seg_config, 0.002))
+assert ["".join(s) for s in items] == expected
+num_items = sum(len(s) for s in items)
+print(f"paced: {len(short_text)} chars in {num_items} items")
+assert num_items <= len(tokens) + len(items)
+
+# 合并窗口：每项至少 flush_size 个字符，片段的最后一项除外
+config = replace(seg_config, flush_size=8, flush_window=0.5)
+items = asyncio.run(run(config, 0.002))
+assert ["".join(s) for s in items] == expected
+assert all(len(text) >= 8 for s in items for text in s[:-1])
+num_items = sum(len(s) for s in items)
+print(f"flush_size=8: {len(short_text)} chars in {num_items} items")
+assert num_items * 4 < len(short_text)
@@ -0,0 +1,117 @@
+import time
+import asyncio
+import statistics
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamCore,
+    SegSent2StreamPipeline,
+    SegSent2GeneratorCore,
+    SegSent2GeneratorPipeline,
+    SegmentationManager,
+)
+import common
+
+
+# 累积和等待时间短，便于观察停顿时的超时
+stream_config = replace(
+    common.stream_config,
+    first_max_accu_time=0.1,
+    max_accu_time=0.1,
+    first_max_buffer_size=50,
+    max_buffer_size=50,
+    max_waiting_time=0.3,
+)
+generator_config = replace(common.generator_config, max_waiting_time=0.3)
+segmenters = [get_sentence_segmenter("jionlp")]
+# 上游在句子中间停顿：没有新的字符到达时，超时也要按时输出
+stalled_text = "凌晨三点，林夏被手机铃声惊醒。屏幕上"
+
+# 同步核心：tick 在每个截止时间处理到期的超时
+core = SegSent2StreamCore(stream_config, segmenters)
+assert core.feed(stalled_text, now=0.0) == []
+assert core.next_deadline() == 0.1
+assert core.tick(0.05) == []
+outputs = core.tick(1.0)
+assert outputs == ["凌晨三点，林夏被手机铃声惊醒。", "屏幕上"]
+assert core.next_deadline() is None
+
+core = SegSent2GeneratorCore(generator_config, segmenters)
+assert core.feed("凌晨三点林夏被手机", now=0.0) == []
+assert core.next_deadline() == 0.3
+assert core.tick(1.0) == ["凌晨三点林夏被手机"]
+assert core.next_deadline() is None
+
+
+async def stall_pipeline(pipeline, text):
+    arrivals = []
+
+    async def consume():
+        async for output in pipeline.output_stream():
+            if isinstance(output, str):
+                arrivals.append((time.perf_counter() - s, output))
+            else:
+                text = "".join([t async for t in output])
+                if len(text) > 0:
+                    arrivals.append((time.perf_counter() - s, text))
+
+    segment_task = asyncio.create_task(pipeline.segment())
+    consume_task = asyncio.create_task(consume())
+    s = time.perf_counter()
+    pipeline.fill(text)
+    await asyncio.sleep(1.0)
+    pipeline.fill(None)
+    await asyncio.gather(segment_task, consume_task)
+    return arrivals
+
+
+pipeline = SegSent2StreamPipeline(stream_config, segmenters)
+arrivals = asyncio.run(stall_pipeline(pipeline, stalled_text))
+print(f"stream pipeline: {[(round(t, 3), s) for t, s in arrivals]}")
+assert [s for _, s in arrivals] == ["凌晨三点，林夏被手机铃声惊醒。", "屏幕上"]
+assert 0.1 <= arrivals[0][0] < 0.2  # 累积时间
+assert 0.4 <= arrivals[1][0] < 0.6  # 再累积 0.1s 后等待 0.3s
+
+pipeline = SegSent2GeneratorPipeline(generator_config, segmenters)
+arrivals = asyncio.run(stall_pipeline(pipeline, "凌晨三点林夏被手机铃声"))
+print(f"generator pipeline: {[(round(t, 3), s) for t, s in arrivals]}")
+assert [s for _, s in arrivals] == ["凌晨三点林夏被手机铃声"]
+# 没有断点，等待超时结束片段
+assert 0.3 <= arrivals[0][0] < 0.5
+
+
+async def stall_sessions(engine, num_sessions=1000):
+    """All the sessions stall at once, the timeouts fire without input."""
+    seg_manager = SegmentationManager(seg_config=stream_config, engine=engine)
+    seg_manager.start()
+    sent_at, lateness = {}, []
+    for i in range(num_sessions):
+        sent_at[i] = time.perf_counter()
+        seg_manager.add_text(i, stalled_text)
+    num_first = 0
+    async for id, output in seg_manager.get_async_output():
+        if output == "凌晨三点，林夏被手机铃声惊醒。":
+            lateness.append(time.perf_counter() - sent_at[id] - 0.1)
+            num_first += 1
+            if num_first == num_sessions:
+                break
+    for i in range(num_sessions):
+        seg_manager.add_text(i, None)
+    num_ended = 0
+    async for id, output in seg_manager.get_async_output():
+        if output is None:
+            num_ended += 1
+            if num_ended == num_sessions:
+                break
+    seg_manager.close()
+    print(
+        f"{engine}: {num_sessions} stalled sessions, first segments late by "
+        f"median {statistics.median(lateness) * 1000:.1f}ms, "
+        f"max {max(lateness) * 1000:.1f}ms"
+    )
+    assert min(lateness) >= 0
+    assert statistics.median(lateness) < 0.1 and max(lateness) < 0.5
+
+
+asyncio.run(stall_sessions("tasks"))
+asyncio.run(stall_sessions("multiplexed"))
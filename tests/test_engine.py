@@ -0,0 +1,127 @@
+import time
+import asyncio
+import tracemalloc
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamPipeline,
+    SegSent2StreamCore,
+    SegmentationManager,
+    Remainder,
+)
+from seg2stream.seg_manager import (
+    SegmentationTask,
+    SyncSegmentationTask,
+    MultiplexedEngine,
+)
+from common import short_text, stream_config, generator_config, split_text, run_sessions
+
+
+segmenters = [get_sentence_segmenter("jionlp")]
+tokens = split_text(short_text, 3)
+seg_config = stream_config
+
+
+async def run_manager(engine, num_sessions=50):
+    seg_manager = SegmentationManager(seg_config=seg_config, engine=engine)
+    seg_manager.start()
+    # 一个会话被取消，其余会话结束输入
+    seg_manager.add_text("cancelled", "凌晨三点，林夏被")
+    seg_manager.cancel("cancelled", return_remainder=True)
+    sessions = {i: tokens for i in range(num_sessions)}
+    outputs = await run_sessions(seg_manager, sessions, num_ended=num_sessions + 1)
+    seg_manager.close()
+    return outputs
+
+
+async def check_manager():
+    expected = await run_manager("tasks")
+    outputs = await run_manager("multiplexed")
+    assert outputs == expected
+    assert outputs["cancelled"] == ["凌晨三点，林夏被"]
+    assert type(outputs["cancelled"][0]) is Remainder
+    print(f"multiplexed engine: same outputs as the tasks for {len(outputs)} sessions")
+
+    # 流式超时
+    config = replace(seg_config, max_stream_time=0.2)
+    seg_manager = SegmentationManager(seg_config=config, engine="multiplexed")
+    seg_manager.start()
+    s = time.perf_counter()
+    seg_manager.add_text("idle", "说了一半")
+    async for id, output in seg_manager.get_async_output():
+        if output is None:
+            break
+    spent_time = time.perf_counter() - s
+    seg_manager.close()
+    print(f"stream timeout after {spent_time:.3f}s (max_stream_time 0.2s)")
+    assert 0.2 <= spent_time < 0.5
+
+    try:
+        SegmentationManager(seg_config=generator_config, engine="multiplexed")
+    except ValueError:
+        pass
+    else:
+        assert False, "the multiplexed engine only runs the stream core"
+
+
+class NullChannel:
+    def send(self, id, value):
+        pass
+
+
+async def measure(design, num_sessions=2000, num_rounds=5):
+    """Memory per session and cost per message, for messages switching between
+    the sessions."""
+    engine = MultiplexedEngine(seg_config, segmenters, NullChannel())
+    tasks = {}
+
+    def send(id, text):
+        if design == "multiplexed":
+            engine.dispatch(id, text)
+            return
+        if id not in tasks:
+            if design == "tasks":
+                pipeline = SegSent2StreamPipeline(seg_config, segmenters)
+                tasks[id] = SegmentationTask(id, pipeline, NullChannel())
+            else:
+                pipeline = SegSent2StreamCore(seg_config, segmenters)
+                tasks[id] = SyncSegmentationTask(id, pipeline, NullChannel())
+        tasks[id].send(text)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(num_sessions):
+        send(i, tokens[0])
+    await asyncio.sleep(0)
+    memory = (tracemalloc.get_traced_memory()[0] - base) / num_sessions
+    tracemalloc.stop()
+
+    s = time.perf_counter()
+    for token in tokens[1 : num_rounds + 1]:
+        for i in range(num_sessions):
+            send(i, token)
+        await asyncio.sleep(0)
+    cost = (time.perf_counter() - s) / (num_sessions * num_rounds)
+
+    for i in range(num_sessions):
+        send(i, None)
+    await asyncio.sleep(0)
+    if design == "multiplexed":
+        await engine.wait_closed()
+    else:
+        await asyncio.gather(*[task.future for task in tasks.values()])
+    print(f"{design}: {memory:.0f} bytes per session, {cost * 1e6:.2f}us per message")
+    return memory, cost
+
+
+asyncio.run(check_manager())
+tasks_memory, tasks_cost = asyncio.run(measure("tasks"))
+sync_memory, sync_cost = asyncio.run(measure("sync tasks"))
+memory, cost = asyncio.run(measure("multiplexed"))
+print(
+    f"multiplexed vs tasks: {tasks_memory / memory:.1f}x less memory, "
+    f"{tasks_cost / cost:.1f}x faster; vs sync tasks: "
+    f"{sync_memory / memory:.1f}x less memory, {sync_cost / cost:.1f}x faster"
+)
+# 每个会话没有队列和任务，只检查差距明显的内存
+assert memory * 2 < tasks_memory
@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+import statistics
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamPipeline,
+    SegmentationManager,
+)
+from common import eager_stream_config
+
+
+seg_config = eager_stream_config
+segmenters = [get_sentence_segmenter("jionlp")]
+
+
+def process_cpu_time(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def pipelines_idle_and_latency(num_sessions=500, idle_time=1.0):
+    pipelines = [
+        SegSent2StreamPipeline(config=seg_config, segmenters=segmenters)
+        for _ in range(num_sessions)
+    ]
+    received = {}
+
+    async def consume(i, pipeline):
+        async for sent in pipeline.output_stream():
+            received.setdefault(i, []).append(time.perf_counter())
+
+    tasks = [asyncio.create_task(consume(i, p)) for i, p in enumerate(pipelines)]
+    tasks += [asyncio.create_task(p.segment()) for p in pipelines]
+    await asyncio.sleep(0.1)
+
+    s = time.process_time()
+    await asyncio.sleep(idle_time)
+    idle_cpu = time.process_time() - s
+
+    latencies = []
+    for i, pipeline in enumerate(pipelines):
+        sent_time = time.perf_counter()
+        pipeline.fill("你好。再见")
+        while i not in received:
+            await asyncio.sleep(0)
+        latencies.append(received[i][0] - sent_time)
+        pipeline.fill(None)
+    await asyncio.gather(*tasks)
+
+    print(
+        f"{num_sessions} idle pipelines: {idle_cpu:.4f}s cpu in {idle_time}s, "
+        f"delivery latency median {statistics.median(latencies) * 1000:.3f}ms, "
+        f"max {max(latencies) * 1000:.3f}ms"
+    )
+    assert idle_cpu < 0.05 * idle_time
+
+
+async def manager_idle_and_latency(num_texts=50, idle_time=1.0):
+    seg_manager = SegmentationManager(seg_config=seg_config, segmenters=segmenters)
+    seg_manager.start()
+    outputs = seg_manager.get_async_output()
+
+    seg_manager.add_text(-1, "预热。")
+    await outputs.__anext__()
+    await asyncio.sleep(0.1)
+
+    pid = seg_manager.seg_processes[0].pid
+    s, child_s = time.process_time(), process_cpu_time(pid)
+    await asyncio.sleep(idle_time)
+    idle_cpu = time.process_time() - s
+    child_idle_cpu = process_cpu_time(pid) - child_s
+
+    latencies = []
+    for i in range(num_texts):
+        sent_time = time.perf_counter()
+        seg_manager.add_text(i, "你好。再见")
+        while (await outputs.__anext__())[0] != i:
+            pass
+        latencies.append(time.perf_counter() - sent_time)
+        seg_manager.add_text(i, None)
+
+    seg_manager.add_text(-1, None)
+    seg_manager.close()
+    async for _ in outputs:
+        pass
+
+    print(
+        f"idle manager: {idle_cpu:.4f}s cpu (main), {child_idle_cpu:.4f}s cpu "
+        f"(segmenting) in {idle_time}s, round trip latency median "
+        f"{statistics.median(latencies) * 1000:.3f}ms"
+    )
+    assert idle_cpu < 0.05 * idle_time
+    assert child_idle_cpu < 0.05 * idle_time
+
+
+asyncio.run(pipelines_idle_and_latency())
+asyncio.run(manager_idle_and_latency())
@@ -0,0 +1,98 @@
+import time
+import heapq
+import asyncio
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamPipeline,
+    SegmentationManager,
+    VirtualClock,
+)
+from seg2stream.clock import wait_idle
+from seg2stream.benchmark import get_traces
+from common import paced_stream_config
+
+
+seg_config = paced_stream_config
+segmenters = [get_sentence_segmenter("jionlp")]
+
+
+async def simulate(events, seconds_per_char, feedback, latency=0.3, rtf=0.2):
+    """Replay the events in virtual time with a simulated TTS consumer: each
+    segment is synthesized as soon as it is output, its first chunk is ready
+    after `latency`, and its feedback arrives when the synthesis finishes."""
+    clock = VirtualClock()
+    pipeline = SegSent2StreamPipeline(seg_config, segmenters, clock=clock)
+    task = asyncio.ensure_future(pipeline.segment())
+    await wait_idle(pipeline, task)
+    reports, outputs = [], []
+
+    def collect():
+        for i in range(len(outputs), len(pipeline.get_segmenteds())):
+            segment, now = pipeline.get_segmenteds()[i], clock()
+            duration = len(segment) * seconds_per_char
+            outputs.append((now, duration))
+            report = dict(
+                synthesis_start=now,
+                first_chunk_time=now + latency,
+                audio_duration=duration,
+            )
+            heapq.heappush(reports, (now + latency + duration * rtf, i, report))
+
+    for timestamp, token in events:
+        while feedback and reports and reports[0][0] <= timestamp:
+            report_time, i, report = heapq.heappop(reports)
+            clock.set(report_time)
+            pipeline.report_playback(i, **report)
+        clock.set(timestamp)
+        pipeline.fill(token)
+        await wait_idle(pipeline, task)
+        collect()
+    pipeline.fill(None)
+    await task
+    collect()
+
+    gaps, end = 0.0, None
+    for output_time, duration in outputs:
+        if duration == 0:
+            continue
+        start = output_time + latency
+        if end is not None and start > end:
+            gaps += start - end
+        end = max(start, end or start) + duration
+    return gaps
+
+
+# 文本生成较慢时，语速比 seconds_per_word 快的声音在按常数估计时会出现停顿
+trace = get_traces()["long_zh"]
+events = [(timestamp * 4, token) for timestamp, token in trace.events()]
+for seconds_per_char in [0.1, 0.15, 0.4]:
+    constant = asyncio.run(simulate(events, seconds_per_char, feedback=False))
+    measured = asyncio.run(simulate(events, seconds_per_char, feedback=True))
+    print(f"{seconds_per_char}s/char: gaps {constant:.2f}s -> {measured:.2f}s")
+    assert measured <= constant
+    if seconds_per_char < 0.2:
+        assert measured < constant / 2
+
+
+async def manager_feedback():
+    seg_manager = SegmentationManager(seg_config=seg_config)
+    seg_manager.start()
+    for i in range(0, len(trace.text), 4):
+        seg_manager.add_text("a", trace.text[i : i + 4])
+    indexes = {}
+    async for id, output in seg_manager.get_async_output():
+        if output is None:
+            break
+        index = indexes[id] = indexes.get(id, -1) + 1
+        now = time.monotonic()
+        seg_manager.report_playback(id, index, now, now + 0.3, len(output) * 0.1)
+        if index == 1:
+            seg_manager.add_text("a", None)
+    seg_manager.report_playback("a", 0, audio_duration=1.0)  # 会话已结束，忽略
+    seg_manager.close()
+    async for _ in seg_manager.get_async_output():
+        pass
+    assert indexes["a"] >= 1
+
+
+asyncio.run(manager_feedback())
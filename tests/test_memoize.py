@@ -0,0 +1,88 @@
+import time
+import random
+import asyncio
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    get_phrase_segmenter,
+    MemoizedSegmenter,
+    SegSent2StreamCore,
+    SegSent2GeneratorCore,
+    SegSent2GeneratorPipeline,
+)
+from common import test_text, stream_config, generator_config, run_pipeline, run_core
+
+
+# 长段落才分割一次，缓存中会积累多个句子
+seg_config = replace(generator_config, first_min_seg_size=100, min_seg_size=400)
+
+jionlp_segmenter = get_sentence_segmenter("jionlp")
+
+
+def model_segmenter(text, cost_per_char=0.00005):
+    """Stands in for a model whose cost grows with the text length."""
+    time.sleep(len(text) * cost_per_char)
+    return jionlp_segmenter(text)
+
+
+black_boxes = {
+    "jionlp (plain callable)": lambda text: jionlp_segmenter(text),
+    "regex phrases": get_phrase_segmenter("regex"),
+    "model": model_segmenter,
+}
+
+
+async def run(segmenter, repeats=5):
+    pipeline = SegSent2GeneratorPipeline(config=seg_config, segmenters=[segmenter])
+
+    s = time.time()
+    sents = await run_pipeline(pipeline, list(test_text * repeats), interval=None)
+    return sents, time.time() - s
+
+
+for name, segmenter in black_boxes.items():
+    sents, spent_time = asyncio.run(run(segmenter))
+    memoized = MemoizedSegmenter(segmenter, lookback=1)
+    memoized_sents, memoized_time = asyncio.run(run(memoized))
+    stats = memoized.stats
+
+    assert memoized_sents == sents
+    assert stats["segmented_chars"] < stats["requested_chars"] / 2
+    print(
+        f"{name}: {spent_time:.3f}s -> {memoized_time:.3f}s, "
+        f"{stats['hits']} hits / {stats['misses']} misses, segmented "
+        f"{stats['segmented_chars']} of {stats['requested_chars']} requested chars"
+    )
+
+
+def random_events(text, rng):
+    """Random chunks of the text, some arriving after pauses that time out."""
+    events, pos, now = [], 0, 0.0
+    while pos < len(text):
+        size = rng.randint(1, 8)
+        events.append((now, text[pos : pos + size]))
+        pos += size
+        now += rng.choice([0.0, 0.05, 0.5, 3.0])
+    return events
+
+
+# 两种流水线、各种分块、粒度和上下文句子数下，结果与不包装时相同
+rng = random.Random(0)
+num_runs = 0
+for segmenter in [jionlp_segmenter, get_phrase_segmenter("regex")]:
+    for core_class, config in [
+        (SegSent2StreamCore, stream_config),
+        (SegSent2GeneratorCore, generator_config),
+    ]:
+        for step_granularity in ["char", "chunk"]:
+            config = replace(config, step_granularity=step_granularity)
+            for lookback in [0, 1, 2]:
+                events = random_events(test_text * 2, rng)
+                memoized = MemoizedSegmenter(segmenter, lookback=lookback)
+                expected = run_core(core_class(config, [segmenter]), events)
+                outputs = run_core(core_class(config, [memoized]), events)
+                assert [(s, s.span) for _, s in outputs] == [
+                    (s, s.span) for _, s in expected
+                ]
+                num_runs += 1
+print(f"same segments as the unwrapped segmenters in {num_runs} runs")
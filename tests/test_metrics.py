@@ -0,0 +1,119 @@
+import time
+import asyncio
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamPipeline,
+    SegSent2GeneratorPipeline,
+    SegmentationManager,
+    MetricsAggregator,
+    to_prometheus,
+    to_json,
+)
+from seg2stream.seg_manager import MetricsReport
+from common import (
+    test_text,
+    paced_stream_config,
+    paced_generator_config,
+    split_text,
+    run_pipeline,
+)
+
+
+seg_config = paced_stream_config
+gen_config = paced_generator_config
+segmenters = [get_sentence_segmenter("jionlp")]
+
+
+def run(pipeline, text, token_size=3):
+    asyncio.run(run_pipeline(pipeline, split_text(text, token_size)))
+
+
+def pipeline_metrics():
+    for cls, config in [
+        (SegSent2StreamPipeline, seg_config),
+        (SegSent2GeneratorPipeline, gen_config),
+    ]:
+        metrics = MetricsAggregator()
+        pipeline = cls(config=config, segmenters=segmenters, metrics=metrics)
+        run(pipeline, test_text)
+        snapshot = metrics.snapshot()
+        counters, histograms = snapshot["counters"], snapshot["histograms"]
+
+        num_segments = len([s for s in pipeline.get_segmenteds() if len(s) > 0])
+        fires = counters.get("fires_natural", 0) + counters.get("fires_forced", 0)
+        assert fires == histograms["segment_chars"]["count"] >= num_segments
+        assert histograms["time_to_first_segment_seconds"]["count"] == 1
+        assert counters["segmenter_calls"] > 0
+        assert (
+            histograms["segmenter_call_seconds"]["count"] == counters["segmenter_calls"]
+        )
+        assert histograms["in_queue_depth"]["count"] > 0
+        print(f"{cls.__module__}: {counters}")
+    print(to_prometheus(snapshot)[:300] + "...")
+
+
+def disabled_overhead(repeats=20):
+    text = test_text * 5
+    for metrics in [None, MetricsAggregator()]:
+        s = time.perf_counter()
+        for _ in range(repeats):
+            pipeline = SegSent2StreamPipeline(
+                config=seg_config, segmenters=segmenters, metrics=metrics
+            )
+            run(pipeline, text)
+        spent_time = time.perf_counter() - s
+        print(
+            f"metrics={type(metrics).__name__}: "
+            f"{repeats * len(text) / spent_time:.0f} chars/s"
+        )
+
+
+class CountingManager(SegmentationManager):
+    """Counts the metrics snapshots received from the workers."""
+
+    num_reports = 0
+
+    def filter_output(self, id, output):
+        if type(id) is MetricsReport:
+            self.num_reports += 1
+        return super().filter_output(id, output)
+
+
+async def manager_metrics(num_sessions=5):
+    seg_manager = CountingManager(
+        seg_config=seg_config, metrics=True, metrics_interval=0.1
+    )
+    seg_manager.start()
+    for id in range(num_sessions):
+        seg_manager.add_text(id, test_text)
+        seg_manager.add_text(id, None)
+    num_finished = 0
+    async for id, output in seg_manager.get_async_output():
+        if output is None:
+            num_finished += 1
+            if num_finished == num_sessions:
+                break
+    num_reports = seg_manager.num_reports
+    await asyncio.sleep(0.5)
+    seg_manager.add_text("last", None)  # 读取输出以收到最新的快照
+    async for id, output in seg_manager.get_async_output():
+        if id == "last":
+            break
+    # 空闲时不发送快照：只有会话结束后的一次
+    idle_reports = seg_manager.num_reports - num_reports
+    print(f"{idle_reports} snapshots in 0.5s idle with metrics_interval=0.1")
+    assert 1 <= idle_reports <= 2
+
+    snapshot = seg_manager.get_metrics()
+    seg_manager.close()
+    print(to_json(snapshot)[:300] + "...")
+    assert snapshot["gauges"]["sessions"] >= num_sessions
+    assert (
+        snapshot["histograms"]["time_to_first_segment_seconds"]["count"] == num_sessions
+    )
+    assert snapshot["counters"]["segmenter_calls"] > 0
+
+
+pipeline_metrics()
+disabled_overhead()
+asyncio.run(manager_metrics())
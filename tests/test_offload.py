@@ -0,0 +1,96 @@
+import time
+import asyncio
+import statistics
+from seg2stream import (
+    get_sentence_segmenter,
+    OffloadedSegmenter,
+    SegSent2StreamPipeline,
+    SegmentationManager,
+)
+from common import test_text, eager_stream_config, clean, split_text, run_sessions
+
+
+text = "\n".join(test_text.splitlines()[:2])  # 前两段
+seg_config = eager_stream_config
+
+
+class SlowSegmenter:
+    """A blocking segmenter that takes `cost` seconds per call."""
+
+    def __init__(self, cost=0.05):
+        self.cost = cost
+        self.num_calls = 0
+        self.segmenter = get_sentence_segmenter("jionlp")
+
+    def __call__(self, text):
+        self.num_calls += 1
+        time.sleep(self.cost)
+        return self.segmenter(text)
+
+
+async def run(offload, num_fast=20, token_size=2):
+    slow_segmenter = SlowSegmenter()
+    segmenter = OffloadedSegmenter(slow_segmenter) if offload else slow_segmenter
+    slow = SegSent2StreamPipeline(config=seg_config, segmenters=[segmenter])
+    fasts = [
+        SegSent2StreamPipeline(config=seg_config, segmenters=[get_sentence_segmenter()])
+        for _ in range(num_fast)
+    ]
+    received = {}
+
+    async def consume(i, pipeline):
+        async for sent in pipeline.output_stream():
+            received.setdefault(i, []).append((time.perf_counter(), sent))
+
+    async def send_slow():
+        for token in split_text(text, token_size):
+            slow.fill(token)
+            await asyncio.sleep(0.005)
+        slow.fill(None)
+
+    tasks = [asyncio.create_task(consume(-1, slow)), asyncio.create_task(send_slow())]
+    tasks += [asyncio.create_task(consume(i, p)) for i, p in enumerate(fasts)]
+    tasks += [asyncio.create_task(p.segment()) for p in [slow] + fasts]
+    await asyncio.sleep(0.05)
+
+    # 慢分割器运行期间，其他会话的输出延迟
+    latencies = []
+    for i, pipeline in enumerate(fasts):
+        sent_time = time.perf_counter()
+        pipeline.fill("你好。再见")
+        while i not in received:
+            await asyncio.sleep(0)
+        latencies.append(received[i][0][0] - sent_time)
+        pipeline.fill(None)
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*tasks)
+    if offload:
+        segmenter.close()
+
+    sents = [sent for _, sent in received[-1]]
+    assert "".join(sents) == clean(text)
+    print(
+        f"offload={offload}: other sessions' latency median "
+        f"{statistics.median(latencies) * 1000:.3f}ms, "
+        f"max {max(latencies) * 1000:.3f}ms; "
+        f"slow session: {slow_segmenter.num_calls} calls for {len(text)} chars, "
+        f"{len(sents)} segments"
+    )
+    return statistics.median(latencies)
+
+
+async def run_manager():
+    seg_manager = SegmentationManager(
+        seg_config=seg_config, segmenters=[SlowSegmenter(0.01)], executor="process"
+    )
+    seg_manager.start()
+    sents = (await run_sessions(seg_manager, {0: split_text(text, 5)}))[0]
+    seg_manager.close()
+    print(f"process pool: {sents}")
+    assert "".join(sents) == clean(text)
+
+
+blocking = asyncio.run(run(False))
+offloaded = asyncio.run(run(True))
+assert offloaded < blocking / 5
+asyncio.run(run_manager())
@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import pickle
+import warnings
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from seg2stream import (
+    get_sentence_segmenter,
+    get_phrase_segmenter,
+    get_rhythm_segmenter,
+    registry,
+    SegmentationManager,
+)
+from seg2stream.segmenters import JioNLPSegmenter
+from common import short_text, stream_config
+
+
+class SlowSegmenter(JioNLPSegmenter):
+    """A segmenter with a slow model to load."""
+
+    loads = 0
+
+    def __init__(self, delay):
+        time.sleep(delay)
+        SlowSegmenter.loads += 1
+        super().__init__("coarse")
+
+
+registry.register("sentence", "slow", SlowSegmenter)
+
+
+def check_load_once():
+    handle = registry.handle("sentence", "slow", delay=0.2)
+    assert SlowSegmenter.loads == 0  # 首次使用时才加载
+
+    # 多个线程同时首次使用，也只加载一次
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(handle, [short_text] * 8))
+    assert results == [JioNLPSegmenter("coarse")(short_text)] * 8
+    again = registry.handle("sentence", "slow", delay=0.2)
+    assert again == handle and again.load() is handle.load()
+    assert SlowSegmenter.loads == 1
+    assert registry.load_times[handle] >= 0.2
+    print(f"loaded once by 8 threads in {registry.load_times[handle]:.3f}s")
+
+    # 预热返回加载耗时，已加载的为 0
+    other = registry.handle("sentence", "slow", delay=0.1)
+    load_times = registry.warm_up([handle, other, JioNLPSegmenter()])
+    assert load_times[handle] == 0.0 and load_times[other] >= 0.1
+    assert SlowSegmenter.loads == 2
+
+
+def check_handles():
+    segmenter = get_sentence_segmenter("boundary", "zh")
+    assert segmenter == get_sentence_segmenter("boundary", "zh")
+    assert segmenter != get_sentence_segmenter("boundary", "en")
+    assert segmenter(short_text) == segmenter.load()(short_text)
+    assert hasattr(segmenter, "create_stream")
+    assert not hasattr(get_phrase_segmenter("regex"), "create_stream")
+
+    # 序列化时只包含名称和选项，不包含已加载的分割器
+    data = pickle.dumps(segmenter)
+    copied = pickle.loads(data)
+    assert len(data) < 200 and copied == segmenter
+    assert copied(short_text) == segmenter(short_text)
+    print(f"handle pickled in {len(data)} bytes")
+
+    try:
+        get_sentence_segmenter("unknown")
+        raise AssertionError("unknown segmenter accepted")
+    except ValueError:
+        pass
+
+    # 模型无法加载时给出警告并使用 jionlp
+    if "stanza" not in sys.modules:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            sentences = get_sentence_segmenter("stanza")(short_text)
+        assert sentences == JioNLPSegmenter("coarse")(short_text)
+        assert any(issubclass(w.category, RuntimeWarning) for w in caught)
+    assert get_rhythm_segmenter("no/such/model") is None
+
+
+class BrokenSegmenter:
+    """A segmenter whose model cannot be loaded."""
+
+    def __init__(self):
+        raise OSError("model not found")
+
+
+registry.register("sentence", "broken", BrokenSegmenter)
+
+
+def check_failures():
+    # 无效的选项在创建句柄时报错
+    try:
+        get_sentence_segmenter("boundary", "xx")
+        raise AssertionError("unknown language accepted")
+    except ValueError as e:
+        print(e)
+
+    # 分割进程无法加载分割器时，读取输出报错而不是一直等待
+    manager = SegmentationManager(
+        stream_config,
+        segmenters=[registry.handle("sentence", "broken")],
+        start_method="fork",
+    )
+    manager.start()
+    manager.add_text(0, short_text)
+    try:
+        list(manager.get_output())
+        raise AssertionError("the failure of the worker is not reported")
+    except RuntimeError as e:
+        print(e)
+    manager.close()
+
+
+class AsyncSegmenter:
+    """A segmenter that has to be awaited."""
+
+    def __init__(self):
+        self.segmenter = JioNLPSegmenter("coarse")
+
+    def __call__(self, text):
+        return self.segmenter(text)
+
+    async def segment_async(self, text):
+        return self(text)
+
+
+registry.register("sentence", "async", lambda: AsyncSegmenter())
+registry.register("sentence", "lazy", lambda: SlowSegmenter(0.0))
+
+
+def check_probes():
+    # 检查多路复用引擎能否驱动分割器时，不在主进程中加载模型
+    slow = registry.handle("sentence", "slow", delay=0.3)
+    lazy = registry.handle("sentence", "lazy")
+    for handle in [slow, lazy]:
+        SegmentationManager(stream_config, segmenters=[handle], engine="multiplexed")
+        assert handle not in registry.segmenters
+    assert SlowSegmenter.loads == 2
+
+    # 加载后才能判断的分割器，由分割进程检查
+    manager = SegmentationManager(
+        stream_config,
+        segmenters=[registry.handle("sentence", "async")],
+        engine="multiplexed",
+        start_method="fork",
+    )
+    manager.start()
+    manager.add_text(0, short_text)
+    try:
+        list(manager.get_output())
+        raise AssertionError("the multiplexed engine accepted an async segmenter")
+    except RuntimeError as e:
+        print(e)
+    manager.close()
+
+
+def check_spawn():
+    # spawn 启动的分割进程各自加载一次模型
+    code = (
+        "import asyncio\n"
+        "from seg2stream import SegmentationManager, get_phrase_segmenter\n"
+        "from common import short_text, stream_config, clean\n"
+        "async def main():\n"
+        "    manager = SegmentationManager(\n"
+        "        stream_config, segmenters=[get_phrase_segmenter('boundary')],\n"
+        "        num_workers=2,\n"
+        "        metrics=True, metrics_interval=0.05, start_method='spawn',\n"
+        "    )\n"
+        "    manager.start()\n"
+        "    for id in range(8):\n"
+        "        manager.add_text(id, short_text)\n"
+        "        manager.add_text(id, None)\n"
+        "    outputs = {id: '' for id in range(8)}\n"
+        "    async for id, output in manager.get_async_output():\n"
+        "        if output is not None:\n"
+        "            outputs[id] += output\n"
+        "        elif manager.get_session_count() == 0:\n"
+        "            break\n"
+        "    assert set(outputs.values()) == {clean(short_text)}\n"
+        "    histograms = manager.get_metrics()['histograms']\n"
+        "    print(histograms['segmenter_load_seconds']['count'])\n"
+        "    manager.close()\n"
+        "asyncio.run(main())\n"
+    )
+    tests_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([os.getcwd(), tests_dir])}
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, env=env, timeout=120
+    )
+    assert result.returncode == 0, result.stderr.decode("utf-8")
+    assert result.stdout.decode("utf-8").split() == ["2"]
+    print("spawned workers loaded the segmenter once each")
+
+
+check_load_once()
+check_handles()
+check_failures()
+check_probes()
+check_spawn()
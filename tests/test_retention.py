@@ -0,0 +1,98 @@
+import tracemalloc
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamCore,
+    SegSent2GeneratorCore,
+    VirtualClock,
+)
+import common
+from common import short_text, split_text
+
+
+segmenters = [get_sentence_segmenter("jionlp")]
+stream_config = replace(
+    common.stream_config, max_stream_time=60.0, seconds_per_word=0.2
+)
+generator_config = replace(common.generator_config, max_stream_time=60.0)
+policies = [("segments", 3), ("chars", 40), ("none", 0)]
+
+
+def run(core_class, config, num_repeats=1, on_spill=None):
+    core = core_class(config, segmenters, on_spill=on_spill)
+    outputs = []
+    for repeat in range(num_repeats):
+        for i, token in enumerate(split_text(short_text, 3)):
+            outputs += core.feed(token, now=repeat + i * 0.03)
+    outputs += core.finish(now=num_repeats)
+    return core, outputs
+
+
+for core_class, config in [
+    (SegSent2StreamCore, stream_config),
+    (SegSent2GeneratorCore, generator_config),
+]:
+    _, expected = run(core_class, config)
+    for retention, size in policies:
+        spilled, spilled_source = [], []
+
+        def on_spill(segments, source):
+            spilled.extend(segments)
+            spilled_source.append(source)
+
+        core, outputs = run(
+            core_class,
+            replace(config, retention=retention, retention_size=size),
+            on_spill=on_spill,
+        )
+        # 输出不受影响，丢弃的历史按顺序溢出
+        assert outputs == expected
+        assert spilled + core.get_segmenteds() == expected
+        assert "".join(spilled_source + core.source) == short_text
+        kept = core.get_segmenteds()
+        if retention == "segments":
+            assert len(kept) <= size
+        elif retention == "chars":
+            assert sum(len(s) for s in kept) <= size
+        else:
+            assert len(kept) == 0
+        print(
+            f"{core_class.__module__} {retention}: kept {len(kept)} of {len(expected)}"
+        )
+
+    # 长时间的会话内存保持不变
+    config = replace(config, retention="none")
+    sizes = []
+    for num_repeats in [50, 200]:
+        tracemalloc.start()
+        core, outputs = run(core_class, config, num_repeats)
+        del outputs
+        sizes.append(tracemalloc.get_traced_memory()[0])
+        tracemalloc.stop()
+        assert len(core.source) <= 30 and len(core.segmenteds) == 0
+        del core
+    print(
+        f"{core_class.__module__}: {sizes[0]} bytes after 50 repeats, "
+        f"{sizes[1]} after 200"
+    )
+    assert sizes[1] < sizes[0] + 4096
+
+
+# 不保留历史时，反馈的计算不变
+def feedback(retention):
+    clock = VirtualClock()
+    config = replace(stream_config, retention=retention)
+    core = SegSent2StreamCore(config, segmenters, clock=clock)
+    num_segments, accu_times = 0, []
+    for i, token in enumerate(split_text(short_text, 3)):
+        now = i * 0.15
+        clock.set(now)
+        num_segments += len(core.feed(token, now=now))
+        if num_segments > 1:
+            core.report_playback(num_segments - 2, now - 0.3, now - 0.1, 1.5)
+        accu_times.append(core.max_accu_time)
+    return accu_times
+
+
+assert feedback("none") == feedback("all")
+print("feedback unchanged")
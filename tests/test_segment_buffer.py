@@ -0,0 +1,39 @@
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamCore,
+    SegSent2GeneratorCore,
+)
+from seg2stream.segment_buffer import SegmentBuffer
+from common import test_text, stream_config, generator_config, clean, split_text
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+# 空白合并为一个空格，偏移映射回原始文本
+buffer = SegmentBuffer()
+assert buffer.add_source("a  b\n\tc ") == "a b c "
+assert [buffer.source_offset(i) for i in range(6)] == [0, 1, 3, 4, 6, 7]
+assert buffer.add_source("d") == "d"
+assert buffer.source_offset(6) == 8 and buffer.source_offset(7) == 9
+
+# 片段的 start/end 截取原始文本，得到片段本身
+source = "Hello   there.\n\nHow are\tyou?  I am fine.   Thanks!\n" + test_text
+for core_class, config in [
+    (SegSent2StreamCore, stream_config),
+    (SegSent2GeneratorCore, generator_config),
+]:
+    core = core_class(config, [get_sentence_segmenter("jionlp")])
+    segments = []
+    for i, token in enumerate(split_text(source, 3)):
+        segments += core.feed(token, now=i * 0.01)
+    segments += core.finish(now=10.0)
+
+    end = 0
+    for segment in segments:
+        assert end <= segment.start <= segment.end
+        assert normalize(source[segment.start : segment.end]) == normalize(segment)
+        end = segment.end
+    assert clean("".join(source[s.start : s.end] for s in segments)) == clean(source)
+    print(f"{core_class.__module__}: {len(segments)} segments map back to the source")
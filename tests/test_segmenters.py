@@ -0,0 +1,60 @@
+import random
+import time
+from seg2stream.segmenters import JioNLPSentenceSegmenter, JioNLPStreamingSegmenter
+from common import test_text
+
+
+segmenter = JioNLPSentenceSegmenter()
+suffix = "####"
+
+
+def streaming_split(stream: JioNLPStreamingSegmenter, text: str, suffix: str):
+    starts = [stream.offset] + stream.boundaries(suffix)
+    ends = starts[1:] + [stream.end + len(suffix)]
+    target_text = text[stream.offset : stream.end] + suffix
+    return [
+        target_text[s - stream.offset : e - stream.offset] for s, e in zip(starts, ends)
+    ]
+
+
+def check_random_texts(criterion, num_texts=2000):
+    alphabet = list("ab x。“”‘’！？，：;；…!?\r\n")
+    for _ in range(num_texts):
+        text = "".join(random.choice(alphabet) for _ in range(random.randint(1, 20)))
+        stream = JioNLPStreamingSegmenter(criterion)
+        pos = 0
+        while pos < len(text):
+            size = random.randint(1, 4)
+            stream.feed(text[pos : pos + size])
+            pos = min(pos + size, len(text))
+            if random.random() < 0.3:
+                stream.commit(random.randint(stream.offset, stream.end))
+            expected = segmenter(text[stream.offset : stream.end] + suffix, criterion)
+            assert streaming_split(stream, text, suffix) == expected, text
+
+
+def compare_speed(criterion, repeats=20):
+    text = test_text * repeats
+
+    s = time.time()
+    for i in range(1, len(text) + 1):
+        segmenter(text[:i] + suffix, criterion)
+    full_time = time.time() - s
+
+    s = time.time()
+    stream = JioNLPStreamingSegmenter(criterion)
+    for char in text:
+        stream.feed(char)
+        stream.boundaries(suffix)
+    stream_time = time.time() - s
+
+    print(
+        f"{criterion}: {len(text)} chars, "
+        f"full resegmentation {full_time:.3f}s, streaming {stream_time:.3f}s"
+    )
+
+
+random.seed(0)
+for criterion in ["coarse", "fine"]:
+    check_random_texts(criterion)
+    compare_speed(criterion)
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import subprocess
+from seg2stream import (
+    SegmentationManager,
+    SessionLimitError,
+    Remainder,
+)
+from seg2stream.server import (
+    SegmentationServer,
+    SegmentationClient,
+    SegmentationClientPool,
+)
+from seg2stream.server.protocol import OPEN, TEXT, CANCEL, PLAYBACK, encode_frame
+from common import test_text, short_text, stream_config, clean, split_text, run_sessions
+
+
+seg_config = stream_config
+tokens = split_text(short_text, 3)
+
+
+async def expected_outputs():
+    """The segments of one session, straight from a manager."""
+    seg_manager = SegmentationManager(seg_config=seg_config)
+    seg_manager.start()
+    outputs = await run_sessions(seg_manager, {0: tokens})
+    seg_manager.close()
+    return outputs[0]
+
+
+async def run_session(pool):
+    session = await pool.open()
+    for token in tokens:
+        session.push(token)
+        await session.drain()
+    session.end()
+    return [output async for output in session.output_stream()]
+
+
+async def check_server(path):
+    expected = await expected_outputs()
+    seg_manager = SegmentationManager(seg_config=seg_config, max_sessions=100)
+    server = SegmentationServer(seg_manager, path=path)
+    await server.start()
+
+    # 多个会话复用连接池中的连接
+    pool = SegmentationClientPool(path=path, size=4)
+    s = time.perf_counter()
+    results = await asyncio.gather(*[run_session(pool) for _ in range(50)])
+    spent_time = time.perf_counter() - s
+    for outputs in results:
+        assert outputs == expected
+        assert [o.span for o in outputs] == [o.span for o in expected]
+    print(
+        f"50 sessions over {len(pool.clients)} connections in {spent_time:.3f}s, "
+        f"{len(expected)} segments each"
+    )
+    assert len(pool.clients) == 4
+
+    # 取消并返回剩余文本
+    session = await pool.open()
+    session.push("凌晨三点，林夏被")
+    session.cancel(return_remainder=True)
+    outputs = [output async for output in session.output_stream()]
+    assert outputs == ["凌晨三点，林夏被"] and type(outputs[0]) is Remainder
+
+    # 超过 max_sessions 时拒绝新的会话
+    client = await SegmentationClient.connect(path)
+    sessions = [client.open() for _ in range(101)]
+    try:
+        [_ async for _ in sessions[-1].output_stream()]
+        raise AssertionError("opened more than max_sessions")
+    except SessionLimitError:
+        pass
+    # 连接断开时，服务端取消其会话
+    await client.close()
+    while seg_manager.get_session_count() > 0:
+        await asyncio.sleep(0.01)
+    print("sessions of a closed connection cancelled")
+
+    # 无法解析的帧关闭连接并取消其会话，不作为未处理的异常，服务继续运行
+    errors = []
+    asyncio.get_running_loop().set_exception_handler(lambda _, c: errors.append(c))
+    for op, payload in [(TEXT, b"\xff\xfe"), (CANCEL, b""), (PLAYBACK, b"\x00" * 8)]:
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(encode_frame(OPEN, 0) + encode_frame(TEXT, 0, "凌晨".encode()))
+        writer.write(encode_frame(op, 0, payload))
+        await writer.drain()
+        while len(await reader.read(1 << 16)) > 0:
+            pass
+        writer.close()
+        while seg_manager.get_session_count() > 0:
+            await asyncio.sleep(0.01)
+    assert await run_session(pool) == expected
+    assert errors == [], errors
+    asyncio.get_running_loop().set_exception_handler(None)
+    print("malformed frames close the connection")
+
+    # 多个前端进程共享同一个服务
+    code = (
+        "import asyncio, sys\n"
+        "from seg2stream.server import SegmentationClientPool\n"
+        "async def main():\n"
+        "    pool = SegmentationClientPool(path=sys.argv[1], size=2)\n"
+        "    sessions = [await pool.open() for _ in range(20)]\n"
+        "    for session in sessions:\n"
+        "        session.push(sys.argv[2])\n"
+        "        session.end()\n"
+        "    for session in sessions:\n"
+        "        print(''.join([o async for o in session.output_stream()]))\n"
+        "    await pool.close()\n"
+        "asyncio.run(main())\n"
+    )
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    frontends = [
+        await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-c",
+            code,
+            path,
+            short_text,
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        for _ in range(2)
+    ]
+    for frontend in frontends:
+        stdout, _ = await frontend.communicate()
+        lines = stdout.decode("utf-8").splitlines()
+        assert lines == [clean(short_text)] * 20, lines
+    print(f"{len(frontends)} frontend processes served by one backend")
+
+    await pool.close()
+    await server.close()
+
+
+async def check_slow_reader(path, num_sessions=10):
+    """A client that pushes text but never reads its outputs is dropped."""
+    seg_manager = SegmentationManager(seg_config=seg_config)
+    server = SegmentationServer(seg_manager, path=path, max_pending_size=1 << 16)
+    await server.start()
+    reader, writer = await asyncio.open_unix_connection(path)
+    for i in range(num_sessions):
+        writer.write(encode_frame(OPEN, i))
+        for _ in range(50):
+            writer.write(encode_frame(TEXT, i, test_text.encode("utf-8")))
+    await writer.drain()
+    # 输出超过上限后断开连接，取消其会话
+    while seg_manager.get_session_count() > 0:
+        await asyncio.sleep(0.01)
+    try:
+        while len(await reader.read(1 << 16)) > 0:
+            pass
+    except ConnectionError:
+        pass
+    writer.close()
+    await server.close()
+    print("a client that does not read is dropped")
+
+
+async def check_tcp():
+    server = SegmentationServer(SegmentationManager(seg_config=seg_config))
+    await server.start()
+    host, port = server.address
+    client = await SegmentationClient.connect(host=host, port=port)
+    session = client.open()
+    session.push(short_text)
+    session.end()
+    outputs = [output async for output in session.output_stream()]
+    assert "".join(outputs) == clean(short_text)
+    await client.close()
+    await server.close()
+    print(f"tcp on port {port}: {len(outputs)} segments")
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    asyncio.run(check_server(os.path.join(tmp, "seg2stream.sock")))
+    asyncio.run(check_slow_reader(os.path.join(tmp, "slow.sock")))
+asyncio.run(check_tcp())
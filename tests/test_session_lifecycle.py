@@ -0,0 +1,110 @@
+import time
+import asyncio
+from seg2stream import get_sentence_segmenter, SegmentationManager, SessionLimitError
+from common import eager_stream_config
+
+
+seg_config = eager_stream_config
+
+
+class SlowSegmenter:
+    """A blocking segmenter that takes `cost` seconds per call."""
+
+    def __init__(self, cost):
+        self.cost = cost
+        self.segmenter = get_sentence_segmenter("jionlp")
+
+    def __call__(self, text):
+        time.sleep(self.cost)
+        return self.segmenter(text)
+
+
+async def wait_finished(outputs, id):
+    async for output_id, output in outputs:
+        if output_id == id and output is None:
+            return
+
+
+async def reap_finished_sessions(num_rounds=4, num_sessions=500):
+    seg_manager = SegmentationManager(seg_config=seg_config)
+    seg_manager.start()
+    outputs = seg_manager.get_async_output()
+
+    memories = []
+    for r in range(num_rounds):
+        for i in range(num_sessions):
+            seg_manager.add_text((r, i), "凌晨三点，林夏被手机铃声惊醒。" * 5)
+            seg_manager.add_text((r, i), None)
+        await wait_finished(outputs, (r, num_sessions - 1))
+        while seg_manager.get_worker_loads()[0]["active_sessions"] > 0:
+            await asyncio.sleep(0.01)
+        memories.append(seg_manager.get_worker_loads()[0]["memory"] / 2**20)
+
+    load = seg_manager.get_worker_loads()[0]
+    seg_manager.close()
+    print(
+        f"{load['sessions']} sessions, {load['active_sessions']} alive, "
+        f"worker memory after each round (MB): {[round(m, 1) for m in memories]}"
+    )
+    assert load["active_sessions"] == 0
+    assert memories[-1] - memories[1] < 5
+
+
+async def evict_idle_sessions(session_ttl=0.2):
+    seg_manager = SegmentationManager(seg_config=seg_config, session_ttl=session_ttl)
+    seg_manager.start()
+    outputs = seg_manager.get_async_output()
+
+    s = time.time()
+    seg_manager.add_text("idle", "说了一半")
+    await wait_finished(outputs, "idle")
+    spent_time = time.time() - s
+
+    load = seg_manager.get_worker_loads()[0]
+    seg_manager.close()
+    print(f"idle session evicted after {spent_time:.3f}s (ttl {session_ttl}s)")
+    assert load["evicted_sessions"] == 1
+    assert session_ttl <= spent_time < session_ttl * 2 + 0.1
+
+    # 分割器较慢时，结束输入后会话仍要等待一段时间，只计一次驱逐
+    seg_manager = SegmentationManager(
+        seg_config=seg_config,
+        segmenters=[SlowSegmenter(session_ttl * 3)],
+        session_ttl=session_ttl,
+        executor="thread",
+    )
+    seg_manager.start()
+    outputs = seg_manager.get_async_output()
+    seg_manager.add_text("slow", "说了一半")
+    await wait_finished(outputs, "slow")
+    load = seg_manager.get_worker_loads()[0]
+    seg_manager.close()
+    assert load["evicted_sessions"] == 1, load
+
+
+async def limit_sessions(max_sessions=2):
+    seg_manager = SegmentationManager(seg_config=seg_config, max_sessions=max_sessions)
+    seg_manager.start()
+    outputs = seg_manager.get_async_output()
+
+    for i in range(max_sessions):
+        seg_manager.add_text(i, "你好。")
+    try:
+        seg_manager.add_text(max_sessions, "你好。")
+        raise AssertionError("SessionLimitError is not raised")
+    except SessionLimitError as e:
+        print(e)
+
+    seg_manager.add_text(0, None)
+    await wait_finished(outputs, 0)
+    seg_manager.add_text(max_sessions, "你好。")
+    assert seg_manager.get_session_count() == max_sessions
+
+    for i in range(1, max_sessions + 1):
+        seg_manager.add_text(i, None)
+    seg_manager.close()
+
+
+asyncio.run(reap_finished_sessions())
+asyncio.run(evict_idle_sessions())
+asyncio.run(limit_sessions())
@@ -0,0 +1,48 @@
+import os
+import time
+import asyncio
+from dataclasses import replace
+from seg2stream import SegmentationManager
+from common import test_text, stream_config, clean, split_text, run_sessions
+
+
+seg_config = replace(
+    stream_config,
+    first_max_buffer_size=20,
+    max_buffer_size=50,
+    first_min_seg_size=20,
+    min_seg_size=50,
+)
+
+
+async def run(num_workers, num_sessions=40, repeats=10, token_size=5):
+    seg_manager = SegmentationManager(seg_config=seg_config, num_workers=num_workers)
+    seg_manager.start()
+    text = test_text * repeats
+    sessions = {id: split_text(text, token_size) for id in range(num_sessions)}
+    s = time.time()
+    outputs = await run_sessions(seg_manager, sessions)
+    spent_time = time.time() - s
+    loads = seg_manager.get_worker_loads()
+    seg_manager.close()
+
+    # 同一会话的所有片段都由同一进程按顺序处理
+    for segments in outputs.values():
+        assert "".join(segments) == clean(text)
+    print(
+        f"{num_workers} workers: {num_sessions * len(text) / spent_time:.0f} chars/s, "
+        f"per-worker chars {[load['chars'] for load in loads]}, "
+        f"sessions {[load['sessions'] for load in loads]}"
+    )
+
+
+print(f"{os.cpu_count()} cpus")
+for num_workers in [1, 2, 4]:
+    asyncio.run(run(num_workers))
+
+# 结束标记只由 close 发送给每个分割进程
+try:
+    SegmentationManager(seg_config=seg_config, num_workers=2).add_text(None, None)
+    raise AssertionError("session id None accepted")
+except ValueError:
+    pass
@@ -0,0 +1,123 @@
+import random
+import time
+import asyncio
+from dataclasses import replace
+from seg2stream import (
+    get_sentence_segmenter,
+    get_phrase_segmenter,
+    SegSent2StreamCore,
+    SegSent2StreamPipeline,
+    SegSent2GeneratorCore,
+    SegSent2GeneratorPipeline,
+    MetricsAggregator,
+    VirtualClock,
+)
+import common
+from common import test_text, stream_config, generator_config, run_pipeline
+
+
+# 时间相关的条件要么总是满足，要么从不满足，保证两种粒度的结果可以逐一比较
+stream_configs = [
+    replace(
+        stream_config,
+        first_max_accu_time=max_accu_time,
+        max_accu_time=max_accu_time,
+        first_max_buffer_size=20,
+        max_buffer_size=50,
+        max_waiting_time=max_waiting_time,
+        first_min_seg_size=20,
+        min_seg_size=50,
+    )
+    for max_accu_time in [0.0, 1e9]
+    for max_waiting_time in [-1.0, 1e9]
+]
+generator_configs = [
+    replace(
+        generator_config,
+        max_waiting_time=max_waiting_time,
+        max_stream_time=60.0,
+        first_min_seg_size=20,
+        min_seg_size=min_seg_size,
+    )
+    for max_waiting_time in [-1.0, 1e9]
+    for min_seg_size in [0, 100]
+]
+all_segmenters = [
+    [get_sentence_segmenter("jionlp")],
+    [get_sentence_segmenter("jionlp"), get_phrase_segmenter("regex")],
+]
+
+
+def split_text(text, max_len=8):
+    clips = []
+    while len(text) > 0:
+        l = random.randint(1, max_len)
+        clips.append(text[:l])
+        text = text[l:]
+    return clips
+
+
+async def run(pipeline_class, config, segmenters, clips):
+    pipeline = pipeline_class(config=config, segmenters=segmenters)
+    s = time.time()
+    sents = await run_pipeline(pipeline, clips, interval=None)
+    return sents, time.time() - s
+
+
+def compare(pipeline_class, configs):
+    for config in configs:
+        for segmenters in all_segmenters:
+            clips = split_text(test_text * 5)
+            char_sents, char_time = asyncio.run(
+                run(pipeline_class, config, segmenters, clips)
+            )
+            chunk_sents, chunk_time = asyncio.run(
+                run(
+                    pipeline_class,
+                    replace(config, step_granularity="chunk"),
+                    segmenters,
+                    clips,
+                )
+            )
+            assert char_sents == chunk_sents
+            print(
+                f"{pipeline_class.__module__}: {len(char_sents)} segments, "
+                f"char {char_time:.4f}s, chunk {chunk_time:.4f}s"
+            )
+
+
+def compare_calls():
+    # 等待分割位置时，按块检查只在可能出现分割位置的字符处调用分割器
+    tokens = common.split_text(test_text * 5, 6)
+    for core_class, config in [
+        (SegSent2StreamCore, stream_config),
+        (SegSent2GeneratorCore, generator_config),
+    ]:
+        for name in ["jionlp", "boundary"]:
+            segmenters = [get_sentence_segmenter(name)]
+            results = {}
+            for granularity in ["char", "chunk"]:
+                metrics = MetricsAggregator()
+                core = core_class(
+                    replace(config, step_granularity=granularity),
+                    segmenters,
+                    metrics=metrics,
+                    clock=VirtualClock(),
+                )
+                outputs = [s for token in tokens for s in core.feed(token)]
+                outputs += core.finish()
+                calls = metrics.snapshot()["counters"]["segmenter_calls"]
+                results[granularity] = [(s, s.span) for s in outputs], calls
+            (char_outputs, char_calls), (outputs, calls) = results.values()
+            assert outputs == char_outputs
+            assert calls * 3 < char_calls
+            print(
+                f"{core_class.__module__} {name}: segmenter calls "
+                f"char {char_calls}, chunk {calls}"
+            )
+
+
+random.seed(0)
+compare(SegSent2StreamPipeline, stream_configs)
+compare(SegSent2GeneratorPipeline, generator_configs)
+compare_calls()
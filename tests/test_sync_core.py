@@ -0,0 +1,76 @@
+import time
+import asyncio
+from seg2stream import (
+    get_sentence_segmenter,
+    SegSent2StreamCore,
+    SegSent2StreamPipeline,
+    SegSent2GeneratorCore,
+    SegSent2GeneratorPipeline,
+    VirtualClock,
+    replay_virtual,
+)
+from seg2stream.benchmark import get_traces
+from seg2stream.benchmark.runner import stream_config, generator_config
+import common
+from common import split_text
+
+
+segmenters = [get_sentence_segmenter("jionlp")]
+targets = [
+    (SegSent2StreamCore, SegSent2StreamPipeline, stream_config),
+    (SegSent2GeneratorCore, SegSent2GeneratorPipeline, generator_config),
+]
+
+
+def run_sync(core_class, config, events):
+    core = core_class(config, segmenters)
+    core.start(0.0)
+    return [s for _, s in common.run_core(core, events)]
+
+
+def run_async(pipeline_class, config, events):
+    pipeline = pipeline_class(config, segmenters, clock=VirtualClock())
+    return [s for _, s in asyncio.run(replay_virtual(pipeline, events))]
+
+
+# 两种接口在相同的时间下得到完全相同的分割结果
+for core_class, pipeline_class, config in targets:
+    for trace in get_traces().values():
+        for time_scale in [0.1, 1.0, 20.0]:
+            events = [(t * time_scale, token) for t, token in trace.events()]
+            a = run_sync(core_class, config, events)
+            b = run_async(pipeline_class, config, events)
+            assert [(str(s), s.span) for s in a] == [(str(s), s.span) for s in b]
+            assert "".join(a).replace(" ", "") == "".join(trace.text.split())
+
+
+def per_char_cost(text, repeats=5, token_size=3):
+    chunks = split_text(text, token_size)
+    for core_class, pipeline_class, config in targets:
+
+        def run_core():
+            core = core_class(config, segmenters)
+            for chunk in chunks:
+                core.feed(chunk)
+            core.finish()
+
+        async def run_pipeline():
+            pipeline = pipeline_class(config, segmenters)
+            await common.run_pipeline(pipeline, chunks)
+
+        costs = []
+        for run in [run_core, lambda: asyncio.run(run_pipeline())]:
+            best = float("inf")
+            for _ in range(repeats):
+                s = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - s)
+            costs.append(best / len(text) * 1e6)
+        print(
+            f"{core_class.__module__}: sync {costs[0]:.2f}us/char, "
+            f"async {costs[1]:.2f}us/char"
+        )
+        assert costs[0] * 2 < costs[1]
+
+
+per_char_cost(get_traces()["long_zh"].text * 10)
@@ -0,0 +1,92 @@
+import os
+import time
+import tempfile
+from dataclasses import replace
+from seg2stream.tuner import (
+    Tuner,
+    default_config,
+    objectives,
+    pareto_front,
+    load_config,
+    save_config,
+)
+
+
+def check(tuner, trials):
+    front = tuner.front()
+    assert 0 < len(front) <= len(trials)
+    for t in front:  # 前沿上的配置互不支配
+        assert not any(
+            all(o["objectives"][k] <= t["objectives"][k] for k in objectives)
+            and any(o["objectives"][k] < t["objectives"][k] for k in objectives)
+            for o in trials
+        )
+    best = tuner.best()
+    assert any(
+        all(getattr(best, k) == v for k, v in t["params"].items()) for t in front
+    )
+    return best
+
+
+space = {
+    "first_min_seg_size": [5, 10, 20, 30],
+    "min_seg_size": [20, 50, 80],
+    "max_seg_size": [70, 150],
+}
+tuner = Tuner(space=space)
+trials = tuner.search("grid", trials=100)
+assert len(trials) == 4 * 3 * 2 - 4  # 不含 min_seg_size > max_seg_size 的组合
+best = check(tuner, trials)
+print("grid best:", best)
+
+for strategy in ["random", "pareto"]:
+    s = time.perf_counter()
+    tuner = Tuner(workers=2, seed=1)
+    trials = tuner.search(strategy, trials=24)
+    print(
+        f"{strategy}: {len(trials)} trials, {len(tuner.front())} on the front, "
+        f"{time.perf_counter() - s:.2f}s"
+    )
+    assert len(trials) == 24
+    assert len({tuple(sorted(t["params"].items())) for t in trials}) == 24
+    check(tuner, trials)
+
+# 进程数不影响结果
+a = Tuner(seed=3).search("random", trials=6)
+b = Tuner(seed=3, workers=3).search("random", trials=6)
+assert a == b
+
+# 偏重首句时间时，选出的配置首句时间最短
+tuner = Tuner(seed=2)
+tuner.search("random", trials=20)
+fast = min(tuner.trials, key=lambda t: t["objectives"]["time_to_first_segment"])
+best = tuner.best(
+    {k: 1000.0 if k == "time_to_first_segment" else 1.0 for k in objectives}
+)
+best_trial = next(
+    t
+    for t in pareto_front(tuner.trials)
+    if all(getattr(best, k) == v for k, v in t["params"].items())
+)
+assert (
+    best_trial["objectives"]["time_to_first_segment"]
+    == fast["objectives"]["time_to_first_segment"]
+)
+
+with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, "config.json")
+    save_config(best, path)
+    assert load_config(path) == best
+
+# 搜索空间之外的配置项取自 base_config
+base_config = replace(default_config, max_stream_time=10.0, fade_in_out_time=0.0)
+tuner = Tuner(space=space, seed=4, base_config=base_config)
+tuner.search("random", trials=4)
+best = tuner.best()
+assert best.max_stream_time == 10.0 and best.fade_in_out_time == 0.0
+
+try:
+    Tuner(space=space).best()
+    raise AssertionError("picked a best config without trials")
+except RuntimeError as e:
+    print(e)